@@ -3,31 +3,36 @@ This file is part of pys5p
 
 https://github.com/rmvanhees/pys5p.git
 
+The submodules are imported on first access (PEP 562), thus 'import pys5p'
+does not load matplotlib or Cartopy, unless s5p_plot or s5p_geoplot are
+used.
+
 Copyright (c) 2017 SRON - Netherlands Institute for Space Research
    All Rights Reserved
 
 License:  BSD-3-Clause
 """
-__all__ = ['biweight', 'ckd_io', 'error_propagation', 'get_data_dir',
-           'icm_io', 'l1b_io', 'lv2_io', 'ocm_io',
-           's5p_geoplot', 's5p_msm', 's5p_plot',
-           'sron_colormaps', 'swir_region', 'swir_texp',
-           'version']
-
-from . import biweight
-from . import error_propagation
-from . import get_data_dir
-from . import sron_colormaps
-from . import swir_region
-from . import swir_texp
-from . import version
-
-from . import ckd_io
-from . import icm_io
-from . import l1b_io
-from . import lv2_io
-from . import ocm_io
-
-from . import s5p_msm
-from . import s5p_plot
-from . import s5p_geoplot
+from importlib import import_module
+
+__all__ = ['biweight', 'ckd_bundle', 'ckd_cache', 'ckd_io',
+           'error_propagation', 'get_data_dir', 'icm_io',
+           'l1b_collection', 'l1b_io', 'l1b_patch_batch', 'lv2_grid',
+           'lv2_index', 'lv2_io', 'ocm_io', 's5p_compare', 's5p_dtype',
+           's5p_geoplot', 's5p_hdf5', 's5p_msm', 's5p_overlay', 's5p_plot',
+           's5p_pool', 's5p_synth', 's5p_trace', 'sron_colormaps',
+           'swir_calib', 'swir_region', 'swir_texp', 'version']
+
+
+def __getattr__(name):
+    """
+    Import a submodule on first access
+    """
+    if name in __all__:
+        return import_module('.' + name, __name__)
+
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
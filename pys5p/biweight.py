@@ -60,6 +60,50 @@ def __biweight(data):
     return (xbi, sbi)
 
 
+def __biweight_axis0(data, spread=False):
+    """
+    Calculate biweight median (and spread) along the first axis of a 2-D array
+
+    All statistics are computed as whole-array operations in double
+    precision, NaN's and other non-finite values are ignored.
+    """
+    import warnings
+
+    data = np.array(data, dtype=np.float64)
+    data[~np.isfinite(data)] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        med_xx = np.nanmedian(data, axis=0)
+        deltas = data - med_xx
+        med_dd = np.nanmedian(np.abs(deltas), axis=0)
+
+    all_nan = np.isnan(med_xx)
+    no_spread = ~all_nan & (med_dd == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wmx = np.maximum(0, 1 - (deltas / (6 * med_dd)) ** 2) ** 2
+        xbi = med_xx + (np.nansum(wmx * deltas, axis=0)
+                        / np.nansum(wmx, axis=0))
+    xbi[no_spread] = med_xx[no_spread]
+    if not spread:
+        return xbi
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        umn = np.minimum(1, (deltas / (9 * med_dd)) ** 2)
+        sbi = np.nansum(deltas ** 2 * (1 - umn) ** 4, axis=0)
+        sbi /= np.nansum((1 - umn) * (1 - 5 * umn), axis=0) ** 2
+        sbi = np.sqrt(np.sum(~np.isnan(data), axis=0) * sbi)
+    sbi[all_nan | no_spread] = 0.
+
+    return (xbi, sbi)
+
+
+def __biweight_block(args):
+    """
+    Wrapper around __biweight_axis0 to be used by multiprocessing.Pool.map
+    """
+    return __biweight_axis0(*args)
+
+
 # ----- main function -------------------------
 def biweight(data, axis=None, cpu_count=1, spread=False):
     """
@@ -74,8 +118,10 @@ def biweight(data, axis=None, cpu_count=1, spread=False):
        axis along which the biweight medians are computed.
         - Note that axis will be ignored when data is a 1-D array.
     cpu_count : int, optional
-       specify number of threads to be used. Default is None
-        - Note Multiprocessing is used only when axis is not None.
+       specify number of processes to be used. Default is 1, use None for
+       os.cpu_count() processes
+        - Note the data is split in cpu_count blocks of columns, which are
+          processed in parallel. Only used when axis is not None.
     spread :   bool, optional
        if True, then return the biweight spread.
 
@@ -85,6 +131,7 @@ def biweight(data, axis=None, cpu_count=1, spread=False):
        biweight median and biweight spread if function argument "spread" is True
     """
     from multiprocessing import Pool
+    from os import cpu_count as os_cpu_count
 
     if axis is None or data.ndim == 1:
         if spread:
@@ -98,21 +145,129 @@ def biweight(data, axis=None, cpu_count=1, spread=False):
     if not 0 <= axis < data.ndim:
         raise ValueError('axis out-of-range')
 
-    # prepare data for multiprocessing
+    # reduce along the first axis of a 2-D view of the data
     res_size = data.size // data.shape[axis]
     tmp = np.moveaxis(data, axis, 0)        # returns a numpy view
     shape = tmp.shape
-    buff = tmp.reshape(shape[0], res_size)  # returns a numpy view
-    ins = [buff[:, ii] for ii in range(res_size)]
+    buff = tmp.reshape(shape[0], res_size)
 
-    with Pool(cpu_count) as pool:
+    if cpu_count is None:
+        cpu_count = os_cpu_count()
+    if cpu_count <= 1 or res_size < 2:
+        outs = __biweight_axis0(buff, spread)
+    else:
+        ins = [(blk, spread) for blk in
+               np.array_split(buff, min(cpu_count, res_size), axis=1)]
+        with Pool(cpu_count) as pool:
+            outs = pool.map(__biweight_block, ins)
         if spread:
-            outs = pool.map(__biweight, ins)
+            outs = (np.concatenate([out[0] for out in outs]),
+                    np.concatenate([out[1] for out in outs]))
         else:
-            outs = pool.map(__biweight_median, ins)
+            outs = np.concatenate(outs)
+
+    if spread:
+        return (outs[0].reshape(shape[1:]), outs[1].reshape(shape[1:]))
+
+    return outs.reshape(shape[1:])
+
+
+def biweight_chunked(source, frames=None, spread=False, max_memory=2**30):
+    """
+    Calculate Tukey's biweight along the first axis (time) of a frame stack
+    with bounded memory usage.
+
+    The frame stack is processed in tiles of rows and columns, each tile
+    holds all frames, therefore, the result is identical to
+    biweight(data, axis=0).
+
+    Parameters
+    ----------
+    source :   h5py.Dataset, ndarray or iterable
+       frame stack with dimensions (time, [row,] column), or an iterable of
+       blocks of frames with dimensions (frames, [row,] column). Blocks are
+       spooled to a temporary file before they are processed
+    frames :   [i, j], optional
+       Select frames on the slowest axis (time) as, from index 'i' to 'j'
+    spread :   bool, optional
+       if True, then return the biweight spread.
+    max_memory : int, optional
+       approximate upper limit of memory used in bytes. Default is 1 GiB
+
+    Returns
+    -------
+    out    :   ndarray
+       biweight median and biweight spread if function argument "spread" is True
+    """
+    import tempfile
+
+    if not hasattr(source, 'shape'):
+        with tempfile.TemporaryFile() as fp:
+            dtype = None
+            shape = None
+            nframes = 0
+            for block in source:
+                block = np.asarray(block)
+                if dtype is None:
+                    dtype = block.dtype
+                    shape = block.shape[1:]
+                elif block.shape[1:] != shape:
+                    raise ValueError('blocks have different frame dimensions')
+                fp.write(np.ascontiguousarray(block, dtype=dtype).tobytes())
+                nframes += block.shape[0]
+            if dtype is None:
+                raise ValueError('no frames found')
+            fp.flush()
+
+            spool = np.memmap(fp, dtype=dtype, mode='r',
+                              shape=(nframes,) + shape)
+            return biweight_chunked(spool, frames=frames, spread=spread,
+                                    max_memory=max_memory)
+
+    if len(source.shape) not in (2, 3):
+        raise ValueError('source should have 2 or 3 dimensions')
+
+    frame_sel = slice(None) if frames is None else slice(*frames)
+    nframes = len(range(*frame_sel.indices(source.shape[0])))
+    if nframes == 0:
+        raise ValueError('no frames selected')
+
+    # estimate memory usage per pixel, including the temporary arrays
+    # created by the biweight algorithm (in double precision)
+    pixel_size = 8 * nframes * np.dtype(np.float64).itemsize
+
+    shape = tuple(source.shape[1:])
+    if len(shape) == 1:
+        shape = (1,) + shape
+    nrows = max(1, min(shape[0], max_memory // (pixel_size * shape[1])))
+    ncols = shape[1]
+    if nrows == 1:
+        ncols = max(1, min(shape[1], max_memory // pixel_size))
+
+    median = None
+    sigma = None
+    for row in range(0, shape[0], nrows):
+        for col in range(0, shape[1], ncols):
+            rsel = slice(row, min(row + nrows, shape[0]))
+            csel = slice(col, min(col + ncols, shape[1]))
+            if len(source.shape) == 2:
+                tile = source[frame_sel, csel][:, np.newaxis, :]
+            else:
+                tile = source[frame_sel, rsel, csel]
+            tile_shape = tile.shape[1:]
+            res = __biweight_axis0(tile.reshape(tile.shape[0], -1), spread)
+            if not spread:
+                res = (res,)
+            if median is None:
+                median = np.empty(shape, dtype=res[0].dtype)
+                if spread:
+                    sigma = np.empty(shape, dtype=res[1].dtype)
+            median[rsel, csel] = res[0].reshape(tile_shape)
+            if spread:
+                sigma[rsel, csel] = res[1].reshape(tile_shape)
 
+    shape = tuple(source.shape[1:])
     if spread:
-        res = np.array(outs).reshape(shape[1:] + (2,))
-        return (res[..., 0], res[..., 1])
+        return (median.reshape(shape), sigma.reshape(shape))
 
-    return np.array(outs).reshape(shape[1:])
+    return median.reshape(shape)
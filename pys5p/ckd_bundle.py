@@ -0,0 +1,268 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Write and read a bundle of precomputed SWIR CKD's
+
+A bundle is a directory with the SWIR CKD's (bands 7 and 8 combined, row 257
+excluded, fill-values converted) stored as uncompressed numpy files, and a
+manifest which records the CKD products used to generate the bundle. The
+CKD's are read from a bundle using memory mapping, which is much faster than
+reading them from the Static and dynamic CKD products.
+
+CKDio reads the CKD's from the bundle in the directory 'bundle' of the CKD
+directory, when the bundle was generated from the CKD products selected by
+CKDio. Generate the bundle with:
+
+  python3 -m pys5p.ckd_bundle --ckd_dir /nfs/Tropomi/share/ckd
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .ckd_cache import ckd_index
+
+# - global parameters ------------------------------
+MANIFEST = 'manifest.json'
+
+# CKDio methods with SWIR CKD's stored in a bundle
+BUNDLE_PARAMS = ('offset', 'darkflux', 'noise', 'prnu', 'saturation',
+                 'pixel_quality', 'memory', 'dn2v')
+
+# names of the dynamic CKD products used by CKDio
+DYNAMIC_CKD = ('offset', 'dark', 'readnoise', 'saturation_preoffset', 'dpqf')
+
+
+# - local functions --------------------------------
+def ckd_sources(ckd_dir, date=None):
+    """
+    Returns the CKD products selected by CKDio, as dictionary with the
+    modification time of each product
+    """
+    index = ckd_index(ckd_dir)
+
+    res = {}
+    flnames = [index.find_static(date)]
+    flnames += [index.find_dynamic(x, date) for x in DYNAMIC_CKD]
+    for flname in flnames:
+        if flname is not None:
+            res[flname.name] = flname.stat().st_mtime_ns
+
+    return res
+
+
+def write_ckd_bundle(ckd_dir, bundle_dir=None, date=None):
+    """
+    Read the SWIR CKD's with CKDio and write them to a bundle
+
+    Parameters
+    ----------
+    ckd_dir     :  str or Path
+       directory with the Static and dynamic CKD products
+    bundle_dir  :  str or Path, optional
+       directory of the bundle, default is 'bundle' in ckd_dir
+    date        :  datetime, optional
+       use the CKD products valid at this date, default latest products
+
+    Returns
+    -------
+    Path to the bundle
+    """
+    import h5py
+
+    from .ckd_io import CKDio
+    from .s5p_msm import S5Pmsm
+
+    ckd_dir = Path(ckd_dir)
+    bundle_dir = ckd_dir / 'bundle' if bundle_dir is None else Path(bundle_dir)
+    bundle_dir.mkdir(parents=True, exist_ok=True)
+
+    # remove the manifest first, a partially written bundle is never used
+    if (bundle_dir / MANIFEST).is_file():
+        (bundle_dir / MANIFEST).unlink()
+
+    params = {}
+    with CKDio(ckd_dir, date=date, use_bundle=False) as ckd:
+        for name in BUNDLE_PARAMS:
+            try:
+                res = getattr(ckd, name)()
+            except (KeyError, OSError):
+                # CKD not available in these CKD products
+                continue
+
+            if isinstance(res, S5Pmsm):
+                res = {name: res}
+            else:
+                res = {'{}/{}'.format(name, key): x for key, x in res.items()}
+
+            for key, msm in res.items():
+                params[key] = _write_msm(bundle_dir, key, msm)
+
+        # threshold of the pixel-quality CKD, see CKDio.dpqf
+        if 'pixel_quality' in params:
+            flname = ckd_index(ckd_dir).find_dynamic('dpqf', date)
+            with h5py.File(flname, 'r') as fid:
+                threshold = fid['/BAND7/dpqf_threshold'][:]
+            np.save(bundle_dir / 'dpqf_threshold.npy', threshold)
+            params['dpqf_threshold'] = {'value': 'dpqf_threshold.npy'}
+
+    manifest = {
+        'creation_time': datetime.utcnow().isoformat(timespec='seconds'),
+        'date': None if date is None else date.isoformat(),
+        'sources': ckd_sources(ckd_dir, date),
+        'params': params
+    }
+    with open(bundle_dir / MANIFEST, 'w') as fp:
+        json.dump(manifest, fp, indent=2)
+
+    return bundle_dir
+
+
+def _write_msm(bundle_dir, key, msm):
+    """
+    Write S5Pmsm object to a bundle and returns its manifest entry
+    """
+    stem = key.replace('/', '.')
+    units = msm.units
+    if isinstance(units, np.ndarray):
+        units = units.tolist()
+    res = {'name': msm.name,
+           'units': units,
+           'long_name': msm.long_name,
+           'fillvalue': None if msm.fillvalue is None
+                        else float(msm.fillvalue),
+           'coords': list(msm.coords._fields)}
+
+    res['value'] = stem + '.value.npy'
+    np.save(bundle_dir / res['value'], np.ascontiguousarray(msm.value))
+    if msm.error is not None:
+        res['error'] = stem + '.error.npy'
+        np.save(bundle_dir / res['error'], np.ascontiguousarray(msm.error))
+    res['coords_file'] = stem + '.coords.npz'
+    np.savez(bundle_dir / res['coords_file'],
+             **{x: np.asarray(msm.coords[ii])
+                for ii, x in enumerate(msm.coords._fields)})
+
+    return res
+
+
+# - class definition -------------------------------
+class CKDbundle():
+    """
+    Read SWIR CKD's from a bundle
+    """
+    def __init__(self, bundle_dir):
+        """
+        Read the manifest of a bundle
+
+        Parameters
+        ----------
+        bundle_dir  :  str or Path
+           directory of the bundle
+        """
+        self.bundle_dir = Path(bundle_dir)
+        if not (self.bundle_dir / MANIFEST).is_file():
+            raise FileNotFoundError(
+                'bundle {} not found'.format(self.bundle_dir))
+
+        with open(self.bundle_dir / MANIFEST, 'r') as fp:
+            self.manifest = json.load(fp)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}({!r})'.format(class_name, str(self.bundle_dir))
+
+    def __contains__(self, name):
+        params = self.manifest['params']
+        return name in params \
+            or any(x.startswith(name + '/') for x in params)
+
+    def is_current(self, ckd_dir, date=None):
+        """
+        Returns True when the bundle is generated from the CKD products
+        which are selected by CKDio
+        """
+        try:
+            return self.manifest['sources'] == ckd_sources(ckd_dir, date)
+        except OSError:
+            return False
+
+    def get(self, name):
+        """
+        Returns CKD as S5Pmsm object, the data is memory mapped copy-on-write.
+        The memory CKD is returned as a dictionary of S5Pmsm objects
+        """
+        params = self.manifest['params']
+        if name in params:
+            return self.__read(params[name])
+
+        res = {}
+        for key in params:
+            if key.startswith(name + '/'):
+                res[key.split('/')[1]] = self.__read(params[key])
+        if not res:
+            raise KeyError('CKD {} not in bundle'.format(name))
+
+        return res
+
+    def __read(self, param):
+        """
+        Returns data of one entry in the manifest
+        """
+        from .s5p_msm import S5Pmsm
+
+        value = np.load(self.bundle_dir / param['value'], mmap_mode='c')
+        if 'coords' not in param:
+            return value
+
+        msm = S5Pmsm(value)
+        msm.name = param['name']
+        msm.units = param['units']
+        msm.long_name = param['long_name']
+        msm.fillvalue = param['fillvalue']
+        if 'error' in param:
+            msm.error = np.load(self.bundle_dir / param['error'],
+                                mmap_mode='c')
+        with np.load(self.bundle_dir / param['coords_file']) as fid:
+            coords_namedtuple = namedtuple('Coords', param['coords'])
+            msm.coords = coords_namedtuple._make(
+                [fid[x] for x in param['coords']])
+
+        return msm
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='generate a bundle of precomputed SWIR CKD\'s')
+    parser.add_argument('--ckd_dir', default='/nfs/Tropomi/share/ckd')
+    parser.add_argument('--bundle_dir', default=None,
+                        help='default directory "bundle" in ckd_dir')
+    parser.add_argument('--date', default=None,
+                        help='use CKD products valid at date (YYYYmmdd)')
+    args = parser.parse_args()
+
+    date = None
+    if args.date is not None:
+        date = datetime.strptime(args.date, '%Y%m%d')
+
+    print(write_ckd_bundle(args.ckd_dir, args.bundle_dir, date=date))
+
+
+if __name__ == '__main__':
+    main()
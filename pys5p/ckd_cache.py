@@ -0,0 +1,302 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Provides a process-wide cache of CKD's read by CKDio, and an index of the
+Static and dynamic CKD products in a CKD directory by validity period
+
+The cache is keyed by (file, modification time, dataset, bands, selection),
+thus an updated CKD product is read again. The least recently used CKD's
+are removed when the cache exceeds its memory budget.
+
+The index is build once per CKD directory, and only rebuild when the
+contents of the directory are modified.
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+
+# - global parameters ------------------------------
+_CKD_CACHE = None
+_CKD_INDEX = {}
+
+_HEADER = '/METADATA/earth_exploirer_header/fixed_header/validity_period'
+
+CKDentry = namedtuple('CKDentry', 'path mtime validity_start validity_stop')
+
+
+# - local functions --------------------------------
+def _nbytes(obj):
+    """
+    Returns the memory size of a cached object
+    """
+    if obj is None:
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(_nbytes(x) for x in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_nbytes(x) for x in obj)
+    if hasattr(obj, 'value'):
+        return _nbytes(obj.value) + _nbytes(obj.error)
+
+    return 0
+
+
+def _validity_period(ckd_file):
+    """
+    Returns validity period of a CKD product, or (None, None) when the
+    product does not define a validity period
+    """
+    from datetime import datetime
+
+    import h5py
+
+    res = [None, None]
+    try:
+        with h5py.File(ckd_file, 'r') as fid:
+            if _HEADER not in fid:
+                return tuple(res)
+            attrs = fid[_HEADER].attrs
+            for ii, key in enumerate(('Validity_Start', 'Validity_Stop')):
+                if key not in attrs:
+                    continue
+                attr = attrs[key]
+                if isinstance(attr, np.ndarray):
+                    attr = attr[0]
+                if isinstance(attr, bytes):
+                    attr = attr.decode('ascii')
+                res[ii] = datetime.strptime(attr, '%Y%m%dT%H%M%S')
+    except OSError:
+        pass
+
+    return tuple(res)
+
+
+def file_key(ckd_file):
+    """
+    Returns identification of a CKD product: its name and modification time
+    """
+    ckd_file = Path(ckd_file)
+    return (str(ckd_file.resolve()), ckd_file.stat().st_mtime_ns)
+
+
+# - class definition -------------------------------
+class CKDcache():
+    """
+    Memoizing cache for CKD's with least-recently-used eviction
+
+    Cached objects are returned as copies, thus callers can modify the
+    returned CKD without affecting the cache
+    """
+    def __init__(self, max_bytes=2**30):
+        """
+        Parameters
+        ----------
+        max_bytes  :  int
+           memory budget of the cache, default 1 GiB
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+        self.__lock = Lock()
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}(max_bytes={!r})'.format(class_name, self.max_bytes)
+
+    def __len__(self):
+        return len(self.__data)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def clear(self):
+        """
+        Remove all CKD's from the cache
+        """
+        with self.__lock:
+            self.__data.clear()
+            self.nbytes = 0
+
+    def resize(self, max_bytes):
+        """
+        Change the memory budget of the cache
+        """
+        with self.__lock:
+            self.max_bytes = max_bytes
+            self.__evict()
+
+    def __evict(self):
+        """
+        Remove the least recently used CKD's until the cache fits its budget
+        """
+        while self.__data and self.nbytes > self.max_bytes:
+            (_, (_, size)) = self.__data.popitem(last=False)
+            self.nbytes -= size
+
+    def get(self, key, func):
+        """
+        Returns copy of the cached CKD, call func() to obtain the CKD when
+        it is not available in the cache
+
+        Parameters
+        ----------
+        key   :  tuple
+           hashable key, e.g. (file, mtime, dataset, bands, selection)
+        func  :  callable
+           function without arguments which returns the CKD
+        """
+        from copy import deepcopy
+
+        with self.__lock:
+            if key in self.__data:
+                self.__data.move_to_end(key)
+                self.hits += 1
+                return deepcopy(self.__data[key][0])
+
+        res = func()
+        size = _nbytes(res)
+        with self.__lock:
+            self.misses += 1
+            if size <= self.max_bytes:
+                if key in self.__data:
+                    self.nbytes -= self.__data.pop(key)[1]
+                self.__data[key] = (deepcopy(res), size)
+                self.nbytes += size
+                self.__evict()
+
+        return res
+
+
+class CKDindex():
+    """
+    Index of Static and dynamic CKD products in a CKD directory by
+    validity period
+    """
+    def __init__(self, ckd_dir):
+        """
+        Scan the CKD directory
+
+        Parameters
+        ----------
+        ckd_dir  :  str or Path
+           directory with sub-directories 'static' and 'dynamic'
+        """
+        self.ckd_dir = Path(ckd_dir)
+        self.static = []
+        self.dynamic = []
+
+        self.stamp = self.__stamp(self.ckd_dir)
+        for flname in sorted((self.ckd_dir / 'static').glob('*_AUX_L1_CKD_*')):
+            self.static.append(self.__entry(flname))
+        for flname in sorted((self.ckd_dir / 'dynamic').glob('ckd.*')):
+            self.dynamic.append(self.__entry(flname))
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}({!r})'.format(class_name, str(self.ckd_dir))
+
+    @staticmethod
+    def __stamp(ckd_dir):
+        """
+        Returns modification times of the CKD directories
+        """
+        res = ()
+        for sub_dir in ('static', 'dynamic'):
+            path = ckd_dir / sub_dir
+            res += (path.stat().st_mtime_ns if path.is_dir() else None,)
+
+        return res
+
+    @staticmethod
+    def __entry(flname):
+        """
+        Returns index entry of a CKD product
+        """
+        return CKDentry(flname, flname.stat().st_mtime_ns,
+                        *_validity_period(flname))
+
+    def is_current(self):
+        """
+        Returns False when CKD products are added or removed after the
+        index was build
+        """
+        return self.stamp == self.__stamp(self.ckd_dir)
+
+    @staticmethod
+    def __select(entries, date):
+        """
+        Returns the last product in sorted order which is valid at date
+        """
+        if date is None:
+            return entries[-1].path if entries else None
+
+        for entry in reversed(entries):
+            if entry.validity_start is not None \
+               and date < entry.validity_start:
+                continue
+            if entry.validity_stop is not None \
+               and date > entry.validity_stop:
+                continue
+            return entry.path
+
+        return None
+
+    def find_static(self, date=None):
+        """
+        Returns path to the Static CKD product valid at date, or the latest
+        product when date is None. Returns None when no product is found
+        """
+        return self.__select(self.static, date)
+
+    def find_dynamic(self, ckd_name, date=None):
+        """
+        Returns path to the dynamic CKD product valid at date, or the latest
+        product when date is None. Returns None when no product is found
+
+        Parameters
+        ----------
+        ckd_name  :  string
+           name of the CKD, e.g. 'offset' selects 'ckd.offset.*'
+        date      :  datetime, optional
+        """
+        prefix = 'ckd.{}.'.format(ckd_name)
+        return self.__select([x for x in self.dynamic
+                              if x.path.name.startswith(prefix)], date)
+
+
+# --------------------------------------------------
+def ckd_cache():
+    """
+    Returns the CKD cache shared by all CKDio objects in this process
+    """
+    global _CKD_CACHE
+
+    if _CKD_CACHE is None:
+        _CKD_CACHE = CKDcache()
+
+    return _CKD_CACHE
+
+
+def ckd_index(ckd_dir):
+    """
+    Returns the index of a CKD directory, the index is only rebuild when
+    CKD products are added or removed
+    """
+    key = str(Path(ckd_dir).resolve())
+    if key not in _CKD_INDEX or not _CKD_INDEX[key].is_current():
+        _CKD_INDEX[key] = CKDindex(ckd_dir)
+
+    return _CKD_INDEX[key]
@@ -5,9 +5,13 @@ https://github.com/rmvanhees/pys5p.git
 
 Provides access to the S5P Static CKD product, type AUX_L1_CKD
 
+The CKD's are read only once per process, see pys5p.ckd_cache. The CKD
+products are selected by validity period when a date is provided. The SWIR
+CKD's are read from a bundle of precomputed CKD's when available, see
+pys5p.ckd_bundle.
+
 ToDo:
  - access to UVN CKD, still incomplete
- - identify latest Static CKD product, e.g. using the validity period
 
 Copyright (c) 2018 SRON - Netherlands Institute for Space Research
    All Rights Reserved
@@ -16,10 +20,13 @@ License:  BSD-3-Clause
 """
 from pathlib import Path
 
-import h5py
 import numpy as np
 
+from .ckd_bundle import CKDbundle
+from .ckd_cache import ckd_cache, ckd_index, file_key
+from .s5p_hdf5 import open_product
 from .s5p_msm import S5Pmsm
+from .s5p_trace import traced
 
 # - global parameters ------------------------------
 
@@ -34,25 +41,49 @@ class CKDio():
     You can request a CKD for one band or for a channel (bands: '12', '34',
     '56', '78'). Do not mix bands from different channels
     """
-    def __init__(self, ckd_dir='/nfs/Tropomi/share/ckd'):
+    def __init__(self, ckd_dir='/nfs/Tropomi/share/ckd', date=None,
+                 use_bundle=True, bundle_dir=None):
         """
         Initialize access to a Tropomi Static CKD product
+
+        Parameters
+        ----------
+        ckd_dir  :  str or Path
+           directory with the Static and dynamic CKD products
+        date     :  datetime, optional
+           select CKD products valid at this date, default latest products
+        use_bundle  :  boolean
+           read SWIR CKD's from a bundle, when generated from the selected
+           CKD products
+        bundle_dir  :  str or Path, optional
+           directory of the bundle, default is 'bundle' in ckd_dir
         """
         # initialize private class-attributes
         self.ckd_file = None
         self.fid = None
+        self.date = date
         self.__header = Path('/METADATA/earth_exploirer_header/fixed_header')
 
         self.ckd_dir = Path(ckd_dir)
         if not self.ckd_dir.is_dir():
             raise FileNotFoundError('directory {} not found'.format(ckd_dir))
 
-        # ToDo use latest version or appropriate validation period
-        res = sorted((self.ckd_dir / 'static').glob('*_AUX_L1_CKD_*'))
-        if not res:
+        self.ckd_file = ckd_index(self.ckd_dir).find_static(date)
+        if self.ckd_file is None:
             raise FileNotFoundError('Static CKD product not found')
-        self.ckd_file = res[-1]
-        self.fid = h5py.File(self.ckd_file, "r")
+        self.fid = open_product(self.ckd_file, "r", product='ckd')
+
+        self.__bundle = None
+        if use_bundle:
+            if bundle_dir is None:
+                bundle_dir = self.ckd_dir / 'bundle'
+            try:
+                bundle = CKDbundle(bundle_dir)
+            except FileNotFoundError:
+                pass
+            else:
+                if bundle.is_current(self.ckd_dir, date):
+                    self.__bundle = bundle
 
     # def __del__(self):
     #    """
@@ -119,7 +150,58 @@ class CKDio():
         return (datetime.strptime(attr_bgn, '%Y%m%dT%H%M%S'),
                 datetime.strptime(attr_end, '%Y%m%dT%H%M%S'))
 
+    # ---------- cached access ----------
+    def __dynamic_file(self, ckd_name):
+        """
+        Returns path to the dynamic CKD product, e.g. ckd.offset.detector4.nc
+        """
+        res = ckd_index(self.ckd_dir).find_dynamic(ckd_name, self.date)
+        if res is None:
+            res = (self.ckd_dir / 'dynamic'
+                   / 'ckd.{}.detector4.nc'.format(ckd_name))
+        return res
+
+    def __from_bundle(self, name, bands):
+        """
+        Returns CKD from the bundle, or None when not available
+        """
+        if self.__bundle is None or bands != '78' \
+           or name not in self.__bundle:
+            return None
+
+        return self.__bundle.get(name)
+
+    def __read(self, ckd_file, dsnames, data_sel=None, datapoint=False):
+        """
+        Returns the datasets concatenated along the columns as S5Pmsm object,
+        the datasets are only read from file when not in the CKD cache
+        """
+        def read_ckd():
+            if ckd_file == self.ckd_file:
+                dsets = [self.fid[dsname] for dsname in dsnames]
+                return S5Pmsm.join(dsets, axis=1, data_sel=data_sel,
+                                   datapoint=datapoint)
+
+            with open_product(ckd_file, 'r', product='ckd') as fid:
+                dsets = [fid[dsname] for dsname in dsnames]
+                return S5Pmsm.join(dsets, axis=1, data_sel=data_sel,
+                                   datapoint=datapoint)
+
+        key = file_key(ckd_file) + (tuple(dsnames), repr(data_sel), datapoint)
+        return ckd_cache().get(key, read_ckd)
+
+    def __read_param(self, ckd_file, dsname):
+        """
+        Returns dataset read from a CKD product
+        """
+        if ckd_file == self.ckd_file:
+            return self.fid[dsname][:]
+
+        with open_product(ckd_file, 'r', product='ckd') as fid:
+            return fid[dsname][:]
+
     # ---------- static CKD's ----------
+    @traced
     def get_param(self, ds_name, band='7'):
         """
         Returns value(s) of a CKD parameter from the Static CKD product.
@@ -154,6 +236,7 @@ class CKDio():
 
         return self.fid[full_name][:]
 
+    @traced
     def memory(self, bands='78'):
         """
         Returns memory CKD, SWIR only
@@ -165,26 +248,25 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('Voltage to Charge only available for SWIR')
 
+        ckd = self.__from_bundle('memory', bands)
+        if ckd is not None:
+            return ckd
+
         long_name = 'SWIR memory CKD'
         ckd_parms = ['mem_lin_neg_swir', 'mem_lin_pos_swir',
                      'mem_qua_neg_swir', 'mem_qua_pos_swir']
         ckd = {}
         for key in ckd_parms:
-            for band in bands:
-                if key not in ckd:
-                    ckd[key] = S5Pmsm(self.fid['/BAND{}/{}'.format(band, key)],
-                                      datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd[key].set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(self.fid['/BAND{}/{}'.format(band, key)],
-                                  datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd[key].concatenate(buff, axis=1)
-
+            dsnames = ['/BAND{}/{}'.format(band, key) for band in bands]
+            ckd[key] = self.__read(self.ckd_file, dsnames,
+                                   data_sel=np.s_[:-1, :], datapoint=True)
+            ckd[key].set_long_name(long_name)
             ckd[key].set_fillvalue()
             ckd[key].fill_as_nan()
 
         return ckd
 
+    @traced
     def dn2v(self, bands='78'):
         """
         Returns digital number to Volt CKD, SWIR only
@@ -196,6 +278,10 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('DN2V factor is only available for SWIR')
 
+        ckd = self.__from_bundle('dn2v', bands)
+        if ckd is not None:
+            return ckd
+
         ckd = S5Pmsm(self.fid['/BAND7/v2c_factor_swir'])
         ckd.set_long_name('SWIR DN2V factor')
         return ckd
@@ -211,6 +297,7 @@ class CKDio():
     #    else:
     #        raise NotImplementedError('not implemented, yet')
 
+    @traced
     def voltage_to_charge(self, bands='78'):
         """
         Returns Voltage to Charge CKD, SWIR only
@@ -226,6 +313,7 @@ class CKDio():
         ckd.set_long_name('SWIR voltage to charge CKD')
         return ckd
 
+    @traced
     def prnu(self, bands='78'):
         """
         Returns Pixel Response Non-Uniformity (PRNU)
@@ -236,6 +324,10 @@ class CKDio():
         if len(bands) > 2:
             raise ValueError('read per band or channel, only')
 
+        ckd = self.__from_bundle('prnu', bands)
+        if ckd is not None:
+            return ckd
+
         data_sel = None
         if '7' in bands or '8' in bands:
             data_sel = np.s_[:-1, :]
@@ -247,20 +339,14 @@ class CKDio():
         else:
             long_name = 'UV PRNU CKD'
 
-        ckd = None
-        for band in bands:
-            if not ckd:
-                ckd = S5Pmsm(self.fid['/BAND{}/PRNU'.format(band)],
-                             datapoint=True, data_sel=data_sel)
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid['/BAND{}/PRNU'.format(band)],
-                              datapoint=True, data_sel=data_sel)
-                ckd.concatenate(buff, axis=1)
-
-            ckd.set_fillvalue()
+        dsnames = ['/BAND{}/PRNU'.format(band) for band in bands]
+        ckd = self.__read(self.ckd_file, dsnames, data_sel=data_sel,
+                          datapoint=True)
+        ckd.set_long_name(long_name)
+        ckd.set_fillvalue()
         return ckd
 
+    @traced
     def absirr(self, qvd=1, bands='78'):
         """
         Returns absolute irradiance responsivity
@@ -281,22 +367,16 @@ class CKDio():
         else:
             long_name = 'UV absolute irradiance CKD (QVD={})'.format(qvd)
 
-        ckd = None
-        for band in bands:
-            dsname = '/BAND{}/abs_irr_conv_factor_qvd{}'.format(band, qvd)
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname],
-                             datapoint=True, data_sel=data_sel)
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname],
-                              datapoint=True, data_sel=data_sel)
-                ckd.concatenate(buff, axis=1)
-
-            ckd.set_fillvalue()
+        dsnames = ['/BAND{}/abs_irr_conv_factor_qvd{}'.format(band, qvd)
+                   for band in bands]
+        ckd = self.__read(self.ckd_file, dsnames, data_sel=data_sel,
+                          datapoint=True)
+        ckd.set_long_name(long_name)
+        ckd.set_fillvalue()
 
         return ckd
 
+    @traced
     def relirr(self, qvd=1, bands='78'):
         """
         Returns relative irradiance correction
@@ -344,6 +424,7 @@ class CKDio():
 
         return res
 
+    @traced
     def absrad(self, bands='78'):
         """
         Returns absolute radiance responsivity
@@ -364,22 +445,16 @@ class CKDio():
         else:
             long_name = 'UV absolute radiance CKD'
 
-        ckd = None
-        for band in bands:
-            dsname = '/BAND{}/abs_rad_conv_factor'.format(band)
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname],
-                             datapoint=True, data_sel=data_sel)
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname],
-                              datapoint=True, data_sel=data_sel)
-                ckd.concatenate(buff, axis=1)
-
-            ckd.set_fillvalue()
+        dsnames = ['/BAND{}/abs_rad_conv_factor'.format(band)
+                   for band in bands]
+        ckd = self.__read(self.ckd_file, dsnames, data_sel=data_sel,
+                          datapoint=True)
+        ckd.set_long_name(long_name)
+        ckd.set_fillvalue()
 
         return ckd
 
+    @traced
     def wavelength(self, bands='78'):
         """
         Returns wavelength CKD
@@ -401,23 +476,17 @@ class CKDio():
         else:
             long_name = 'UV wavelength CKD'
 
-        ckd = None
-        for band in bands:
-            dsname = '/BAND{}/wavelength_map'.format(band)
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname],
-                             datapoint=True, data_sel=data_sel)
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname],
-                              datapoint=True, data_sel=data_sel)
-                ckd.concatenate(buff, axis=1)
-
-            ckd.set_fillvalue()
+        dsnames = ['/BAND{}/wavelength_map'.format(band)
+                   for band in bands]
+        ckd = self.__read(self.ckd_file, dsnames, data_sel=data_sel,
+                          datapoint=True)
+        ckd.set_long_name(long_name)
+        ckd.set_fillvalue()
 
         return ckd
 
     # ---------- external CKD's ----------
+    @traced
     def offset(self, bands='78'):
         """
         Returns offset CKD, SWIR only
@@ -429,46 +498,34 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('Offset CKD is only available for SWIR')
 
-        ckd = None
+        ckd = self.__from_bundle('offset', bands)
+        if ckd is not None:
+            return ckd
+
         long_name = 'SWIR offset CKD'
 
         # try the Static CKD product, first
-        for band in bands:
-            dsname = '/BAND{}/analog_offset_swir'.format(band)
-            if dsname not in self.fid:
-                continue
-
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname],
-                             datapoint=True, data_sel=np.s_[:-1, :])
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname],
-                              datapoint=True, data_sel=np.s_[:-1, :])
-                ckd.concatenate(buff, axis=1)
-
-        if ckd is not None:
+        dsnames = [dsname for dsname in
+                   ('/BAND{}/analog_offset_swir'.format(band)
+                    for band in bands)
+                   if dsname in self.fid]
+        if dsnames:
+            ckd = self.__read(self.ckd_file, dsnames, data_sel=np.s_[:-1, :],
+                              datapoint=True)
+            ckd.set_long_name(long_name)
             ckd.set_fillvalue()
             return ckd
 
         # try the dynamic CKD products
-        ckd_file = self.ckd_dir / 'dynamic' / 'ckd.offset.detector4.nc'
-        with h5py.File(ckd_file, 'r') as fid:
-            for band in bands:
-                dsname = '/BAND{}/analog_offset_swir'.format(band)
-
-                if not ckd:
-                    ckd = S5Pmsm(fid[dsname],
-                                 datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(fid[dsname],
-                                  datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.concatenate(buff, axis=1)
-
+        ckd_file = self.__dynamic_file('offset')
+        dsnames = ['/BAND{}/analog_offset_swir'.format(band) for band in bands]
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :],
+                          datapoint=True)
+        ckd.set_long_name(long_name)
         ckd.set_fillvalue()
         return ckd
 
+    @traced
     def darkflux(self, bands='78'):
         """
         Returns dark-flux CKD, SWIR only
@@ -480,46 +537,33 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('Dark-flux CKD is only available for SWIR')
 
-        ckd = None
+        ckd = self.__from_bundle('darkflux', bands)
+        if ckd is not None:
+            return ckd
+
         long_name = 'SWIR dark-flux CKD'
 
         # try the Static CKD product, first
-        for band in bands:
-            dsname = '/BAND{}/long_term_swir'.format(band)
-            if dsname not in self.fid:
-                continue
-
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname],
-                             datapoint=True, data_sel=np.s_[:-1, :])
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname],
-                              datapoint=True, data_sel=np.s_[:-1, :])
-                ckd.concatenate(buff, axis=1)
-
-        if ckd is not None:
+        dsnames = [dsname for dsname in
+                   ('/BAND{}/long_term_swir'.format(band) for band in bands)
+                   if dsname in self.fid]
+        if dsnames:
+            ckd = self.__read(self.ckd_file, dsnames, data_sel=np.s_[:-1, :],
+                              datapoint=True)
+            ckd.set_long_name(long_name)
             ckd.set_fillvalue()
             return ckd
 
         # try the dynamic CKD products
-        ckd_file = self.ckd_dir / 'dynamic' / 'ckd.dark.detector4.nc'
-        with h5py.File(ckd_file, 'r') as fid:
-            for band in bands:
-                dsname = '/BAND{}/long_term_swir'.format(band)
-
-                if not ckd:
-                    ckd = S5Pmsm(fid[dsname],
-                                 datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(fid[dsname],
-                                  datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.concatenate(buff, axis=1)
-
+        ckd_file = self.__dynamic_file('dark')
+        dsnames = ['/BAND{}/long_term_swir'.format(band) for band in bands]
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :],
+                          datapoint=True)
+        ckd.set_long_name(long_name)
         ckd.set_fillvalue()
         return ckd
 
+    @traced
     def noise(self, bands='78'):
         """
         Returns noise CKD, SWIR only
@@ -532,44 +576,33 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('noise CKD is only available for SWIR')
 
-        ckd = None
+        ckd = self.__from_bundle('noise', bands)
+        if ckd is not None:
+            return ckd
+
         long_name = 'SWIR noise CKD'
 
         # try the Static CKD product, first
-        for band in bands:
-            dsname = '/BAND{}/readout_noise_swir'.format(band)
-            if dsname not in self.fid:
-                continue
-
-            if not ckd:
-                ckd = S5Pmsm(self.fid[dsname], data_sel=np.s_[:-1, :])
-                ckd.set_long_name(long_name)
-            else:
-                buff = S5Pmsm(self.fid[dsname], data_sel=np.s_[:-1, :])
-                ckd.concatenate(buff, axis=1)
-
-        if ckd is not None:
+        dsnames = [dsname for dsname in
+                   ('/BAND{}/readout_noise_swir'.format(band)
+                    for band in bands)
+                   if dsname in self.fid]
+        if dsnames:
+            ckd = self.__read(self.ckd_file, dsnames, data_sel=np.s_[:-1, :])
+            ckd.set_long_name(long_name)
             ckd.set_fillvalue()
             return ckd
 
         # try the dynamic CKD products
-        ckd_file = self.ckd_dir / 'dynamic' / 'ckd.readnoise.detector4.nc'
-        with h5py.File(ckd_file, 'r') as fid:
-            for band in bands:
-                dsname = '/BAND{}/readout_noise_swir'.format(band)
-
-                if not ckd:
-                    ckd = S5Pmsm(fid[dsname],
-                                 datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(fid[dsname],
-                                  datapoint=True, data_sel=np.s_[:-1, :])
-                    ckd.concatenate(buff, axis=1)
-
+        ckd_file = self.__dynamic_file('readnoise')
+        dsnames = ['/BAND{}/readout_noise_swir'.format(band) for band in bands]
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :],
+                          datapoint=True)
+        ckd.set_long_name(long_name)
         ckd.set_fillvalue()
         return ckd
 
+    @traced
     def saturation(self, bands='78'):
         """
         Returns saturation values (pre-offset), SWIR only
@@ -582,24 +615,20 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('saturation CKD is only available for SWIR')
 
-        ckd = None
-        long_name = 'SWIR saturation(pre-offset) CKD'
-        ckd_file = (self.ckd_dir / 'dynamic'
-                    / 'ckd.saturation_preoffset.detector4.nc')
-        with h5py.File(ckd_file, 'r') as fid:
-            for band in bands:
-                dsname = '/BAND{}/saturation_preoffset'.format(band)
-
-                if not ckd:
-                    ckd = S5Pmsm(fid[dsname], data_sel=np.s_[:-1, :])
-                    ckd.set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(fid[dsname], data_sel=np.s_[:-1, :])
-                    ckd.concatenate(buff, axis=1)
+        ckd = self.__from_bundle('saturation', bands)
+        if ckd is not None:
+            return ckd
 
+        long_name = 'SWIR saturation(pre-offset) CKD'
+        ckd_file = self.__dynamic_file('saturation_preoffset')
+        dsnames = ['/BAND{}/saturation_preoffset'.format(band)
+                   for band in bands]
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :])
+        ckd.set_long_name(long_name)
         ckd.set_fillvalue()
         return ckd
 
+    @traced
     def dpqf(self, threshold=None, bands='78'):
         """
         Returns Detector Pixel Quality Mask (boolean), SWIR only
@@ -611,18 +640,24 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('pixel quality CKD is only available for SWIR')
 
-        ckd_file = self.ckd_dir / 'dynamic' / 'ckd.dpqf.detector4.nc'
-        with h5py.File(ckd_file, 'r') as fid:
+        ckd = self.__from_bundle('pixel_quality', bands)
+        if ckd is not None:
             if threshold is None:
-                threshold = fid['/BAND7/dpqf_threshold'][:]
+                threshold = self.__from_bundle('dpqf_threshold', bands)
+            return ckd.value < threshold
+
+        ckd_file = self.__dynamic_file('dpqf')
+        if threshold is None:
+            key = file_key(ckd_file) + ('/BAND7/dpqf_threshold',)
+            threshold = ckd_cache().get(key, lambda: self.__read_param(
+                ckd_file, '/BAND7/dpqf_threshold'))
 
-            dset = fid['/BAND7/dpqf_map']
-            dpqf_b7 = dset[:-1, :]
-            dset = fid['/BAND8/dpqf_map']
-            dpqf_b8 = dset[:-1, :]
+        dsnames = ['/BAND7/dpqf_map', '/BAND8/dpqf_map']
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :])
 
-        return np.hstack((dpqf_b7, dpqf_b8)) < threshold
+        return ckd.value < threshold
 
+    @traced
     def pixel_quality(self, bands='78'):
         """
         Returns Detector Pixel Quality Mask (float [0, 1]), SWIR only
@@ -634,18 +669,14 @@ class CKDio():
         if '7' not in bands and '8' not in bands:
             raise ValueError('pixel quality CKD is only available for SWIR')
 
-        ckd = None
+        ckd = self.__from_bundle('pixel_quality', bands)
+        if ckd is not None:
+            return ckd
+
         long_name = 'SWIR pixel-quality CKD'
-        ckd_file = self.ckd_dir / 'dynamic' / 'ckd.dpqf.detector4.nc'
-        with h5py.File(ckd_file, 'r') as fid:
-            for band in bands:
-                dsname = '/BAND{}/dpqf_map'.format(band)
-
-                if not ckd:
-                    ckd = S5Pmsm(fid[dsname], data_sel=np.s_[:-1, :])
-                    ckd.set_long_name(long_name)
-                else:
-                    buff = S5Pmsm(fid[dsname], data_sel=np.s_[:-1, :])
-                    ckd.concatenate(buff, axis=1)
+        ckd_file = self.__dynamic_file('dpqf')
+        dsnames = ['/BAND{}/dpqf_map'.format(band) for band in bands]
+        ckd = self.__read(ckd_file, dsnames, data_sel=np.s_[:-1, :])
+        ckd.set_long_name(long_name)
 
         return ckd
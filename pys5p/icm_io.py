@@ -15,6 +15,9 @@ from pathlib import Path
 import h5py
 import numpy as np
 
+from .s5p_dtype import DTYPE_POLICY, read_dataset
+from .s5p_hdf5 import open_product
+from .s5p_trace import traced
 from .version import version as __version__
 
 # - global parameters ------------------------------
@@ -28,7 +31,7 @@ class ICMio():
     This class should offer all the necessary functionality to read Tropomi
     ICM_CA_SIR products
     """
-    def __init__(self, icm_product, readwrite=False):
+    def __init__(self, icm_product, readwrite=False, dtype='float64'):
         """
         Initialize access to an ICM product
 
@@ -38,9 +41,15 @@ class ICMio():
            full path to in-flight calibration measurement product
         readwrite   :  boolean
            open product in read-write mode (default is False)
+        dtype       :  {'native', 'float64', 'float32'}
+           dtype policy of get_msm_data, see s5p_dtype.read_dataset
         """
+        if dtype not in DTYPE_POLICY:
+            raise ValueError('unknown dtype policy {}'.format(dtype))
+
         # initialize class-attributes
         self.filename = icm_product
+        self.dtype = dtype
         self.__rw = readwrite
         self.__msm_path = None
         self.__patched_msm = []
@@ -52,9 +61,9 @@ class ICMio():
 
         # open ICM product as HDF5 file
         if readwrite:
-            self.fid = h5py.File(icm_product, "r+")
+            self.fid = open_product(icm_product, "r+", product='icm')
         else:
-            self.fid = h5py.File(icm_product, "r")
+            self.fid = open_product(icm_product, "r", product='icm')
 
     def __repr__(self):
         class_name = type(self).__name__
@@ -371,6 +380,7 @@ class ICMio():
 
         return res
 
+    @traced
     def get_instrument_settings(self, band=None):
         """
         Returns instrument settings of measurement
@@ -468,6 +478,7 @@ class ICMio():
 
         return res
 
+    @traced
     def get_housekeeping_data(self, band=None):
         """
         Returns housekeeping data of measurements
@@ -605,6 +616,7 @@ class ICMio():
 
         return None
 
+    @traced
     def get_geo_data(self, band=None,
                      geo_dset='satellite_latitude,satellite_longitude'):
         """
@@ -667,7 +679,9 @@ class ICMio():
 
         return res
 
-    def get_msm_data(self, msm_dset, band='78', columns=None, fill_as_nan=True):
+    @traced
+    def get_msm_data(self, msm_dset, band='78', columns=None, fill_as_nan=True,
+                     dtype=None):
         """
         Read datasets from a measurement selected by class-method "select"
 
@@ -683,11 +697,14 @@ class ICMio():
             Slice data on fastest axis (columns) as from index 'i' to 'j'
         fill_as_nan :  boolean
             Replace (float) FillValues with Nan's, when True
+        dtype      :  {'native', 'float64', 'float32'}, optional
+            dtype policy, default is the policy of the object
 
         Returns
         -------
         out  :  array
-           Data of measurement dataset "msm_dset" (floats converted to np.float)
+           Data of measurement dataset "msm_dset", floats are converted
+           according to the dtype policy
         """
         fillvalue = float.fromhex('0x1.ep+122')
 
@@ -700,6 +717,9 @@ class ICMio():
         if band not in self.bands:
             raise ValueError('band not found in product')
 
+        if dtype is None:
+            dtype = self.dtype
+
         # skip row257 from the SWIR detector
         rows = None
         if int(band[0]) > 6:
@@ -742,15 +762,11 @@ class ICMio():
                     else:
                         raise ValueError
 
-                if dset.dtype == np.float32:
-                    with dset.astype(np.float):
-                        res = np.squeeze(dset[data_sel])
-                else:
-                    res = np.squeeze(dset[data_sel])
-
-                if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
-                    res[(res == fillvalue)] = np.nan
-                data.append(res)
+                apply_nan = fill_as_nan \
+                    and dset.attrs['_FillValue'] == fillvalue
+                data.append(np.squeeze(read_dataset(
+                    dset, data_sel, policy=dtype,
+                    fillvalue=fillvalue if apply_nan else None)))
 
         # Note the current implementation will not work for channels where
         # the output of its bands can have different spatial dimensions (rows)
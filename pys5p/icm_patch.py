@@ -148,7 +148,7 @@ class ICMpatch():
           requires XML support to read this information
             * I have now used a fixed column selection for each diode-laser.
         """
-        from pys5p.biweight import biweight
+        from pys5p.biweight import biweight_chunked
 
         light_icid = 32096
         if ld_id == 1:
@@ -227,8 +227,8 @@ class ICMpatch():
         with h5py.File(str(data_dir / data_fl), 'r') as fid:
             path = 'BAND{}/ICID_{}_GROUP_00000'.format(band, light_icid-1)
             dset = fid[path + '/OBSERVATIONS/signal']
-            (background, background_std) = biweight(dset[1:, :, :],
-                                                    axis=0, spread=True)
+            (background, background_std) = biweight_chunked(
+                dset, frames=[1, None], spread=True)
 
         # need to read background data of other band!!
         background = np.hstack((background, background))
@@ -0,0 +1,268 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+The class L1BCollection provides read access to a collection of Tropomi
+offline L1b products, for example all orbits of several weeks. The products
+are read in parallel by a pool of worker processes (or threads), while the
+results are returned in the order of the products.
+
+Usage:
+
+  with L1BCollection('/data/L1B/S5P_OFFL_L1B_RA_BD7_*.nc') as l1b:
+      l1b.select()
+      for flname, data in l1b.iter_msm_data('radiance', icid=4):
+          ...
+      geo = l1b.get_geo_data(icid=4)
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+from .l1b_io import L1BioCAL, L1BioIRR, L1BioRAD
+
+
+# - local functions --------------------------------
+def product_class(l1b_product):
+    """
+    Returns the L1b class to read a product, based on its product type
+    """
+    name = Path(l1b_product).name
+    if '_L1B_RA_' in name:
+        return L1BioRAD
+    if '_L1B_IR_' in name:
+        return L1BioIRR
+    if '_L1B_CA_' in name:
+        return L1BioCAL
+
+    raise ValueError('unknown product type of {}'.format(name))
+
+
+def _read_product(args):
+    """
+    Open a L1b product, select a measurement group and call a method,
+    called by the worker processes
+
+    Returns None when the measurement group is not present in the product
+    """
+    (l1b_class, l1b_product, select, method, m_args, m_kwargs) = args
+
+    if l1b_class is None:
+        l1b_class = product_class(l1b_product)
+
+    with l1b_class(l1b_product) as l1b:
+        bands = l1b.select(*select[0], **select[1])
+        if method is None:
+            return bands
+        if not bands:
+            return None
+
+        return getattr(l1b, method)(*m_args, **m_kwargs)
+
+
+# - class definition -------------------------------
+class L1BCollection():
+    """
+    Read measurement data from a collection of Tropomi offline L1b products
+    """
+    def __init__(self, l1b_products, l1b_class=None, max_workers=None,
+                 prefetch=None, use_threads=False):
+        """
+        Parameters
+        ----------
+        l1b_products :  string or list
+           list of L1b products, or a pattern of product names
+        l1b_class    :  class, optional
+           L1BioCAL, L1BioIRR or L1BioRAD, default is derived from the
+           product name
+        max_workers  :  int, optional
+           number of worker processes, default is os.cpu_count()
+        prefetch     :  int, optional
+           maximum number of products read ahead of the consumer,
+           default is twice the number of workers
+        use_threads  :  boolean
+           use a pool of threads instead of processes. Note that h5py
+           serializes all HDF5 calls, thus threads only hide I/O latency
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        from glob import glob
+        from os import cpu_count
+
+        if isinstance(l1b_products, (str, Path)):
+            self.products = sorted(glob(str(l1b_products)))
+        else:
+            self.products = [str(x) for x in l1b_products]
+        if not self.products:
+            raise FileNotFoundError('no L1b products found')
+
+        self.l1b_class = l1b_class
+        self.max_workers = cpu_count() if max_workers is None else max_workers
+        self.prefetch = 2 * self.max_workers if prefetch is None else prefetch
+        if self.prefetch < 1:
+            raise ValueError('prefetch should be at least one')
+        self.bands = None
+        self.__select = ((), {})
+        self.__futures = set()
+
+        if use_threads:
+            self.__executor = ThreadPoolExecutor(self.max_workers)
+        else:
+            self.__executor = ProcessPoolExecutor(self.max_workers)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}({} products, max_workers={!r})'.format(
+            class_name, len(self.products), self.max_workers)
+
+    def __len__(self):
+        return len(self.products)
+
+    def __enter__(self):
+        """
+        method called to initiate the context manager
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        method called when exiting the context manager
+        """
+        self.close()
+        return False  # any exception is raised by the with statement.
+
+    def close(self):
+        """
+        Stop the worker processes
+        """
+        if self.__executor is not None:
+            # cancel the reads which are not started
+            for future in list(self.__futures):
+                future.cancel()
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+
+    # -------------------------
+    def imap(self, method, *args, **kwargs):
+        """
+        Call a method of the L1b class for each product, after selection of
+        the measurement group. At most 'prefetch' products are read ahead.
+
+        Returns
+        -------
+        generator of (product name, result), in the order of the products.
+        The result is None when the measurement group is not present.
+        """
+        if self.__executor is None:
+            raise RuntimeError('collection is closed')
+
+        products = iter(self.products)
+        pending = deque()
+
+        def submit():
+            for l1b_product in products:
+                future = self.__executor.submit(
+                    _read_product, (self.l1b_class, l1b_product,
+                                    self.__select, method, args, kwargs))
+                self.__futures.add(future)
+                future.add_done_callback(self.__futures.discard)
+                pending.append((l1b_product, future))
+                return
+
+        for _ in range(self.prefetch):
+            submit()
+
+        try:
+            while pending:
+                (l1b_product, future) = pending.popleft()
+                res = future.result()
+                submit()
+                yield (l1b_product, res)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def __stack(self, method, *args, **kwargs):
+        """
+        Returns results of all products concatenated along the first axis
+        """
+        res = [x for _, x in self.imap(method, *args, **kwargs)
+               if x is not None]
+        if not res:
+            return None
+
+        if isinstance(res[0], dict):
+            return {key: np.concatenate([np.atleast_1d(x[key]) for x in res],
+                                        axis=0) for key in res[0]}
+
+        return np.concatenate([np.atleast_1d(x) for x in res], axis=0)
+
+    # -------------------------
+    def select(self, *args, **kwargs):
+        """
+        Select a measurement group in all products, the arguments are passed
+        to method 'select' of the L1b class
+
+        Returns
+        -------
+        out   :   list of strings
+           spectral bands found in each product
+        """
+        self.__select = (args, kwargs)
+        self.bands = [x for _, x in self.imap(None)]
+        return self.bands
+
+    def iter_msm_data(self, msm_dset, **kwargs):
+        """
+        Returns generator of (product name, data of measurement dataset)
+
+        See get_msm_data of the L1b class for the parameters
+        """
+        return self.imap('get_msm_data', msm_dset, **kwargs)
+
+    def get_msm_data(self, msm_dset, **kwargs):
+        """
+        Returns data of measurement dataset of all products, concatenated
+        along the first axis
+
+        See get_msm_data of the L1b class for the parameters
+        """
+        return self.__stack('get_msm_data', msm_dset, **kwargs)
+
+    def iter_geo_data(self, **kwargs):
+        """
+        Returns generator of (product name, geolocation data)
+        """
+        return self.imap('get_geo_data', **kwargs)
+
+    def get_geo_data(self, **kwargs):
+        """
+        Returns geolocation data of all products, concatenated along the
+        first axis
+        """
+        return self.__stack('get_geo_data', **kwargs)
+
+    def get_housekeeping_data(self, **kwargs):
+        """
+        Returns housekeeping data of all products, concatenated along the
+        first axis
+        """
+        return self.__stack('get_housekeeping_data', **kwargs)
+
+    def get_ref_time(self, **kwargs):
+        """
+        Returns list with the reference time of each product
+        """
+        return [x for _, x in self.imap('get_ref_time', **kwargs)]
+
+    def get_delta_time(self, **kwargs):
+        """
+        Returns delta time of all products, concatenated along the first axis
+        """
+        return self.__stack('get_delta_time', **kwargs)
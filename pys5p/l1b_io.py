@@ -11,12 +11,17 @@ Copyright (c) 2017 SRON - Netherlands Institute for Space Research
 
 License:  BSD-3-Clause
 """
+from collections import namedtuple
 from pathlib import Path
+from types import MappingProxyType
 
 import h5py
 import numpy as np
 
 from .biweight import biweight
+from .s5p_dtype import read_dataset
+from .s5p_hdf5 import open_product
+from .s5p_trace import traced
 from .version import version as __version__
 
 # - global parameters ------------------------------
@@ -51,7 +56,289 @@ def pad_rows(arr1, arr2):
     return (arr1, arr2)
 
 
+def msm_index(icid_list, delta_time, master_cycle):
+    """
+    Returns index of the measurements: sequence number of each measurement,
+    and the runs of consecutive measurements per ICID
+
+    Parameters
+    ----------
+    icid_list    :  array-like
+       ICID of each measurement
+    delta_time   :  array-like
+       offset from the reference time of each measurement [ms]
+    master_cycle :  float
+       master cycle period [ms]
+
+    Returns
+    -------
+    out  :  MsmIndex
+    """
+    icid_list = np.asarray(icid_list)
+    delta_time = np.asarray(delta_time)
+    length = delta_time.size
+
+    # a new sequence starts at a change of ICID or at a gap in time
+    dt_thres = 10 * master_cycle
+    new_seq = np.ones(length, dtype=bool)
+    new_seq[1:] = ((np.diff(delta_time.astype(float)) > dt_thres)
+                   | (np.diff(icid_list.astype(int)) != 0))
+    sequence = np.cumsum(new_seq, dtype=np.int64) - 1
+
+    # runs of consecutive measurements with the same ICID
+    run_bgn = np.flatnonzero(np.diff(icid_list.astype(int), prepend=-1))
+    run_end = np.append(run_bgn[1:], length)
+    runs = {}
+    for icid in np.unique(icid_list):
+        mask = icid_list[run_bgn] == icid
+        runs[int(icid)] = tuple(zip(run_bgn[mask].tolist(),
+                                    run_end[mask].tolist()))
+
+    res = MsmIndex(icid_list.astype('u2'), sequence.astype('u2'),
+                   delta_time.astype('u4'), MappingProxyType(runs))
+    for arr in res[:3]:
+        arr.flags.writeable = False
+
+    return res
+
+
+def read_runs(dset, runs):
+    """
+    Read the measurements of the runs (start, stop) from a dataset with
+    dimensions (time, scanline, ...) into one preallocated array
+    """
+    size = sum(iend - ibgn for ibgn, iend in runs)
+    res = np.empty((size,) + dset.shape[2:], dtype=dset.dtype)
+
+    offs = 0
+    for ibgn, iend in runs:
+        dset.read_direct(res, np.s_[0, ibgn:iend, ...],
+                         np.s_[offs:offs + iend - ibgn, ...])
+        offs += iend - ibgn
+
+    return res
+
+
+def scanline_blocks(runs, block):
+    """
+    Split runs (start, stop) of measurements in blocks of at most 'block'
+    scanlines, the boundaries of the blocks are multiples of 'block'
+
+    Returns
+    -------
+    generator of (start, stop)
+    """
+    for ibgn, iend in runs:
+        while ibgn < iend:
+            istop = min(iend, (ibgn // block + 1) * block)
+            yield (ibgn, istop)
+            ibgn = istop
+
+
+def patch_flags(dset, set_bits=0, clear_bits=0, block=None, runs=None):
+    """
+    Set and clear bits of a flag dataset with dimensions (time, scanline,
+    ...), in-place and in blocks of scanlines. Only chunks with modified
+    flags are written.
+
+    Parameters
+    ----------
+    dset       :  h5py.Dataset
+       dataset with integer flags, opened with read/write access
+    set_bits   :  integer or array-like
+       bits to be set, array-like is broadcast to the dimensions of
+       a scanline, e.g. (ground_pixel, spectral_channel)
+    clear_bits :  integer or array-like
+       bits to be cleared (before setting set_bits)
+    block      :  integer, optional
+       number of scanlines per block, rounded up to a multiple of the chunk
+       size of the dataset. Default is the chunk size
+    runs       :  list of (start, stop), optional
+       only patch the flags of these scanlines, default all scanlines
+
+    Returns
+    -------
+    out   :   integer
+       number of chunks written
+    """
+    if not np.issubdtype(dset.dtype, np.integer):
+        raise TypeError('dataset {} has no integer flags'.format(dset.name))
+
+    set_bits = np.asarray(set_bits).astype(dset.dtype)
+    keep_bits = np.invert(np.asarray(clear_bits).astype(dset.dtype))
+
+    nscans = dset.shape[1]
+    chunk = dset.chunks[1] if dset.chunks is not None else nscans
+    if block is None:
+        block = chunk
+    elif block < 1:
+        raise ValueError('block should be at least one scanline')
+    block = chunk * -(-block // chunk)
+    if runs is None:
+        runs = ((0, nscans),)
+
+    buff = np.empty((min(block, nscans),) + dset.shape[2:], dtype=dset.dtype)
+    orig = np.empty_like(buff)
+    nchunks = 0
+    for ibgn, iend in scanline_blocks(runs, block):
+        data = buff[:iend - ibgn]
+        dset.read_direct(data, np.s_[0, ibgn:iend, ...])
+        np.copyto(orig[:iend - ibgn], data)
+        np.bitwise_and(data, keep_bits, out=data)
+        np.bitwise_or(data, set_bits, out=data)
+        if np.array_equal(data, orig[:iend - ibgn]):
+            continue
+
+        if dset.chunks is None:
+            dset.write_direct(data, dest_sel=np.s_[0, ibgn:iend, ...])
+            nchunks += 1
+            continue
+
+        block_sel = (slice(0, 1), slice(ibgn, iend)) \
+            + tuple(slice(0, x) for x in dset.shape[2:])
+        for dest_sel in dset.iter_chunks(block_sel):
+            source_sel = (slice(dest_sel[1].start - ibgn,
+                                dest_sel[1].stop - ibgn),) + dest_sel[2:]
+            if np.array_equal(data[source_sel], orig[source_sel]):
+                continue
+            dset.write_direct(data, source_sel=source_sel,
+                              dest_sel=(0,) + dest_sel[1:])
+            nchunks += 1
+
+    return nchunks
+
+
+def _as_slice(sel, size):
+    """
+    Returns start and stop of a contiguous selection: None, [i, j] or slice
+    """
+    if sel is None:
+        return (0, size)
+    if not isinstance(sel, slice):
+        sel = slice(*sel)
+
+    (start, stop, step) = sel.indices(size)
+    if step != 1:
+        raise ValueError('selection should be contiguous, step 1')
+
+    return (start, max(start, stop))
+
+
+def band_selections(shapes, frames=None, rows=None, columns=None):
+    """
+    Returns the selection of the measurement dataset of each band, with
+    dimensions (time, scanline, pixel, spectral_channel). The columns are
+    given in the detector layout, where the bands are concatenated along
+    the columns, thus a column range can cross the band 7/8 boundary
+
+    Parameters
+    ----------
+    shapes   :  list of tuples
+       shape of the dataset of each band
+    frames   :  [i, j] or slice, optional
+       select scanlines (frames)
+    rows     :  [i, j] or slice, optional
+       select rows (pixels)
+    columns  :  [i, j] or slice, optional
+       select columns (spectral channels) in the detector layout, requires
+       datasets with four dimensions
+
+    Returns
+    -------
+    list with the selection (tuple) of each band, or None for a band
+    without selected columns
+    """
+    if columns is not None and any(len(x) < 4 for x in shapes):
+        raise ValueError('columns can only be selected in datasets with'
+                         ' a spectral_channel dimension')
+
+    res = []
+    if columns is None:
+        col_sel = [slice(None)] * len(shapes)
+    else:
+        (first, last) = _as_slice(columns, sum(x[-1] for x in shapes))
+        col_sel = []
+        offs = 0
+        for shape in shapes:
+            col_sel.append(slice(min(max(first - offs, 0), shape[-1]),
+                                 min(max(last - offs, 0), shape[-1])))
+            offs += shape[-1]
+        # keep the first band when no columns are selected
+        if all(x.start == x.stop for x in col_sel):
+            col_sel[1:] = [None] * (len(shapes) - 1)
+        else:
+            col_sel = [x if x.start < x.stop else None for x in col_sel]
+
+    for shape, sel in zip(shapes, col_sel):
+        if sel is None:
+            res.append(None)
+            continue
+
+        data_sel = (slice(None),)
+        for dim_sel, ii in ((frames, 1), (rows, 2)):
+            if len(shape) > ii:
+                data_sel += (slice(*_as_slice(dim_sel, shape[ii])),)
+        if len(shape) > 3:
+            data_sel += (sel,)
+        res.append(data_sel + (Ellipsis,))
+
+    return res
+
+
 # - class definition -------------------------------
+class ScanBlock(namedtuple('ScanBlock', 'scanline data geo quality')):
+    """
+    Block of consecutive scanlines, see L1BioRAD.iter_scanlines
+
+    Attributes
+    ----------
+    scanline   :  slice
+       indices of the scanlines in the measurement group
+    data       :  ndarray
+       measurement data with dimensions (scanline, ground_pixel, ...)
+    geo        :  dict
+       geolocation data of the scanlines, or None
+    quality    :  dict
+       quality flags of the scanlines, or None
+    """
+    __slots__ = ()
+
+
+class MsmIndex(namedtuple('MsmIndex', 'icid sequence delta_time runs')):
+    """
+    Immutable index of the measurements in a measurement group
+
+    Attributes
+    ----------
+    icid       :  ndarray
+       ICID of each measurement
+    sequence   :  ndarray
+       sequence number of each measurement
+    delta_time :  ndarray
+       offset from the reference time of each measurement [ms]
+    runs       :  mapping
+       per ICID the (start, stop) of each run of consecutive measurements
+    """
+    __slots__ = ()
+
+    def size(self, icid):
+        """
+        Returns number of measurements with given ICID
+        """
+        return sum(x[1] - x[0] for x in self.runs.get(icid, ()))
+
+    def indices(self, icid):
+        """
+        Returns indices of the measurements with given ICID
+        """
+        runs = self.runs.get(icid, ())
+        if not runs:
+            return np.zeros(0, dtype=np.uint32)
+
+        return np.concatenate([np.arange(ibgn, iend, dtype=np.uint32)
+                               for ibgn, iend in runs])
+
+
 class L1Bio():
     """
     super class with general function to access Tropomi offline L1b products
@@ -68,15 +355,17 @@ class L1Bio():
         self.__patched_msm = []
         self.fid = None
         self.imsm = None
+        self.msm_index = None
+        self.__msm_index = {}
 
         # open L1b product as HDF5 file
         if not Path(l1b_product).is_file():
             raise FileNotFoundError('{} does not exist'.format(l1b_product))
 
         if readwrite:
-            self.fid = h5py.File(l1b_product, "r+")
+            self.fid = open_product(l1b_product, "r+", product='l1b')
         else:
-            self.fid = h5py.File(l1b_product, "r")
+            self.fid = open_product(l1b_product, "r", product='l1b')
 
     def __repr__(self):
         class_name = type(self).__name__
@@ -333,39 +622,58 @@ class L1Bio():
         -------
         out  :  array-like
           Numpy rec-array with sequence number, ICID and delta-time
+
+        Notes
+        -----
+        Updated object attributes:
+         - imsm       : rec-array with sequence number, ICID and delta-time
+         - msm_index  : immutable index of the measurements, see MsmIndex
         """
         if msm_path is None:
             self.imsm = None
+            self.msm_index = None
             return
 
+        index = self.get_msm_index(msm_path)
+        self.msm_index = index
+        self.imsm = np.empty((index.icid.size,), dtype=[('icid', 'u2'),
+                                                        ('sequence', 'u2'),
+                                                        ('index', 'u4'),
+                                                        ('delta_time', 'u4')])
+        self.imsm['icid'] = index.icid
+        self.imsm['sequence'] = index.sequence
+        self.imsm['index'] = np.arange(index.icid.size, dtype=np.uint32)
+        self.imsm['delta_time'] = index.delta_time
+
+    # ---------- class L1Bio::
+    def get_msm_index(self, msm_path):
+        """
+        Returns index of the measurements in group "msm_path", the index is
+        read only once per measurement group
+
+        Parameters
+        ----------
+        msm_path  :  string
+           Full path to measurement group
+
+        Returns
+        -------
+        out  :  MsmIndex
+        """
+        if msm_path in self.__msm_index:
+            return self.__msm_index[msm_path]
+
         grp = self.fid[str(Path(msm_path, 'INSTRUMENT'))]
         icid_list = np.squeeze(grp['instrument_configuration']['ic_id'])
         master_cycle = grp['instrument_settings']['master_cycle_period_us'][0]
         master_cycle /= 1000
         grp = self.fid[str(Path(msm_path, 'OBSERVATIONS'))]
         delta_time = np.squeeze(grp['delta_time'])
-        length = delta_time.size
-        self.imsm = np.empty((length,), dtype=[('icid', 'u2'),
-                                               ('sequence', 'u2'),
-                                               ('index', 'u4'),
-                                               ('delta_time', 'u4')])
-        self.imsm['icid'] = icid_list
-        self.imsm['index'] = np.arange(length, dtype=np.uint32)
-        self.imsm['delta_time'] = delta_time
-        if length == 1:
-            self.imsm['sequence'] = [0]
-            return
 
-        buff_icid = np.concatenate(([icid_list[0]-10], icid_list,
-                                    [icid_list[-1]+10]))
-        dt_thres = 10 * master_cycle
-        buff_time = np.concatenate(([delta_time[0] - 10 * dt_thres], delta_time,
-                                    [delta_time[-1] + 10 * dt_thres]))
-
-        indx = np.where(((buff_time[1:] - buff_time[0:-1]) > dt_thres)
-                        | ((buff_icid[1:] - buff_icid[0:-1]) != 0))[0]
-        for ii in range(len(indx)-1):
-            self.imsm['sequence'][indx[ii]:indx[ii+1]] = ii
+        index = msm_index(np.atleast_1d(icid_list),
+                          np.atleast_1d(delta_time), master_cycle)
+        self.__msm_index[msm_path] = index
+        return index
 
     # ---------- class L1Bio::
     def msm_attr(self, msm_path, msm_dset, attr_name):
@@ -399,7 +707,8 @@ class L1Bio():
         return None
 
     # ---------- class L1Bio::
-    def _get_msm_data(self, msm_path, msm_dset, icid=None, fill_as_nan=False):
+    def _get_msm_data(self, msm_path, msm_dset, icid=None, fill_as_nan=False,
+                      data_sel=None):
         """
         Reads data from dataset "msm_dset" in group "msm_path"
 
@@ -413,6 +722,9 @@ class L1Bio():
             Select measurement data of measurements with given ICID
         fill_as_nan :  boolean
             Set data values equal (KNMI) FillValue to NaN
+        data_sel    :  tuple, optional
+            Read only this hyperslab of the dataset, ignored when icid
+            is given
 
         Returns
         -------
@@ -428,31 +740,121 @@ class L1Bio():
         dset = self.fid[ds_path]
 
         if icid is None:
-            if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
-                data = np.squeeze(dset)
-                data[(data == fillvalue)] = np.nan
-                return data
+            apply_nan = fill_as_nan and dset.attrs['_FillValue'] == fillvalue
+            res = read_dataset(dset, () if data_sel is None else data_sel,
+                               policy='native',
+                               fillvalue=fillvalue if apply_nan else None)
+            # only squeeze dimensions of the dataset of length one, thus
+            # a selection of one frame, row or column keeps its dimension
+            return res.reshape(tuple(x for x, y in zip(res.shape, dset.shape)
+                                     if y != 1))
+
+        res = read_runs(dset, self.get_msm_index(msm_path).runs.get(icid, ()))
+        if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
+            res[(res == fillvalue)] = np.nan
 
-            return np.squeeze(dset)
+        return res
 
-        if self.imsm is None:
-            return None
-        indx = self.imsm['index'][self.imsm['icid'] == icid]
-        buff = np.concatenate(([indx[0]-10], indx, [indx[-1]+10]))
-        kk = np.where((buff[1:] - buff[0:-1]) != 1)[0]
+    # ---------- class L1Bio::
+    def _msm_selections(self, msm_path, msm_dset, band, frames=None,
+                        rows=None, columns=None):
+        """
+        Returns the selection of dataset "msm_dset" of each band, see
+        band_selections
+        """
+        if frames is None and rows is None and columns is None:
+            return [()] * len(band)
 
-        res = None
-        for ii in range(len(kk)-1):
-            ibgn = indx[kk[ii]]
-            iend = indx[kk[ii+1]-1]+1
-            data = dset[0, ibgn:iend, :, :]
-            if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
-                data[(data == fillvalue)] = np.nan
+        shapes = [self.fid[str(Path(msm_path.replace('%', ii),
+                                    'OBSERVATIONS', msm_dset))].shape
+                  for ii in band]
+        return band_selections(shapes, frames=frames, rows=rows,
+                               columns=columns)
 
-            if res is None:
-                res = data
-            else:
-                res = np.append(res, data, axis=0)
+    # ---------- class L1Bio::
+    def _iter_msm_data(self, msm_path, msm_dset, block=None, icid=None,
+                       geo_dset=None, quality_dset=None, fill_as_nan=False):
+        """
+        Generator which reads dataset "msm_dset" in group "msm_path" in
+        blocks of scanlines, see L1BioRAD.iter_scanlines
+        """
+        fillvalue = float.fromhex('0x1.ep+122')
+
+        if msm_path is None:
+            return
+
+        dset = self.fid[str(Path(msm_path, 'OBSERVATIONS', msm_dset))]
+        nscans = dset.shape[1]
+
+        # align the blocks with the chunks of the dataset
+        chunk = dset.chunks[1] if dset.chunks is not None else 1
+        if block is None:
+            block = chunk
+        elif block < 1:
+            raise ValueError('block should be at least one scanline')
+        block = chunk * -(-block // chunk)
+
+        if icid is None:
+            runs = ((0, nscans),)
+        else:
+            runs = self.get_msm_index(msm_path).runs.get(icid, ())
+
+        # preallocate buffers, which are reused for each block
+        dsets = {'data': dset}
+        for key, grp_name, names in (('geo', 'GEODATA', geo_dset),
+                                     ('quality', 'OBSERVATIONS',
+                                      quality_dset)):
+            if names is None:
+                continue
+            grp = self.fid[str(Path(msm_path, grp_name))]
+            for name in names.split(','):
+                dsets[(key, name)] = grp[name]
+        buffers = {key: np.empty((min(block, nscans),) + x.shape[2:],
+                                 dtype=x.dtype)
+                   for key, x in dsets.items()}
+        apply_nan = fill_as_nan and dset.attrs['_FillValue'] == fillvalue
+
+        for ibgn, iend in scanline_blocks(runs, block):
+            res = {}
+            for key, dset_in in dsets.items():
+                buff = buffers[key][:iend - ibgn]
+                dset_in.read_direct(buff, np.s_[0, ibgn:iend, ...])
+                res[key] = buff
+            if apply_nan:
+                res['data'][(res['data'] == fillvalue)] = np.nan
+
+            yield ScanBlock(
+                slice(ibgn, iend), res['data'],
+                None if geo_dset is None else
+                {x[1]: res[x] for x in res if x[0] == 'geo'},
+                None if quality_dset is None else
+                {x[1]: res[x] for x in res if x[0] == 'quality'})
+
+    # ---------- class L1Bio::
+    def _patch_flags(self, msm_path, msm_dset, set_bits=0, clear_bits=0,
+                     block=None, icid=None):
+        """
+        Set and clear bits of flag dataset "msm_dset" in group "msm_path",
+        see function patch_flags
+        """
+        if msm_path is None:
+            return 0
+
+        # we will overwrite existing data, thus readwrite access is required
+        if not self.__rw:
+            raise PermissionError('read/write access required')
+
+        ds_path = str(Path(msm_path, 'OBSERVATIONS', msm_dset))
+        runs = None
+        if icid is not None:
+            runs = self.get_msm_index(msm_path).runs.get(icid, ())
+
+        res = patch_flags(self.fid[ds_path], set_bits=set_bits,
+                          clear_bits=clear_bits, block=block, runs=runs)
+
+        # update patch logging
+        if res > 0 and ds_path not in self.__patched_msm:
+            self.__patched_msm.append(ds_path)
 
         return res
 
@@ -491,16 +893,11 @@ class L1Bio():
 
             dset[0, ...] = write_data
         else:
-            if self.imsm is None:
-                return
-            indx = self.imsm['index'][self.imsm['icid'] == icid]
-            buff = np.concatenate(([indx[0]-10], indx, [indx[-1]+10]))
-            kk = np.where((buff[1:] - buff[0:-1]) != 1)[0]
-
-            for ii in range(len(kk)-1):
-                ibgn = indx[kk[ii]]
-                iend = indx[kk[ii+1]-1]+1
-                dset[0, ibgn:iend, :, :] = write_data[kk[ii]:kk[ii+1], :, :]
+            offs = 0
+            for ibgn, iend in self.get_msm_index(msm_path).runs.get(icid, ()):
+                dset[0, ibgn:iend, :, :] = \
+                    write_data[offs:offs + iend - ibgn, :, :]
+                offs += iend - ibgn
 
         # update patch logging
         self.__patched_msm.append(ds_path)
@@ -593,6 +990,7 @@ class L1BioCAL(L1Bio):
         return super().delta_time(self.__msm_path.replace('%', band))
 
     # ---------- class L1BioCAL::
+    @traced
     def get_instrument_settings(self, band=None):
         """
         Returns instrument settings of measurement
@@ -636,6 +1034,7 @@ class L1BioCAL(L1Bio):
                               instr['int_hold']) for instr in instr_arr]
 
     # ---------- class L1BioCAL::
+    @traced
     def get_housekeeping_data(self, band=None):
         """
         Returns housekeeping data of measurements
@@ -652,6 +1051,7 @@ class L1BioCAL(L1Bio):
         return super().housekeeping_data(self.__msm_path.replace('%', band))
 
     # ---------- class L1BioCAL::
+    @traced
     def get_geo_data(self, band=None,
                      geo_dset='satellite_latitude,satellite_longitude'):
         """
@@ -715,8 +1115,10 @@ class L1BioCAL(L1Bio):
                                 msm_dset, attr_name)
 
     # ---------- class L1BioCAL::
+    @traced
     def get_msm_data(self, msm_dset, band='78', msm_to_row=None,
-                     fill_as_nan=False):
+                     fill_as_nan=False, frames=None, rows=None,
+                     columns=None):
         """
         Returns data of measurement dataset "msm_dset"
 
@@ -733,6 +1135,13 @@ class L1BioCAL(L1Bio):
             rebinned according 'measurement_to_detector_row_table'
             - Default for spectral bands is to return the data as stored.
             - Default for spectral channels is to apply padding
+        frames     :  [i, j] or slice, optional
+            Select frames (scanlines) from index 'i' to 'j'
+        rows       :  [i, j] or slice, optional
+            Select rows from index 'i' to 'j'
+        columns    :  [i, j] or slice, optional
+            Select columns from index 'i' to 'j', in the layout of the
+            selected bands, e.g. swir_region.coords('level2')[1]
 
         Returns
         -------
@@ -748,10 +1157,15 @@ class L1BioCAL(L1Bio):
         if len(band) == 2 and msm_to_row is None:
             msm_to_row = 'padding'
 
+        selections = self._msm_selections(self.__msm_path, msm_dset, band,
+                                          frames, rows, columns)
         data = ()
-        for ii in band:
+        for ii, data_sel in zip(band, selections):
+            if data_sel is None:
+                continue
             data += (super()._get_msm_data(self.__msm_path.replace('%', ii),
-                                           msm_dset, fill_as_nan=fill_as_nan),)
+                                           msm_dset, fill_as_nan=fill_as_nan,
+                                           data_sel=data_sel),)
         if len(data) == 1:
             return data[0]
 
@@ -855,6 +1269,7 @@ class L1BioIRR(L1Bio):
         return super().delta_time(self.__msm_path.replace('%', band))
 
     # ---------- class L1BioIRR::
+    @traced
     def get_instrument_settings(self, band=None):
         """
         Returns instrument settings of measurement
@@ -892,6 +1307,7 @@ class L1BioIRR(L1Bio):
                               instr['int_hold']) for instr in instr_arr]
 
     # ---------- class L1BioIRR::
+    @traced
     def get_housekeeping_data(self, band=None):
         """
         Returns housekeeping data of measurements
@@ -928,8 +1344,10 @@ class L1BioIRR(L1Bio):
                                 msm_dset, attr_name)
 
     # ---------- class L1BioIRR::
+    @traced
     def get_msm_data(self, msm_dset, band='78', msm_to_row=None,
-                     fill_as_nan=False):
+                     fill_as_nan=False, frames=None, rows=None,
+                     columns=None):
         """
         Returns data of measurement dataset "msm_dset"
 
@@ -946,6 +1364,13 @@ class L1BioIRR(L1Bio):
             rebinned according 'measurement_to_detector_row_table'
             - Default for spectral bands is to return the data as stored.
             - Default for spectral channels is to apply padding.
+        frames     :  [i, j] or slice, optional
+            Select frames (scanlines) from index 'i' to 'j'
+        rows       :  [i, j] or slice, optional
+            Select rows from index 'i' to 'j'
+        columns    :  [i, j] or slice, optional
+            Select columns from index 'i' to 'j', in the layout of the
+            selected bands, e.g. swir_region.coords('level2')[1]
 
         Returns
         -------
@@ -961,10 +1386,15 @@ class L1BioIRR(L1Bio):
         if len(band) == 2 and msm_to_row is None:
             msm_to_row = 'padding'
 
+        selections = self._msm_selections(self.__msm_path, msm_dset, band,
+                                          frames, rows, columns)
         res = None
-        for ii in band:
+        for ii, data_sel in zip(band, selections):
+            if data_sel is None:
+                continue
             data = super()._get_msm_data(self.__msm_path.replace('%', ii),
-                                         msm_dset, fill_as_nan=fill_as_nan)
+                                         msm_dset, fill_as_nan=fill_as_nan,
+                                         data_sel=data_sel)
             if res is None:
                 res = data
             else:
@@ -1068,6 +1498,7 @@ class L1BioRAD(L1Bio):
         return super().delta_time(self.__msm_path)
 
     # ---------- class L1BioRAD::
+    @traced
     def get_instrument_settings(self):
         """
         Returns instrument settings of measurement
@@ -1092,6 +1523,7 @@ class L1BioRAD(L1Bio):
                               instr['int_hold']) for instr in instr_arr]
 
     # ---------- class L1BioRAD::
+    @traced
     def get_housekeeping_data(self, icid=None):
         """
         Returns housekeeping data of measurements
@@ -1109,10 +1541,12 @@ class L1BioRAD(L1Bio):
         if icid is None:
             return super().housekeeping_data(self.__msm_path)
 
-        res = super().housekeeping_data(self.__msm_path)
-        return res[self.imsm['icid'] == icid]
+        grp = self.fid[str(Path(self.__msm_path, 'INSTRUMENT'))]
+        runs = super().get_msm_index(self.__msm_path).runs.get(icid, ())
+        return read_runs(grp['housekeeping_data'], runs)
 
     # ---------- class L1BioRAD::
+    @traced
     def get_geo_data(self, geo_dset='latitude,longitude', icid=None):
         """
         Returns data of selected datasets from the GEODATA group
@@ -1140,25 +1574,24 @@ class L1BioRAD(L1Bio):
             for name in geo_dset.split(','):
                 dtype.append((name, 'f4'))
             res = np.empty((nscans, nrows), dtype=dtype)
-            for ii in range(nscans):
-                res['sequence'][ii, :] = self.imsm['sequence'][ii]
+            res['sequence'] = self.imsm['sequence'][:, np.newaxis]
 
             for name in geo_dset.split(','):
                 res[name][...] = grp[name][0, :, :]
         else:
-            indx = self.imsm['index'][self.imsm['icid'] == icid]
-            nscans = len(indx)
+            index = super().get_msm_index(self.__msm_path)
+            runs = index.runs.get(icid, ())
+            nscans = index.size(icid)
 
             dtype = [('sequence', 'u2')]
             for name in geo_dset.split(','):
                 dtype.append((name, 'f4'))
             res = np.empty((nscans, nrows), dtype=dtype)
-            res['sequence'][:, :] = np.repeat(
-                self.imsm['sequence'][indx],
-                nrows, axis=0).reshape(nscans, nrows)
+            res['sequence'] = index.sequence[index.indices(icid),
+                                             np.newaxis]
 
             for name in geo_dset.split(','):
-                res[name][:, :] = grp[name][0, indx, :]
+                res[name] = read_runs(grp[name], runs)
 
         return res
 
@@ -1183,6 +1616,7 @@ class L1BioRAD(L1Bio):
         return super().msm_attr(self.__msm_path, msm_dset, attr_name)
 
     # ---------- class L1BioRAD::
+    @traced
     def get_msm_data(self, msm_dset, icid=None, msm_to_row=None,
                      fill_as_nan=False):
         """
@@ -1209,6 +1643,84 @@ class L1BioRAD(L1Bio):
                                          icid=icid, fill_as_nan=fill_as_nan)
         return None
 
+    # ---------- class L1BioRAD::
+    def iter_scanlines(self, msm_dset, block=None, icid=None, geo_dset=None,
+                       quality_dset=None, fill_as_nan=False):
+        """
+        Generator which reads measurement dataset "msm_dset" in blocks of
+        scanlines, thus the data is processed in constant memory
+
+        Parameters
+        ----------
+        msm_dset  :  string
+           Name of measurement dataset
+        block     :  integer, optional
+           Number of scanlines per block, rounded up to a multiple of the
+           chunk size of the dataset. Default is the chunk size
+        icid  :   integer
+           Select measurement data of measurements with given ICID
+        geo_dset  :  string, optional
+           Name(s) of datasets in the GEODATA group, comma separated
+        quality_dset :  string, optional
+           Name(s) of quality datasets in the OBSERVATIONS group,
+           comma separated, e.g. 'quality_level,spectral_channel_quality'
+        fill_as_nan :  boolean
+           Set data values equal (KNMI) FillValue to NaN
+
+        Returns
+        -------
+        out   :   generator of ScanBlock
+           the arrays are views of buffers which are reused for the next
+           block, thus copy the data to keep it
+
+        Examples
+        --------
+        >>> for scans in l1b.iter_scanlines('radiance', block=64,
+        ...                                 geo_dset='latitude'):
+        ...     mean[scans.scanline] = np.nanmean(scans.data, axis=2)
+        """
+        return super()._iter_msm_data(self.__msm_path, msm_dset, block=block,
+                                      icid=icid, geo_dset=geo_dset,
+                                      quality_dset=quality_dset,
+                                      fill_as_nan=fill_as_nan)
+
+    # ---------- class L1BioRAD::
+    def patch_flags(self, msm_dset, set_bits=0, clear_bits=0, block=None,
+                    icid=None):
+        """
+        Set and clear bits of flag dataset "msm_dset", in-place
+
+        Parameters
+        ----------
+        msm_dset   :  string
+           Name of measurement dataset with integer flags, for example
+           'spectral_channel_quality'
+        set_bits   :  integer or array-like
+           Bits to be set, array-like is broadcast to the dimensions of a
+           scanline (ground_pixel, spectral_channel)
+        clear_bits :  integer or array-like
+           Bits to be cleared (before setting set_bits)
+        block      :  integer, optional
+           Number of scanlines processed at once, see iter_scanlines
+        icid       :  integer
+           Only patch flags of measurements with given ICID
+
+        Returns
+        -------
+        out   :   integer
+           number of chunks written
+
+        Examples
+        --------
+        Flag pixels with a bad pixel-quality in bit 2
+
+        >>> l1b.patch_flags('spectral_channel_quality', clear_bits=2,
+        ...                 set_bits=np.where(dpqm < 0.8, 2, 0))
+        """
+        return super()._patch_flags(self.__msm_path, msm_dset,
+                                    set_bits=set_bits, clear_bits=clear_bits,
+                                    block=block, icid=icid)
+
     # ---------- class L1BioRAD::
     def set_msm_data(self, msm_dset, data, icid=None):
         """
@@ -1264,6 +1776,7 @@ class L1BioENG(L1Bio):
         return self.fid['/SATELLITE_INFO/satellite_pos'][:]
 
     # ---------- class L1BioENG::
+    @traced
     def get_msmtset_db(self):
         """
         Returns compressed msmtset from L1B_ENG_DB/MSMTSET/msmtset
@@ -1314,6 +1827,7 @@ class L1BioENG(L1Bio):
         return msmt
 
     # ---------- class L1BioENG::
+    @traced
     def get_swir_hk_db(self, stats=None, fill_as_nan=False):
         """
         Returns the most important SWIR house keeping parameters
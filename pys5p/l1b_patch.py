@@ -11,18 +11,15 @@ Copyright (c) 2017 SRON - Netherlands Institute for Space Research
 
 License:  BSD-3-Clause
 """
-from pathlib import Path
-
-import shutil
+from pathlib import Path, PurePosixPath
 
 import h5py
 import numpy as np
 
 from pys5p.l1b_io import L1BioRAD
-
-# - global variables --------------------------------
-_MSG_ERR_IO_BAND_ = 'spectral band of input and output products do not match'
-
+from pys5p.s5p_compare import compare_datasets
+from pys5p.s5p_overlay import (copy_product, create_overlay, materialize,
+                               overlay_require)
 
 # - local functions --------------------------------
 
@@ -33,9 +30,22 @@ class L1Bpatch():
     Definition off class L1Bpatch
     """
     def __init__(self, l1b_product: str, data_dir='/tmp',
-                 ckd_dir='/nfs/Tropomi/share/ckd') -> None:
+                 ckd_dir='/nfs/Tropomi/share/ckd', overlay=False) -> None:
         """
         Initialize access to a Tropomi offline L1b product
+
+        Parameters
+        ----------
+        l1b_product :  string
+           name of the L1b radiance product
+        data_dir    :  string
+           directory to store the patched product
+        ckd_dir     :  string
+           directory with the SWIR CKD products
+        overlay     :  boolean
+           write only the patched datasets to an overlay, which refers to
+           the original product for all other data. Use materialize to
+           generate the complete patched product.
         """
         prod_type = Path(l1b_product).name[0:15]
         if prod_type not in ('S5P_OFFL_L1B_RA', 'S5P_RPRO_L1B_RA'):
@@ -48,8 +58,11 @@ class L1Bpatch():
             self.data_dir.mkdir(mode=0o755)
         self.ckd_dir = Path(ckd_dir)
         self.l1b_product = Path(l1b_product)
+        self.overlay = overlay
         self.l1b_patched = \
             self.data_dir / self.l1b_product.name.replace('_01_', '_99_')
+        if overlay:
+            self.l1b_patched = self.l1b_patched.with_suffix('.overlay.nc')
         if self.l1b_patched.is_file():
             self.l1b_patched.unlink()
         self.__patched_msm = []
@@ -90,7 +103,11 @@ class L1Bpatch():
             return
 
         with h5py.File(self.l1b_patched, 'r+') as fid:
-            sgrp = fid.require_group('/METADATA/SRON_METADATA')
+            if self.overlay:
+                sgrp = overlay_require(fid, '/METADATA/SRON_METADATA',
+                                       group=True)
+            else:
+                sgrp = fid.require_group('/METADATA/SRON_METADATA')
             sgrp.attrs['dateStamp'] = datetime.utcnow().isoformat()
             sgrp.attrs['git_tag'] = __version__
             if 'patched_datasets' not in sgrp:
@@ -102,7 +119,70 @@ class L1Bpatch():
             else:
                 dset = sgrp['patched_datasets']
                 dset.resize(dset.shape[0] + len(self.__patched_msm), axis=0)
-                dset[dset.shape[0]-1:] = np.asarray(self.__patched_msm)
+                dset[-len(self.__patched_msm):] = \
+                    np.asarray(self.__patched_msm)
+
+    # --------------------------------------------------
+    def __open_output(self):
+        """
+        Returns the patched product or the overlay, opened read/write
+        """
+        if not self.l1b_patched.is_file():
+            if self.overlay:
+                create_overlay(self.l1b_product, self.l1b_patched)
+            else:
+                copy_product(self.l1b_product, self.l1b_patched)
+
+        return h5py.File(self.l1b_patched, 'r+')
+
+    def __output_dset(self, fid, band, key, copy_data=False):
+        """
+        Returns dataset "key" of group OBSERVATIONS in the patched product.
+        All data of the dataset should be written by the caller, unless
+        copy_data is True.
+
+        In overlay mode only objects in the overlay are accessed, links to
+        the original product are never opened with read/write access
+        """
+        ds_path = str(PurePosixPath(
+            '/', 'BAND{}_RADIANCE'.format(band), 'STANDARD_MODE',
+            'OBSERVATIONS', key))
+        if ds_path not in self.__patched_msm:
+            self.__patched_msm.append(ds_path)
+
+        if self.overlay:
+            return overlay_require(fid, ds_path, copy_data=copy_data)
+
+        return fid[ds_path]
+
+    def materialize(self, l1b_product=None) -> Path:
+        """
+        Write the complete patched product, for delivery
+
+        Parameters
+        ----------
+        l1b_product :  string, optional
+           name of the patched product, default is the name of the original
+           product with processor version '99' in data_dir
+
+        Returns
+        -------
+        Path to the patched product
+        """
+        if l1b_product is None:
+            l1b_product = \
+                self.data_dir / self.l1b_product.name.replace('_01_', '_99_')
+
+        # write the patch logging first
+        self.close()
+        self.__patched_msm = []
+
+        if not self.overlay:
+            if Path(l1b_product) != self.l1b_patched:
+                copy_product(self.l1b_patched, l1b_product)
+            return Path(l1b_product)
+
+        return materialize(self.l1b_patched, l1b_product)
 
     # --------------------------------------------------
     def pixel_quality(self, dpqm, threshold=0.8) -> None:
@@ -111,12 +191,11 @@ class L1Bpatch():
 
         Patched dataset: 'quality_level' and 'spectral_channel_quality'
 
-        Requires (naive approach):
-        * read original dataset 'spectral_channel_quality'
-        * read pixel quality ckd
-        * adjust second pixel of each byte of spectral_channel_quality
+        The flags are patched in-place in blocks of scanlines, only chunks
+        with modified flags are written to the patched product:
         * quality_level = int(100 * dpqm)
-        * write updated datasets to patched product
+        * set second bit of spectral_channel_quality for pixels with
+          dpqm below threshold, clear it for the other pixels
 
         Parameters
         ----------
@@ -130,280 +209,278 @@ class L1Bpatch():
         Nothing
         """
         from pys5p import swir_region
+        from .l1b_io import patch_flags
 
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
-
-        # read original data
         with L1BioRAD(self.l1b_product) as l1b:
             band = l1b.select('STANDARD_MODE')
-            quality_level = l1b.get_msm_data('quality_level')
-            print('quality_level', quality_level.dtype)
-            chan_quality = l1b.get_msm_data('spectral_channel_quality')
-            print('chan_quality', chan_quality.dtype)
 
         if band in ('7', '8'):
             l2_dpqm = dpqm[swir_region.coords(mode='level2', band=band)]
         else:
             raise ValueError('only implemented for band 7 or 8')
 
-        # patch dataset 'quality_level'
-        quality_level[...] = (100 * l2_dpqm).astype(np.uint8)  # broadcasting
-
-        # patch dataset 'spectral_channel_quality'
-        buff = chan_quality & ~2          # set second bit to zero (all good)
-        buff[:, l2_dpqm < threshold] += 2                   # flag bad pixels
-        chan_quality = buff.astype(np.uint8)
-
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('quality_level', quality_level)
-            l1b.set_msm_data('spectral_channel_quality', chan_quality)
-
-    def offset(self) -> None:
+        with self.__open_output() as fid:
+            # patch dataset 'quality_level'
+            dset = self.__output_dset(fid, band, 'quality_level',
+                                      copy_data=True)
+            patch_flags(dset, clear_bits=0xFF,
+                        set_bits=(100 * l2_dpqm).astype(np.uint8))
+
+            # patch dataset 'spectral_channel_quality'
+            dset = self.__output_dset(fid, band, 'spectral_channel_quality',
+                                      copy_data=True)
+            patch_flags(dset, clear_bits=2,
+                        set_bits=np.where(l2_dpqm < threshold, 2, 0))
+
+    def recalibrate(self, steps, ckd_new=None, ckd_orig=None,
+                    block=None) -> None:
         """
-        Patch SWIR offset correction.
+        Replace SWIR calibration steps applied by the L1b processor.
 
-        Patched dataset: 'radiance' ('radiance_error' and 'radiance_noise'?)
+        Patched datasets: 'radiance', 'radiance_error' and 'radiance_noise'
 
-        Requires (naive approach):
-        * reverse applied radiance calibration
-        * reverse applied stray-light correction
-        * reverse applied PRNU correction
-        * reverse applied dark-flux correction
-        * reverse applied offset correction
-        * apply (alternative) offset correction
-        * apply (alternative) dark-flux correction
-        * apply (alternative) PRNU correction
-        * apply (alternative) stray-light correction
-        * apply (alternative) radiance calibration
+        The applied calibration steps are reversed and reapplied with the
+        alternative CKD's in one pass per block of scanlines, thus the
+        radiance is read and written only once. See pys5p.swir_calib
 
         Parameters
         ----------
-        None
+        steps    :  list of strings
+           calibration steps: 'offset', 'darkflux', 'prnu', 'relrad'
+           and/or 'absrad'
+        ckd_new  :  dict, optional
+           alternative CKD's, default read from ckd_dir
+        ckd_orig :  dict, optional
+           CKD's applied by the L1b processor, default read from ckd_dir
+           valid at the reference time of the product
+
+        The CKD's are given in level-2 geometry, or for the SWIR detector
+        (bands 7 and 8 combined, row 257 excluded)
+        block    :  int, optional
+           number of scanlines processed at once
 
         Returns
         -------
         Nothing
         """
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
+        from .swir_calib import (CalibChain, CHAIN, level2_ckds,
+                                 read_calib_ckds)
+
+        fillvalue = float.fromhex('0x1.ep+122')
 
-        # read original data
         with L1BioRAD(self.l1b_product) as l1b:
             band = l1b.select('STANDARD_MODE')
-            data = l1b.get_msm_data('radiance')
+            if band not in ('7', '8'):
+                raise ValueError('only implemented for band 7 or 8')
+
+            # read required CKD's
+            first = min(CHAIN.index(x) for x in steps)
+            if ckd_orig is None:
+                ckd_orig = read_calib_ckds(self.ckd_dir, CHAIN[first:], band,
+                                           date=l1b.get_ref_time())
+            if ckd_new is None:
+                ckd_new = read_calib_ckds(self.ckd_dir, steps, band)
+            chain = CalibChain(steps, level2_ckds(ckd_orig, band),
+                               level2_ckds(ckd_new, band))
+            texp = np.asarray(l1b.get_exposure_time())
+
+            msm_path = 'BAND{}_RADIANCE/STANDARD_MODE/OBSERVATIONS'.format(
+                band)
+            err_names = [x for x in ('radiance_error', 'radiance_noise')
+                         if x in l1b.fid[msm_path]]
+
+            with self.__open_output() as fid:
+                out = {key: self.__output_dset(fid, band, key)
+                       for key in ['radiance'] + err_names}
+
+                # patch dataset 'radiance', one block of scanlines at a time
+                buffers = {}
+                for scans in l1b.iter_scanlines('radiance', block=block):
+                    errors = []
+                    for key in err_names:
+                        dset = l1b.fid[msm_path][key]
+                        if key not in buffers:
+                            buffers[key] = np.empty(
+                                (scans.data.shape[0],) + dset.shape[2:],
+                                dtype=dset.dtype)
+                        buff = buffers[key][:scans.data.shape[0]]
+                        dset.read_direct(buff, np.s_[0, scans.scanline, ...])
+                        errors.append(buff)
+
+                    chain.apply(scans.data, texp[scans.scanline],
+                                error=errors, fillvalue=fillvalue)
+
+                    # write patched datasets to new product
+                    out['radiance'].write_direct(
+                        scans.data, dest_sel=np.s_[0, scans.scanline, ...])
+                    for key, buff in zip(err_names, errors):
+                        out[key].write_direct(
+                            buff, dest_sel=np.s_[0, scans.scanline, ...])
+
+    def offset(self, ckd=None, ckd_orig=None) -> None:
+        """
+        Patch SWIR offset correction.
 
-        # read required CKD's
+        Patched dataset: 'radiance', 'radiance_error' and 'radiance_noise'
 
-        # patch dataset 'radiance'
+        Parameters
+        ----------
+        ckd       :  array-like, optional
+           alternative offset CKD default from ckd_dir
+        ckd_orig  :  dict, optional
+           CKD's applied by the L1b processor, see recalibrate
 
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('radiance', data)
+        Returns
+        -------
+        Nothing
+        """
+        self.recalibrate(['offset'],
+                         ckd_new=None if ckd is None else {'offset': ckd},
+                         ckd_orig=ckd_orig)
 
-    def darkflux(self) -> None:
+    def darkflux(self, ckd=None, ckd_orig=None) -> None:
         """
         Patch SWIR dark-flux correction.
 
-        Patched dataset: 'radiance' ('radiance_error' and 'radiance_noise'?)
-
-        Requires (naive approach):
-        * reverse applied radiance calibration
-        * reverse applied stray-light correction
-        * reverse applied PRNU correction
-        * reverse applied dark-flux correction
-        * apply (alternative) dark-flux correction
-        * apply (alternative) PRNU correction
-        * apply (alternative) stray-light correction
-        * apply (alternative) radiance calibration
+        Patched dataset: 'radiance', 'radiance_error' and 'radiance_noise'
 
         Parameters
         ----------
-        None
+        ckd       :  array-like, optional
+           alternative dark-flux CKD default from ckd_dir
+        ckd_orig  :  dict, optional
+           CKD's applied by the L1b processor, see recalibrate
 
         Returns
         -------
         Nothing
         """
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
-
-        # read original data
-        with L1BioRAD(self.l1b_product) as l1b:
-            band = l1b.select('STANDARD_MODE')
-            data = l1b.get_msm_data('radiance')
-
-        # read required CKD's
+        self.recalibrate(['darkflux'],
+                         ckd_new=None if ckd is None else {'darkflux': ckd},
+                         ckd_orig=ckd_orig)
 
-        # patch dataset 'radiance'
-
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('radiance', data)
-
-    def prnu(self) -> None:
+    def prnu(self, ckd=None, ckd_orig=None) -> None:
         """
         Patch pixel response non-uniformity correction.
 
-        Patched dataset: 'radiance' ('radiance_error' and 'radiance_noise'?)
-
-        Requires (naive approach):
-        * reverse applied radiance calibration
-        * reverse applied stray-light correction
-        * reverse applied PRNU correction
-        * apply (alternative) PRNU correction
-        * apply (alternative) stray-light correction
-        * apply (alternative) radiance calibration
-
-        Alternative: neglect impact stray-light, but apply patch to correct for
-        spectral features.
+        Patched dataset: 'radiance', 'radiance_error' and 'radiance_noise'
 
         Parameters
         ----------
-        None
+        ckd       :  array-like, optional
+           alternative PRNU CKD default from ckd_dir
+        ckd_orig  :  dict, optional
+           CKD's applied by the L1b processor, see recalibrate
 
         Returns
         -------
-        None
+        Nothing
 
         Notes
         -----
         It is assumed that for the PRNU correction the CKD has to be multiplied
         with the pixel signals.
         """
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
-
-        # read original data
-        with L1BioRAD(self.l1b_product) as l1b:
-            band = l1b.select('STANDARD_MODE')
-            data = l1b.get_msm_data('radiance')
+        self.recalibrate(['prnu'],
+                         ckd_new=None if ckd is None else {'prnu': ckd},
+                         ckd_orig=ckd_orig)
 
-        # read required CKD's
-
-        # patch dataset 'radiance'
-
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('radiance', data)
-
-    def relrad(self) -> None:
+    def relrad(self, ckd, ckd_orig=None) -> None:
         """
         Patch relative radiance calibration.
 
-        Patched dataset: 'radiance' ('radiance_error' and 'radiance_noise'?)
-
-        Requires:
-        * reverse applied radiance calibration
-        * apply alternative radiance calibration
+        Patched dataset: 'radiance', 'radiance_error' and 'radiance_noise'
 
         Parameters
         ----------
-        None
+        ckd       :  array-like
+           alternative relative radiance CKD, this CKD is not provided
+           by CKDio
+        ckd_orig  :  dict, optional
+           CKD's applied by the L1b processor, see recalibrate
 
         Returns
         -------
         Nothing
         """
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
+        self.recalibrate(['relrad'], ckd_new={'relrad': ckd},
+                         ckd_orig=ckd_orig)
 
-        # read original data
-        with L1BioRAD(self.l1b_product) as l1b:
-            band = l1b.select('STANDARD_MODE')
-            data = l1b.get_msm_data('radiance')
-
-        # read required CKD's
-
-        # patch dataset 'radiance'
-
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('radiance', data)
-
-    def absrad(self) -> None:
+    def absrad(self, ckd=None, ckd_orig=None) -> None:
         """
         Patch absolute radiance calibration.
 
-        Patched dataset: 'radiance' ('radiance_error' and 'radiance_noise'?)
-
-        Requires:
-        * reverse applied irradiance calibration
-        * apply alternative irradiance calibration
+        Patched dataset: 'radiance', 'radiance_error' and 'radiance_noise'
 
         Parameters
         ----------
-        None
+        ckd       :  array-like, optional
+           alternative absolute radiance CKD, default from ckd_dir
+        ckd_orig  :  dict, optional
+           CKD's applied by the L1b processor, see recalibrate
 
         Returns
         -------
         Nothing
         """
-        if not self.l1b_patched.is_file():
-            shutil.copy(self.l1b_product, self.l1b_patched)
-
-        # read original data
-        with L1BioRAD(self.l1b_product) as l1b:
-            band = l1b.select('STANDARD_MODE')
-            data = l1b.get_msm_data('radiance')
+        self.recalibrate(['absrad'],
+                         ckd_new=None if ckd is None else {'absrad': ckd},
+                         ckd_orig=ckd_orig)
 
-        # read required CKD's
+    def check(self, rtol=0., atol=0., verbose=True) -> dict:
+        """
+        Check patched datasets in L1B product
 
-        # patch dataset 'radiance'
+        The patched datasets are compared with the original datasets chunk
+        by chunk, see s5p_compare.compare_datasets
 
-        # write patched dataset to new product
-        with L1BioRAD(self.l1b_patched, readwrite=True) as l1b:
-            res = l1b.select('STANDARD_MODE')
-            if res != band:
-                raise ValueError(_MSG_ERR_IO_BAND_)
-            l1b.set_msm_data('radiance', data)
+        Parameters
+        ----------
+        rtol    :  float
+           relative tolerance for floating-point values
+        atol    :  float
+           absolute tolerance for floating-point values
+        verbose :  boolean
+           print a summary of the differences of each dataset
 
-    def check(self) -> None:
-        """
-        Check patched dataset in L1B product
+        Returns
+        -------
+        dictionary with the report of each patched dataset
         """
         if not self.l1b_patched.is_file():
             raise ValueError('patched product not found')
 
-        with h5py.File(self.l1b_patched, 'r+') as fid:
+        # write the patch logging first
+        self.close()
+        self.__patched_msm = []
+
+        res = {}
+        with h5py.File(self.l1b_product, 'r') as fid_orig, \
+             h5py.File(self.l1b_patched, 'r') as fid:
             if 'SRON_METADATA' not in fid['/METADATA']:
                 raise ValueError('no SRON metadata defined in L1B product')
             sgrp = fid['/METADATA/SRON_METADATA']
             if 'patched_datasets' not in sgrp:
                 raise ValueError('no patched datasets in L1B prduct')
-            patched_datasets = sgrp['patched_datasets'][:]
-
-        for ds_name in patched_datasets:
-            with L1BioRAD(self.l1b_product) as l1b:
-                l1b.select('STANDARD_MODE')
-                orig = l1b.get_msm_data(ds_name.split('/')[-1])
-
-            with L1BioRAD(self.l1b_patched) as l1b:
-                l1b.select('STANDARD_MODE')
-                patch = l1b.get_msm_data(ds_name.split('/')[-1])
-
-            if np.issubdtype(orig.dtype, np.integer):
-                if np.array_equiv(orig, patch):
-                    print(ds_name.split('/')[-1], ' equal True')
-                else:
-                    print('{} equal {} differ {}'.format(
-                        ds_name.split('/')[-1],
-                        (orig == patch).sum(), (orig != patch).sum()))
-            else:
-                print('test not yet defined')
+
+            for ds_name in sgrp['patched_datasets'].asstr()[:]:
+                if ds_name in res:
+                    continue
+                dset = fid[ds_name]
+                fillvalue = dset.attrs['_FillValue'] \
+                    if '_FillValue' in dset.attrs else None
+                res[ds_name] = compare_datasets(fid_orig[ds_name], dset,
+                                                rtol=rtol, atol=atol,
+                                                fillvalue=fillvalue)
+
+        if verbose:
+            for ds_name, report in res.items():
+                print('{}: changed {} of {} values in {} of {} chunks'
+                      ' ({} skipped), max abs diff {:g}, max rel diff {:g}'
+                      .format(ds_name.split('/')[-1], report['changed'],
+                              int(np.prod(report['shape'])),
+                              report['nchunks_diff'], report['nchunks'],
+                              report['nchunks_raw'], report['max_abs_diff'],
+                              report['max_rel_diff']))
+
+        return res
@@ -0,0 +1,277 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Patch a batch of Tropomi L1b radiance products in parallel with L1Bpatch
+
+The CKD's required by the patch steps are read once, and shared read-only
+with the worker processes in shared memory, see s5p_pool. The
+calibration steps (offset, darkflux, prnu, relrad, absrad) are applied
+together in one pass, see L1Bpatch.recalibrate. Each product is patched by
+one worker, a manifest with the timing and result of each patch step is
+written next to the patched product. A product which can not be patched is
+reported in its manifest, the other products are processed.
+
+Usage:
+
+  python3 -m pys5p.l1b_patch_batch --patch pixel_quality \
+          --output /data/patched /data/L1B/S5P_OFFL_L1B_RA_BD7_*.nc
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+
+from pathlib import Path
+
+import numpy as np
+
+from .swir_calib import CALIB_STEPS, STEP_CKD as CALIB_CKD
+
+# - global parameters ------------------------------
+PATCH_STEPS = ('pixel_quality', 'offset', 'darkflux', 'prnu',
+               'relrad', 'absrad')
+
+# CKDio methods of the CKD's passed to the patch steps
+STEP_CKD = dict({'pixel_quality': 'pixel_quality'}, **CALIB_CKD)
+
+# CKD's shared with the worker processes
+_CKD = {}
+_CKD_SHM = []
+
+
+# - local functions --------------------------------
+def _init_worker(layouts):
+    """
+    Attach the worker process to the CKD's in shared memory
+    """
+    from .s5p_pool import attach_array
+
+    for key, layout in layouts.items():
+        (shm, arr) = attach_array(layout)
+        arr.flags.writeable = False
+        _CKD_SHM.append(shm)
+        _CKD[key] = arr
+
+
+def _fuse_steps(steps):
+    """
+    Returns the patch steps, where all calibration steps are replaced by one
+    tuple at the position of the first calibration step
+    """
+    calib = tuple(x for x in steps if x in CALIB_STEPS)
+
+    res = []
+    for step in steps:
+        if step not in CALIB_STEPS:
+            res.append(step)
+        elif calib not in res:
+            res.append(calib)
+
+    return res
+
+
+def _patch_product(args):
+    """
+    Patch one product, called by the worker processes
+
+    Returns
+    -------
+    dictionary with the manifest of the product
+    """
+    from datetime import datetime
+    from time import perf_counter
+    from traceback import format_exc
+
+    from .l1b_patch import L1Bpatch
+
+    (l1b_product, steps, data_dir, ckd_dir, overlay) = args
+
+    manifest = {'product': str(l1b_product),
+                'ckd_dir': str(ckd_dir),
+                'start_time': datetime.utcnow().isoformat(timespec='seconds'),
+                'status': 'ok',
+                'steps': []}
+    tstart = perf_counter()
+    try:
+        with L1Bpatch(l1b_product, data_dir=data_dir, ckd_dir=ckd_dir,
+                      overlay=overlay) as l1b_patch:
+            manifest['patched'] = str(l1b_patch.l1b_patched)
+            for step in _fuse_steps(steps):
+                tstep = perf_counter()
+                if isinstance(step, tuple):
+                    # calibration steps are applied in one pass
+                    ckd_orig = {x[5:]: _CKD[x] for x in _CKD
+                                if x.startswith('orig/')}
+                    l1b_patch.recalibrate(
+                        step, ckd_new={x: _CKD[x] for x in step if x in _CKD},
+                        ckd_orig=ckd_orig or None)
+                    step = ','.join(step)
+                elif step in STEP_CKD:
+                    getattr(l1b_patch, step)(_CKD[step])
+                else:
+                    getattr(l1b_patch, step)()
+                manifest['steps'].append(
+                    {'name': step, 'status': 'ok',
+                     'time': round(perf_counter() - tstep, 3)})
+    except Exception as exc:
+        manifest['status'] = 'failed'
+        manifest['error'] = '{}: {}'.format(type(exc).__name__, exc)
+        manifest['traceback'] = format_exc()
+    manifest['time'] = round(perf_counter() - tstart, 3)
+
+    # write the manifest next to the patched product
+    flname = Path(data_dir) / (Path(l1b_product).stem + '.manifest.json')
+    try:
+        with open(flname, 'w') as fp:
+            json.dump(manifest, fp, indent=2)
+    except OSError as exc:
+        manifest['manifest_error'] = str(exc)
+
+    return manifest
+
+
+def read_ckds(ckd_dir, steps):
+    """
+    Returns the CKD's required by the patch steps
+
+    Parameters
+    ----------
+    ckd_dir  :  str or Path
+       directory with the SWIR CKD products
+    steps    :  list of strings
+       names of the patch steps
+
+    Returns
+    -------
+    dictionary with the CKD (ndarray) of each patch step
+    """
+    from .ckd_io import CKDio
+
+    res = {}
+    with CKDio(ckd_dir) as ckd:
+        for step in steps:
+            if step in STEP_CKD:
+                res[step] = np.asarray(getattr(ckd, STEP_CKD[step])().value)
+
+    return res
+
+
+def patch_products(l1b_products, steps, data_dir='/tmp',
+                   ckd_dir='/nfs/Tropomi/share/ckd', max_workers=None,
+                   overlay=False, ckds=None, ckd_orig=None):
+    """
+    Patch L1b radiance products in parallel
+
+    Parameters
+    ----------
+    l1b_products :  list of strings
+       names of the L1b radiance products
+    steps        :  list of strings
+       patch steps applied to each product, see PATCH_STEPS
+    data_dir     :  str or Path
+       directory to store the patched products and their manifests
+    ckd_dir      :  str or Path
+       directory with the SWIR CKD products
+    max_workers  :  int, optional
+       number of worker processes, default is os.cpu_count()
+    overlay      :  boolean
+       write the patched datasets to an overlay, see L1Bpatch
+    ckds         :  dict, optional
+       CKD of each patch step, default read from ckd_dir with read_ckds
+    ckd_orig     :  dict, optional
+       CKD's applied by the L1b processor, used by the calibration steps.
+       Default read per product from ckd_dir, see L1Bpatch.recalibrate
+
+    Returns
+    -------
+    list with the manifest (dictionary) of each product
+    """
+    from multiprocessing import Pool, resource_tracker
+    from os import cpu_count
+
+    from .s5p_pool import share_array
+
+    for step in steps:
+        if step not in PATCH_STEPS:
+            raise ValueError('unknown patch step {}'.format(step))
+    if max_workers is None:
+        max_workers = cpu_count()
+
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if ckds is None:
+        ckds = read_ckds(ckd_dir, steps)
+    if ckd_orig is not None:
+        ckds = dict(ckds, **{'orig/' + x: y for x, y in ckd_orig.items()})
+
+    # copy the CKD's to shared memory
+    shm_list = []
+    layouts = {}
+    try:
+        for key, value in ckds.items():
+            (shm, layouts[key]) = share_array(value)
+            shm_list.append(shm)
+
+        tasks = [(str(x), tuple(steps), str(data_dir), str(ckd_dir), overlay)
+                 for x in l1b_products]
+
+        # the workers should share the resource tracker of this process
+        resource_tracker.ensure_running()
+        with Pool(min(max_workers, max(1, len(tasks))),
+                  initializer=_init_worker, initargs=(layouts,)) as pool:
+            res = pool.map(_patch_product, tasks, chunksize=1)
+    finally:
+        for shm in shm_list:
+            shm.close()
+            shm.unlink()
+
+    return res
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+    from glob import glob
+
+    parser = argparse.ArgumentParser(
+        description='patch a batch of Tropomi L1b radiance products')
+    parser.add_argument('l1b_products', nargs='+',
+                        help='names of L1B products (patterns are expanded)')
+    parser.add_argument('--ckd_dir', default='/nfs/Tropomi/share/ckd',
+                        help='path to official SWIR CKD')
+    parser.add_argument('--patch', required=True,
+                        help=('patch steps, comma separated, choose from '
+                              + ', '.join(PATCH_STEPS)))
+    parser.add_argument('-o', '--output', default='/tmp',
+                        help='directory to store patched products')
+    parser.add_argument('--overlay', action='store_true',
+                        help='write only the patched datasets to an overlay')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    args = parser.parse_args()
+
+    l1b_products = []
+    for pattern in args.l1b_products:
+        l1b_products += sorted(glob(pattern)) or [pattern]
+
+    res = patch_products(l1b_products, args.patch.split(','),
+                         data_dir=args.output, ckd_dir=args.ckd_dir,
+                         max_workers=args.workers, overlay=args.overlay)
+    for manifest in res:
+        print('{:8s} {:8.1f} s  {}'.format(manifest['status'],
+                                          manifest['time'],
+                                          Path(manifest['product']).name))
+    nfailed = sum(x['status'] != 'ok' for x in res)
+    if nfailed:
+        print('{} of {} products failed'.format(nfailed, len(res)))
+
+
+if __name__ == '__main__':
+    main()
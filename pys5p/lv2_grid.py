@@ -0,0 +1,540 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+The class L2grid accumulates level 2 data of many orbits on a regular
+latitude/longitude grid, e.g. to generate daily or monthly maps of CO or
+CH4. Per grid cell are stored: the (area weighted) pixel count, the sum of
+the values, the sum of the weights (1 / precision^2) and of the weighted
+values, and the minimum and maximum value. The mean and the weighted mean
+are derived from these accumulators.
+
+The pixels are binned by their centers, or with oversampling each pixel is
+divided in N x N sub-pixels using the corner bounds of get_geo_bounds, every
+sub-pixel contributes with weight 1 / N^2 to the cell which contains its
+center.
+
+The function grid_products grids many level 2 products in parallel, each
+worker returns only the cells covered by its orbit. The grid is written to
+HDF5 after each 'checkpoint' products, the memory usage is independent of
+the number of products. An interrupted run continues with the products
+which are not yet in the output file.
+
+Usage:
+
+  grid = grid_products(sorted(glob('S5P_OFFL_L2__CH4____2019*.nc')),
+                       'methane_mixing_ratio', 'ch4_201901.h5',
+                       resolution=0.1, oversample=4)
+  plot.draw_geo_msm(*grid.mesh(), grid.weighted_mean)
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import os
+
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# - global parameters ------------------------------
+ACCUMULATORS = ('count', 'sum', 'weight', 'weighted_sum', 'min', 'max')
+
+
+# - local functions --------------------------------
+def _unwrap(lons, ref):
+    """
+    Returns longitudes continuous with the reference longitudes, thus
+    pixels which cross the antimeridian are not distorted
+    """
+    return ref + np.mod(lons - ref + 180., 360.) - 180.
+
+
+def _oversample(lon_mesh, lat_mesh, oversample):
+    """
+    Returns the centers of N x N sub-pixels of each pixel, by bilinear
+    interpolation of the pixel corners
+
+    Parameters
+    ----------
+    lon_mesh   :  ndarray
+       longitudes of the pixel corners, see LV2io.get_geo_bounds
+    lat_mesh   :  ndarray
+       latitudes of the pixel corners
+    oversample :  int
+       number of sub-pixels along each pixel dimension
+
+    Returns
+    -------
+    longitudes and latitudes with dimensions (N^2,) + shape of the pixels
+    """
+    corners = []
+    for mesh in (lon_mesh, lat_mesh):
+        corners.append((mesh[:-1, :-1], mesh[:-1, 1:],
+                        mesh[1:, 1:], mesh[1:, :-1]))
+    ref = corners[0][0]
+    corners[0] = tuple(_unwrap(x, ref) for x in corners[0])
+
+    frac = (np.arange(oversample) + 0.5) / oversample
+    (vv, uu) = [x.reshape(-1, 1, 1) for x in np.meshgrid(frac, frac,
+                                                         indexing='ij')]
+    res = ()
+    for (c00, c01, c11, c10) in corners:
+        res += ((1 - uu) * (1 - vv) * c00 + uu * (1 - vv) * c01
+                + uu * vv * c11 + (1 - uu) * vv * c10,)
+
+    return res
+
+
+def _grid_product(args):
+    """
+    Grid one level 2 product, called by the worker processes
+
+    Returns
+    -------
+    product name and the dictionary returned by L2grid.bin, or the error
+    message when the product can not be gridded
+    """
+    from .lv2_io import LV2io
+
+    (lv2_product, name, grid_def, oversample, qa_min) = args
+    try:
+        with LV2io(lv2_product) as lv2:
+            res = L2grid(*grid_def).bin_product(lv2, name,
+                                               oversample=oversample,
+                                               qa_min=qa_min)
+    except Exception as exc:
+        return (lv2_product, '{}: {}'.format(type(exc).__name__, exc))
+
+    return (lv2_product, res)
+
+
+# - class definition -------------------------------
+class L2grid():
+    """
+    Accumulators of level 2 data on a regular latitude/longitude grid
+    """
+    def __init__(self, resolution=0.25, extent=(-180., 180., -90., 90.),
+                 name=None):
+        """
+        Parameters
+        ----------
+        resolution :  float
+           size of the grid cells [degrees]
+        extent     :  list
+           lon_min, lon_max, lat_min, lat_max of the grid, the grid crosses
+           the antimeridian when lon_min > lon_max
+        name       :  str, optional
+           name of the gridded level 2 dataset
+        """
+        if resolution <= 0:
+            raise ValueError('resolution should be positive')
+        if len(extent) != 4:
+            raise ValueError('parameter extent must have 4 elements')
+        if extent[2] >= extent[3]:
+            raise ValueError('lat_min should be smaller than lat_max')
+
+        self.resolution = float(resolution)
+        self.extent = tuple(float(x) for x in extent)
+        self.name = name
+        self.products = []
+        self.failed = {}
+
+        width = extent[1] - extent[0]
+        if width <= 0:
+            width += 360.
+        self.shape = (int(round((extent[3] - extent[2]) / resolution)),
+                      int(round(width / resolution)))
+
+        self.count = np.zeros(self.shape)
+        self.sum = np.zeros(self.shape)
+        self.weight = np.zeros(self.shape)
+        self.weighted_sum = np.zeros(self.shape)
+        self.min = np.full(self.shape, np.inf)
+        self.max = np.full(self.shape, -np.inf)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}(resolution={}, extent={}, name={!r})'.format(
+            class_name, self.resolution, self.extent, self.name)
+
+    @property
+    def definition(self):
+        """
+        Returns the parameters to define an identical (empty) grid
+        """
+        return (self.resolution, self.extent, self.name)
+
+    @property
+    def latitude(self):
+        """
+        Returns the latitudes of the centers of the grid cells
+        """
+        return self.extent[2] \
+            + (np.arange(self.shape[0]) + 0.5) * self.resolution
+
+    @property
+    def longitude(self):
+        """
+        Returns the longitudes of the centers of the grid cells, in the
+        range [-180, 180)
+        """
+        lons = self.extent[0] \
+            + (np.arange(self.shape[1]) + 0.5) * self.resolution
+        return np.mod(lons + 180., 360.) - 180.
+
+    def mesh(self):
+        """
+        Returns longitudes and latitudes of the corners of the grid cells,
+        e.g. as input for S5Pgeoplot.draw_geo_msm
+        """
+        lons = self.extent[0] + np.arange(self.shape[1] + 1) * self.resolution
+        lats = self.extent[2] + np.arange(self.shape[0] + 1) * self.resolution
+        return np.meshgrid(lons, lats)
+
+    @property
+    def mean(self):
+        """
+        Returns the (area weighted) mean of each grid cell
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 0, self.sum / self.count, np.nan)
+
+    @property
+    def weighted_mean(self):
+        """
+        Returns the mean of each grid cell weighted by 1 / precision^2
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.weight > 0,
+                            self.weighted_sum / self.weight, np.nan)
+
+    # -------------------------
+    def cell_index(self, lons, lats):
+        """
+        Returns the flattened index of the grid cells which contain the
+        positions, or -1 for positions outside the grid
+        """
+        xx = np.floor(np.mod(np.asarray(lons) - self.extent[0], 360.)
+                      / self.resolution)
+        yy = np.floor((np.asarray(lats) - self.extent[2]) / self.resolution)
+        with np.errstate(invalid='ignore'):
+            valid = (xx >= 0) & (xx < self.shape[1]) \
+                & (yy >= 0) & (yy < self.shape[0])
+
+        res = np.full(valid.shape, -1, dtype=np.int64)
+        res[valid] = yy[valid].astype(np.int64) * self.shape[1] \
+            + xx[valid].astype(np.int64)
+        return res
+
+    def bin(self, lons, lats, values, precision=None, area=None):
+        """
+        Returns the accumulators of the grid cells covered by the pixels,
+        the grid itself is not updated, see L2grid.add
+
+        Parameters
+        ----------
+        lons       :  array_like
+           longitudes of the pixel (or sub-pixel) centers
+        lats       :  array_like
+           latitudes of the pixel (or sub-pixel) centers
+        values     :  array_like
+           values of the pixels, NaN values are ignored
+        precision  :  array_like, optional
+           precision of the values, the weighted mean uses 1 / precision^2
+        area       :  array_like, optional
+           fraction of the pixel represented by each position, default 1
+
+        Returns
+        -------
+        dictionary with the flattened index of the grid cells ('index') and
+        their accumulators, see ACCUMULATORS
+        """
+        (lons, lats, values) = np.broadcast_arrays(lons, lats, values)
+        indx = self.cell_index(lons, lats).ravel()
+        values = values.ravel()
+        if precision is None:
+            weights = np.ones(values.shape)
+        else:
+            precision = np.broadcast_to(precision, lons.shape).ravel()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                weights = np.where(np.isfinite(precision) & (precision > 0),
+                                   precision ** -2., 0.)
+        if area is None:
+            area = np.ones(values.shape)
+        else:
+            area = np.broadcast_to(area, lons.shape).ravel()
+
+        mask = (indx >= 0) & np.isfinite(values)
+        (cells, inverse) = np.unique(indx[mask], return_inverse=True)
+        values = values[mask].astype(float)
+        weights = weights[mask] * area[mask]
+        area = area[mask]
+
+        res = {'index': cells,
+               'count': np.bincount(inverse, weights=area,
+                                    minlength=cells.size),
+               'sum': np.bincount(inverse, weights=area * values,
+                                  minlength=cells.size),
+               'weight': np.bincount(inverse, weights=weights,
+                                     minlength=cells.size),
+               'weighted_sum': np.bincount(inverse, weights=weights * values,
+                                           minlength=cells.size),
+               'min': np.full(cells.size, np.inf),
+               'max': np.full(cells.size, -np.inf)}
+        np.minimum.at(res['min'], inverse, values)
+        np.maximum.at(res['max'], inverse, values)
+        return res
+
+    def bin_product(self, lv2, name, oversample=0, qa_min=None):
+        """
+        Returns the accumulators of the grid cells covered by a level 2
+        product, see L2grid.bin
+
+        Parameters
+        ----------
+        lv2        :  LV2io
+           opened level 2 product
+        name       :  str
+           name of the level 2 dataset
+        oversample :  int
+           number of sub-pixels along each pixel dimension, using the pixel
+           corners. Default 0: the pixels are binned by their centers
+        qa_min     :  float, optional
+           ignore pixels with a lower qa_value
+        """
+        values = lv2.get_dataset(name, fill_as_nan=True).astype(float)
+        try:
+            precision = lv2.get_dataset('{}_precision'.format(name),
+                                        fill_as_nan=True)
+        except (KeyError, ValueError):
+            precision = None
+        if qa_min is not None:
+            qa_value = lv2.get_dataset('qa_value', fill_as_nan=False)
+            factor = lv2.get_attr('scale_factor', 'qa_value')
+            if factor is not None:
+                qa_value = qa_value * factor
+            values[qa_value < qa_min] = np.nan
+
+        if oversample:
+            mesh = lv2.get_geo_bounds()
+            (lons, lats) = _oversample(mesh['longitude'], mesh['latitude'],
+                                       int(oversample))
+            return self.bin(lons, lats, values, precision=precision,
+                            area=1. / oversample ** 2)
+
+        geo = lv2.get_geo_data()
+        lats = [geo[x] for x in geo if x.startswith('latitude')][0]
+        lons = [geo[x] for x in geo if x.startswith('longitude')][0]
+        return self.bin(lons, lats, values, precision=precision)
+
+    def add(self, lons, lats, values, precision=None, area=None):
+        """
+        Add pixels to the grid, see L2grid.bin
+        """
+        self.add_cells(self.bin(lons, lats, values, precision=precision,
+                                area=area))
+
+    def add_cells(self, cells):
+        """
+        Add the accumulators of grid cells returned by L2grid.bin
+        """
+        indx = np.unravel_index(cells['index'], self.shape)
+        for key in ('count', 'sum', 'weight', 'weighted_sum'):
+            getattr(self, key)[indx] += cells[key]
+        self.min[indx] = np.minimum(self.min[indx], cells['min'])
+        self.max[indx] = np.maximum(self.max[indx], cells['max'])
+
+    def merge(self, other):
+        """
+        Add the accumulators of an other grid with the same definition
+        """
+        if other.shape != self.shape or other.extent != self.extent \
+           or other.resolution != self.resolution:
+            raise ValueError('grids have a different definition')
+
+        for key in ('count', 'sum', 'weight', 'weighted_sum'):
+            getattr(self, key)[...] += getattr(other, key)
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.products += other.products
+
+    # -------------------------
+    def write(self, flname):
+        """
+        Write the grid to a HDF5 file
+
+        The grid is written to a temporary file '<flname>.tmp' which replaces
+        the output file when complete, thus an interrupted write does not
+        destroy the previous checkpoint of grid_products. Note that
+        L2grid.failed is not written, products which failed are retried when
+        gridding is resumed from this file
+        """
+        flname = str(flname)
+        with h5py.File(flname + '.tmp', 'w') as fid:
+            fid.attrs['resolution'] = self.resolution
+            fid.attrs['extent'] = self.extent
+            if self.name is not None:
+                fid.attrs['name'] = self.name
+            fid.create_dataset('products', data=np.array(
+                [str(x) for x in self.products], dtype=object),
+                               dtype=h5py.string_dtype())
+
+            scales = []
+            for key in ('latitude', 'longitude'):
+                dset = fid.create_dataset(key, data=getattr(self, key))
+                dset.make_scale(key)
+                scales.append(dset)
+
+            kwargs = {'chunks': True, 'compression': 'gzip',
+                      'compression_opts': 3, 'shuffle': True}
+            for key in ACCUMULATORS + ('mean', 'weighted_mean'):
+                data = getattr(self, key)
+                if key in ('mean', 'weighted_mean'):
+                    data = data.astype('f4')
+                dset = fid.create_dataset(key, data=data, **kwargs)
+                for ii, scale in enumerate(scales):
+                    dset.dims[ii].attach_scale(scale)
+        os.replace(flname + '.tmp', flname)
+
+    @classmethod
+    def read(cls, flname):
+        """
+        Read a grid written by L2grid.write
+        """
+        with h5py.File(flname, 'r') as fid:
+            name = fid.attrs.get('name')
+            if isinstance(name, bytes):
+                name = name.decode('ascii')
+            grid = cls(fid.attrs['resolution'], tuple(fid.attrs['extent']),
+                       name=name)
+            grid.products = list(fid['products'].asstr()[()])
+            for key in ACCUMULATORS:
+                fid[key].read_direct(getattr(grid, key))
+
+        return grid
+
+
+# --------------------------------------------------
+def grid_products(lv2_products, name, flname=None, resolution=0.25,
+                  extent=(-180., 180., -90., 90.), oversample=0,
+                  qa_min=None, max_workers=None, checkpoint=16):
+    """
+    Grid a dataset of many level 2 products in parallel
+
+    Parameters
+    ----------
+    lv2_products :  list of strings
+       names of the level 2 products
+    name         :  str
+       name of the level 2 dataset, e.g. 'methane_mixing_ratio'
+    flname       :  str or Path, optional
+       name of the HDF5 output file. When the file exists, the products
+       which are already gridded are skipped, products which failed are
+       retried
+    resolution   :  float
+       size of the grid cells [degrees]
+    extent       :  list
+       lon_min, lon_max, lat_min, lat_max of the grid
+    oversample   :  int
+       number of sub-pixels along each pixel dimension, default 0: the
+       pixels are binned by their centers
+    qa_min       :  float, optional
+       ignore pixels with a lower qa_value
+    max_workers  :  int, optional
+       number of worker processes, default is os.cpu_count(). The products
+       are gridded in this process when max_workers is 1
+    checkpoint   :  int
+       write the grid to flname after each 'checkpoint' products
+
+    Returns
+    -------
+    L2grid, products which can not be gridded are listed in L2grid.failed
+    """
+    from multiprocessing import Pool
+    from os import cpu_count
+
+    grid = L2grid(resolution, extent, name=name)
+    if flname is not None and Path(flname).is_file():
+        done = L2grid.read(flname)
+        if done.definition != grid.definition:
+            raise ValueError('{} contains an other grid'.format(flname))
+        grid = done
+
+    tasks = [(str(x), name, grid.definition, oversample, qa_min)
+             for x in lv2_products if str(x) not in grid.products]
+    if max_workers is None:
+        max_workers = cpu_count()
+
+    def add_results(results):
+        ngridded = 0
+        for (lv2_product, cells) in results:
+            if isinstance(cells, str):
+                grid.failed[lv2_product] = cells
+                continue
+            grid.add_cells(cells)
+            grid.products.append(lv2_product)
+            ngridded += 1
+            if flname is not None and ngridded % checkpoint == 0:
+                grid.write(flname)
+
+    if max_workers == 1 or len(tasks) <= 1:
+        add_results(map(_grid_product, tasks))
+    else:
+        with Pool(min(max_workers, len(tasks))) as pool:
+            add_results(pool.imap_unordered(_grid_product, tasks))
+
+    if flname is not None:
+        grid.write(flname)
+
+    return grid
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+    from glob import glob
+
+    parser = argparse.ArgumentParser(
+        description='grid a dataset of Tropomi level 2 products')
+    parser.add_argument('lv2_products', nargs='+',
+                        help='names of L2 products (patterns are expanded)')
+    parser.add_argument('--name', required=True,
+                        help='name of the level 2 dataset')
+    parser.add_argument('-o', '--output', required=True,
+                        help='name of the HDF5 output file')
+    parser.add_argument('--resolution', type=float, default=0.25,
+                        help='size of the grid cells [degrees]')
+    parser.add_argument('--extent', type=float, nargs=4,
+                        default=[-180., 180., -90., 90.],
+                        help='lon_min lon_max lat_min lat_max')
+    parser.add_argument('--oversample', type=int, default=0,
+                        help='number of sub-pixels along each dimension')
+    parser.add_argument('--qa_min', type=float, default=None,
+                        help='ignore pixels with a lower qa_value')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    args = parser.parse_args()
+
+    lv2_products = []
+    for pattern in args.lv2_products:
+        lv2_products += sorted(glob(pattern)) or [pattern]
+
+    grid = grid_products(lv2_products, args.name, args.output,
+                         resolution=args.resolution, extent=args.extent,
+                         oversample=args.oversample, qa_min=args.qa_min,
+                         max_workers=args.workers)
+    print('{} products gridded, {} cells filled'.format(
+        len(grid.products), np.count_nonzero(grid.count)))
+    for lv2_product, error in grid.failed.items():
+        print('failed {}: {}'.format(Path(lv2_product).name, error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Spatial index of the geolocation of a Tropomi level 2 product
+
+The index stores the latitude range and the longitude arc of the pixel
+centers of each block of scanlines. An extent query only reads the
+geolocation of the blocks which overlap with the extent. The index is
+build once per product and stored in a sidecar file next to the product,
+'<product>.geoidx.npz'. When the directory of the product is not writable
+the index is only kept in memory.
+
+The longitude range of an extent (lon_min, lon_max, lat_min, lat_max) with
+lon_min > lon_max crosses the antimeridian, e.g. [170, -170, -10, 10].
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import os
+
+from pathlib import Path
+from zipfile import BadZipFile
+
+import numpy as np
+
+# - global parameters ------------------------------
+BLOCK = 32
+SUFFIX = '.geoidx.npz'
+
+# spatial indices of the products used in this process
+_GEO_INDEX = {}
+
+
+# - local functions --------------------------------
+def _lon_arc(lons):
+    """
+    Returns start and width [degrees] of the shortest longitude arc which
+    covers the longitudes, the arc of a block which crosses the antimeridian
+    starts east of 180 degrees
+    """
+    if lons.size == 0:
+        return (0., -1.)
+
+    width = lons.max() - lons.min()
+    lons360 = np.mod(lons, 360.)
+    if lons360.max() - lons360.min() < width:
+        return (lons360.min(), lons360.max() - lons360.min())
+
+    return (lons.min(), width)
+
+
+def _extent_arc(extent):
+    """
+    Returns start and width [degrees] of the longitude range of an extent
+    """
+    if extent[1] >= extent[0]:
+        return (extent[0], extent[1] - extent[0])
+
+    return (extent[0], extent[1] - extent[0] + 360.)
+
+
+def extent_mask(lons, lats, extent):
+    """
+    Returns mask of the pixels within the extent
+
+    Parameters
+    ----------
+    lons    :  ndarray
+       longitudes of the pixels
+    lats    :  ndarray
+       latitudes of the pixels
+    extent  :  list
+       lon_min, lon_max, lat_min, lat_max, the longitude range crosses the
+       antimeridian when lon_min > lon_max
+    """
+    if len(extent) != 4:
+        raise ValueError('parameter extent must have 4 elements')
+
+    mask = (lats >= extent[2]) & (lats <= extent[3])
+    if extent[0] <= extent[1]:
+        return mask & (lons >= extent[0]) & (lons <= extent[1])
+
+    return mask & ((lons >= extent[0]) | (lons <= extent[1]))
+
+
+def sidecar_name(product):
+    """
+    Returns name of the sidecar file with the spatial index of a product
+    """
+    product = Path(product)
+    return product.with_name(product.name + SUFFIX)
+
+
+def _stamp(product):
+    """
+    Returns identification of a product: its modification time and size
+    """
+    stat = Path(product).stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# - class definition -------------------------------
+class GeoIndex():
+    """
+    Latitude range and longitude arc of the pixel centers per block of
+    scanlines
+    """
+    def __init__(self, nscanline, block, lat_min, lat_max, lon_start,
+                 lon_width, stamp=None):
+        self.nscanline = int(nscanline)
+        self.block = int(block)
+        self.lat_min = np.asarray(lat_min, dtype=float)
+        self.lat_max = np.asarray(lat_max, dtype=float)
+        self.lon_start = np.asarray(lon_start, dtype=float)
+        self.lon_width = np.asarray(lon_width, dtype=float)
+        self.stamp = None if stamp is None else tuple(int(x) for x in stamp)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}(nscanline={}, block={})'.format(class_name,
+                                                   self.nscanline, self.block)
+
+    def __len__(self):
+        return self.lat_min.size
+
+    @classmethod
+    def build(cls, read_latlon, nscanline, block=BLOCK, stamp=None):
+        """
+        Build the index from the geolocation of a product
+
+        Parameters
+        ----------
+        read_latlon  :  callable
+           read_latlon(start, stop) returns the latitude and longitude of
+           the pixel centers of scanlines start to stop as 2-D arrays
+        nscanline    :  int
+           number of scanlines of the product
+        block        :  int
+           number of scanlines per block
+        stamp        :  tuple, optional
+           identification of the product
+        """
+        if block < 1:
+            raise ValueError('block should be a positive integer')
+
+        nblock = -(-nscanline // block)
+        lat_min = np.full(nblock, np.inf)
+        lat_max = np.full(nblock, -np.inf)
+        lon_start = np.zeros(nblock)
+        lon_width = np.full(nblock, -1.)
+        for ii in range(nblock):
+            (lats, lons) = read_latlon(ii * block,
+                                       min(nscanline, (ii + 1) * block))
+            # exclude fill values
+            mask = (np.abs(lats) <= 90) & (np.abs(lons) <= 360)
+            if not np.any(mask):
+                continue
+            lat_min[ii] = lats[mask].min()
+            lat_max[ii] = lats[mask].max()
+            (lon_start[ii], lon_width[ii]) = _lon_arc(lons[mask])
+
+        return cls(nscanline, block, lat_min, lat_max, lon_start, lon_width,
+                   stamp=stamp)
+
+    @classmethod
+    def load(cls, flname):
+        """
+        Read the index from a sidecar file
+        """
+        with np.load(flname) as fid:
+            stamp = fid['stamp'] if fid['stamp'].size else None
+            return cls(fid['nscanline'], fid['block'], fid['lat_min'],
+                       fid['lat_max'], fid['lon_start'], fid['lon_width'],
+                       stamp=stamp)
+
+    def save(self, flname):
+        """
+        Write the index to a sidecar file
+
+        The index is written to a temporary file, which replaces the sidecar
+        when complete, thus readers never see a partially written sidecar
+        """
+        tmp_name = '{}.{}.tmp'.format(flname, os.getpid())
+        try:
+            with open(tmp_name, 'wb') as fp:
+                np.savez(fp, nscanline=self.nscanline, block=self.block,
+                         lat_min=self.lat_min, lat_max=self.lat_max,
+                         lon_start=self.lon_start, lon_width=self.lon_width,
+                         stamp=np.array(() if self.stamp is None
+                                        else self.stamp, dtype='i8'))
+            os.replace(tmp_name, flname)
+        finally:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def candidates(self, extent):
+        """
+        Returns the ranges of scanlines (start, stop) which may contain
+        pixels within the extent, adjacent blocks are merged
+
+        Parameters
+        ----------
+        extent  :  list
+           lon_min, lon_max, lat_min, lat_max, the longitude range crosses
+           the antimeridian when lon_min > lon_max
+        """
+        if len(extent) != 4:
+            raise ValueError('parameter extent must have 4 elements')
+
+        (start, width) = _extent_arc(extent)
+        valid = self.lon_width >= 0
+        overlap = valid & (self.lat_min <= extent[3]) \
+            & (self.lat_max >= extent[2]) \
+            & ((np.mod(self.lon_start - start, 360.) <= width)
+               | (np.mod(start - self.lon_start, 360.) <= self.lon_width))
+
+        res = []
+        for ii in np.flatnonzero(overlap):
+            first = ii * self.block
+            last = min(self.nscanline, (ii + 1) * self.block)
+            if res and res[-1][1] == first:
+                res[-1] = (res[-1][0], last)
+            else:
+                res.append((first, last))
+
+        return res
+
+    def select(self, read_latlon, extent):
+        """
+        Returns the scanline and ground pixel indices of the pixels within
+        the extent, only the candidate blocks are read
+
+        Parameters
+        ----------
+        read_latlon  :  callable
+           read_latlon(start, stop), see GeoIndex.build
+        extent       :  list
+           lon_min, lon_max, lat_min, lat_max
+        """
+        scanlines = []
+        pixels = []
+        for (first, last) in self.candidates(extent):
+            (lats, lons) = read_latlon(first, last)
+            indx = np.nonzero(extent_mask(lons, lats, extent))
+            scanlines.append(indx[0] + first)
+            pixels.append(indx[1])
+
+        if not scanlines:
+            return (np.array([], dtype=int), np.array([], dtype=int))
+
+        return (np.concatenate(scanlines), np.concatenate(pixels))
+
+
+# --------------------------------------------------
+def geo_index(product, read_latlon, nscanline, block=BLOCK):
+    """
+    Returns the spatial index of a level 2 product, the index is read from
+    its sidecar file or build and written to the sidecar file when the
+    sidecar is missing or older than the product
+
+    Parameters
+    ----------
+    product      :  str or Path
+       name of the level 2 product
+    read_latlon  :  callable
+       read_latlon(start, stop), see GeoIndex.build
+    nscanline    :  int
+       number of scanlines of the product
+    block        :  int
+       number of scanlines per block
+
+    Returns
+    -------
+    GeoIndex
+    """
+    key = str(Path(product).resolve())
+    stamp = _stamp(product)
+
+    index = _GEO_INDEX.get(key)
+    if index is not None and index.stamp == stamp and index.block == block:
+        return index
+
+    flname = sidecar_name(product)
+    index = None
+    if flname.is_file():
+        try:
+            index = GeoIndex.load(flname)
+        except (OSError, ValueError, KeyError, BadZipFile):
+            index = None
+    if index is None or index.stamp != stamp or index.block != block \
+       or index.nscanline != nscanline:
+        index = GeoIndex.build(read_latlon, nscanline, block=block,
+                               stamp=stamp)
+        try:
+            index.save(flname)
+        except OSError:
+            pass
+
+    _GEO_INDEX[key] = index
+    return index
@@ -22,9 +22,75 @@ from pathlib import Path
 
 import numpy as np
 
+from .s5p_trace import traced
+
 # - global parameters ------------------------------
 
 # - local functions --------------------------------
+def _scanline_range(data_sel, nscanline):
+    """
+    Returns the range of scanlines (first, last) selected by data_sel and
+    the selection relative to this range, or None when data_sel does not
+    select a contiguous range of scanlines
+    """
+    if data_sel is None:
+        return (0, nscanline, ())
+    if not isinstance(data_sel, tuple):
+        data_sel = (data_sel,)
+    if not data_sel:
+        return (0, nscanline, ())
+
+    sel = data_sel[0]
+    if isinstance(sel, (int, np.integer)):
+        first = sel + nscanline if sel < 0 else sel
+        if not 0 <= first < nscanline:
+            raise IndexError('scanline {} is out of range'.format(sel))
+        return (first, first + 1, (0,) + data_sel[1:])
+
+    if isinstance(sel, slice) and sel.step in (None, 1):
+        (first, last, _) = sel.indices(nscanline)
+        return (first, max(first, last), (slice(None),) + data_sel[1:])
+
+    return None
+
+
+def _nc_read(dset, sel, fill_as_nan):
+    """
+    read a netCDF4 variable as ndarray, instead of a masked array
+
+    With fill_as_nan, the (floating-point) values which netCDF4 would mask
+    are replaced by NaN: equal to _FillValue (or the netCDF default fill
+    value) or missing_value, and outside valid_min, valid_max or
+    valid_range
+    """
+    auto_mask = getattr(dset, 'mask', True)
+    dset.set_auto_mask(False)
+    try:
+        res = np.asarray(dset[sel])
+    finally:
+        dset.set_auto_mask(auto_mask)
+
+    if not fill_as_nan or res.dtype.kind != 'f':
+        return res
+
+    fillvalue = getattr(dset, '_FillValue', None)
+    if fillvalue is None:
+        from netCDF4 import default_fillvals
+
+        fillvalue = default_fillvals[res.dtype.str[1:]]
+    invalid = np.isin(res, np.append(
+        fillvalue, getattr(dset, 'missing_value', [])).astype(res.dtype))
+
+    (valid_min, valid_max) = getattr(dset, 'valid_range', (None, None))
+    valid_min = getattr(dset, 'valid_min', valid_min)
+    valid_max = getattr(dset, 'valid_max', valid_max)
+    if valid_min is not None:
+        invalid |= res < valid_min
+    if valid_max is not None:
+        invalid |= res > valid_max
+    res[invalid] = np.nan
+
+    return res
 
 
 # - class definition -------------------------------
@@ -33,7 +99,7 @@ class LV2io():
     This class should offer all the necessary functionality to read Tropomi
     S5P_OFFL_L2 products
     """
-    def __init__(self, lv2_product):
+    def __init__(self, lv2_product, dtype=None):
         """
         Initialize access to an S5P_L2 product
 
@@ -41,12 +107,22 @@ class LV2io():
         ----------
         lv2_product :  string
            full path to S5P Tropomi level 2 product
+        dtype       :  {'native', 'float64', 'float32'}, optional
+           dtype policy of get_dataset, see s5p_dtype.read_dataset.
+           Default 'float64' for operational products and 'native' for
+           science products, as returned by earlier versions
         """
-        import h5py
+        from .s5p_dtype import DTYPE_POLICY
+        from .s5p_hdf5 import open_product
+
+        if dtype is not None and dtype not in DTYPE_POLICY:
+            raise ValueError('unknown dtype policy {}'.format(dtype))
+
         science_inst = ['SRON Netherlands Institute for Space Research']
 
         # initialize class-attributes
         self.filename = lv2_product
+        self.dtype = dtype
         self.science_product = False
         self.fid = None
 
@@ -54,13 +130,18 @@ class LV2io():
             raise FileNotFoundError('{} does not exist'.format(lv2_product))
 
         # open LV2 product as HDF5 file
-        self.fid = h5py.File(lv2_product, "r")
+        self.fid = open_product(lv2_product, "r", product='lv2')
         try:
             if self.get_attr('institution') in science_inst:
                 self.science_product = True
         except OSError:
             self.science_product = True
 
+        # earlier versions returned float64 for operational products and
+        # the netCDF4 (native) type for science products
+        if self.dtype is None:
+            self.dtype = 'native' if self.science_product else 'float64'
+
         if self.science_product:
             from netCDF4 import Dataset
 
@@ -225,6 +306,25 @@ class LV2io():
         return self.fid['/PRODUCT/delta_time'][0, :].astype(int)
 
     # -------------------------
+    def __nc_rows(self, dset, data_sel, fill_as_nan=False):
+        """
+        read the scanlines selected by data_sel of a netCDF4 variable with
+        flattened dimensions (scanline * ground_pixel [, corner]), only the
+        selected range of scanlines is read. Returns a view with dimensions
+        (scanline, ground_pixel [, corner]) selected by data_sel
+        """
+        sel_range = _scanline_range(data_sel, self.scanline)
+        if sel_range is None:
+            res = _nc_read(dset, np.s_[:], fill_as_nan)
+            return res.reshape((self.scanline, self.ground_pixel)
+                               + res.shape[1:])[data_sel]
+
+        (first, last, data_sel) = sel_range
+        res = _nc_read(dset, np.s_[first * self.ground_pixel:
+                                   last * self.ground_pixel], fill_as_nan)
+        res = res.reshape((last - first, self.ground_pixel) + res.shape[1:])
+        return res[data_sel] if data_sel else res
+
     def __h5_geo_data(self, geo_dsets):
         """
         read gelocation datasets from operational products using HDF5
@@ -256,6 +356,7 @@ class LV2io():
 
         return res
 
+    @traced
     def get_geo_data(self, geo_dsets=None):
         """
         Returns data of selected datasets from the GEOLOCATIONS group
@@ -279,6 +380,35 @@ class LV2io():
         return self.__h5_geo_data(geo_dsets)
 
     # -------------------------
+    def __h5_latlon(self, first, last):
+        """
+        read latitude/longitude of scanlines [first:last] using HDF5
+        """
+        return (self.fid['/PRODUCT/latitude'][0, first:last, :],
+                self.fid['/PRODUCT/longitude'][0, first:last, :])
+
+    def __nc_latlon(self, first, last):
+        """
+        read latitude/longitude of scanlines [first:last] using netCDF4
+        """
+        res = ()
+        for key in ('latitude_center', 'longitude_center'):
+            res += (self.__nc_rows(self.fid['/instrument/' + key],
+                                   np.s_[first:last], fill_as_nan=True),)
+
+        return res
+
+    def __geo_index(self):
+        """
+        Returns spatial index of the pixel centers, see lv2_index
+        """
+        from .lv2_index import geo_index
+
+        if self.science_product:
+            return geo_index(self.filename, self.__nc_latlon, self.scanline)
+
+        return geo_index(self.filename, self.__h5_latlon, self.scanline)
+
     def __h5_geo_bounds(self, extent, data_sel):
         """
         read bounds of latitude/longitude from operational products using HDF5
@@ -288,11 +418,9 @@ class LV2io():
             if len(extent) != 4:
                 raise ValueError('parameter extent must have 4 elements')
 
-            lats = self.fid['/PRODUCT/latitude'][0, ...]
-            lons = self.fid['/PRODUCT/longitude'][0, ...]
-
-            indx = np.where((lons >= extent[0]) & (lons <= extent[1])
-                            & (lats >= extent[2]) & (lats <= extent[3]))
+            indx = self.__geo_index().select(self.__h5_latlon, extent)
+            if indx[0].size == 0:
+                raise ValueError('no data within extent')
             data_sel = np.s_[0,
                              indx[0].min():indx[0].max(),
                              indx[1].min():indx[1].max()]
@@ -316,27 +444,19 @@ class LV2io():
             if len(extent) != 4:
                 raise ValueError('parameter extent must have 4 elements')
 
-            lats = self.fid['/instrument/latitude_center'][:].reshape(
-                self.scanline, self.ground_pixel)
-            lons = self.fid['/instrument/longitude_center'][:].reshape(
-                self.scanline, self.ground_pixel)
-
-            indx = np.where((lons >= extent[0]) & (lons <= extent[1])
-                            & (lats >= extent[2]) & (lats <= extent[3]))
+            indx = self.__geo_index().select(self.__nc_latlon, extent)
+            if indx[0].size == 0:
+                raise ValueError('no data within extent')
             data_sel = np.s_[indx[0].min():indx[0].max(),
                              indx[1].min():indx[1].max()]
 
         gid = self.fid['/instrument']
-        lat_bounds = gid['latitude_corners'][:].data.reshape(
-            self.scanline, self.ground_pixel, 4)
-        lon_bounds = gid['longitude_corners'][:].data.reshape(
-            self.scanline, self.ground_pixel, 4)
-        if data_sel is not None:
-            lat_bounds = lat_bounds[data_sel + (slice(None),)]
-            lon_bounds = lon_bounds[data_sel + (slice(None),)]
+        lat_bounds = self.__nc_rows(gid['latitude_corners'], data_sel)
+        lon_bounds = self.__nc_rows(gid['longitude_corners'], data_sel)
 
         return (data_sel, lon_bounds, lat_bounds)
 
+    @traced
     def get_geo_bounds(self, extent=None, data_sel=None):
         """
         Returns bounds of latitude/longitude as a mesh for plotting
@@ -345,7 +465,10 @@ class LV2io():
         ----------
         extent    :  list
            select data to cover a region with geolocation defined by:
-             lon_min, lon_max, lat_min, lat_max and return numpy slice
+             lon_min, lon_max, lat_min, lat_max and return numpy slice.
+           The region crosses the antimeridian when lon_min > lon_max.
+           Only the scanlines near the region are read, using a spatial
+           index which is stored next to the product, see lv2_index
         data_sel  :  numpy slice
            a 3-dimensional numpy slice: time, scan_line, ground_pixel
            Note 'data_sel' will be overwritten when 'extent' is defined
@@ -366,13 +489,13 @@ class LV2io():
 
         res = {}
         _sz = lon_bounds.shape
-        res['longitude'] = np.empty((_sz[0]+1, _sz[1]+1), dtype=np.float)
+        res['longitude'] = np.empty((_sz[0]+1, _sz[1]+1), dtype=float)
         res['longitude'][:-1, :-1] = lon_bounds[:, :, 0]
         res['longitude'][-1, :-1] = lon_bounds[-1, :, 1]
         res['longitude'][:-1, -1] = lon_bounds[:, -1, 1]
         res['longitude'][-1, -1] = lon_bounds[-1, -1, 2]
 
-        res['latitude'] = np.empty((_sz[0]+1, _sz[1]+1), dtype=np.float)
+        res['latitude'] = np.empty((_sz[0]+1, _sz[1]+1), dtype=float)
         res['latitude'][:-1, :-1] = lat_bounds[:, :, 0]
         res['latitude'][-1, :-1] = lat_bounds[-1, :, 1]
         res['latitude'][:-1, -1] = lat_bounds[:, -1, 1]
@@ -384,10 +507,12 @@ class LV2io():
         return data_sel, res
 
     # -------------------------
-    def __h5_dataset(self, name, data_sel, fill_as_nan):
+    def __h5_dataset(self, name, data_sel, fill_as_nan, dtype):
         """
         read dataset from operational products using HDF5
         """
+        from .s5p_dtype import read_dataset
+
         fillvalue = float.fromhex('0x1.ep+122')
 
         if name not in self.fid['/PRODUCT']:
@@ -395,41 +520,28 @@ class LV2io():
 
         dset = self.fid['/PRODUCT/{}'.format(name)]
         if data_sel is None:
-            if dset.dtype == np.float32:
-                with dset.astype(np.float):
-                    res = dset[0, ...]
-            else:
-                res = dset[0, ...]
-        else:
-            if dset.dtype == np.float32:
-                with dset.astype(np.float):
-                    res = dset[data_sel]
-            else:
-                res = dset[data_sel]
-
-        if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
-            res[(res == fillvalue)] = np.nan
+            data_sel = np.s_[0, ...]
 
-        return res
+        apply_nan = fill_as_nan and dset.attrs['_FillValue'] == fillvalue
+        return read_dataset(dset, data_sel, policy=dtype,
+                            fillvalue=fillvalue if apply_nan else None)
 
-    def __nc_dataset(self, name, data_sel, fill_as_nan):
+    def __nc_dataset(self, name, data_sel, fill_as_nan, dtype):
         """
         read dataset from science products using netCDF4
         """
+        from .s5p_dtype import policy_dtype
+
         if name not in self.fid['/target_product'].variables.keys():
             raise ValueError('dataset {} for found'.format(name))
 
         dset = self.fid['/target_product/{}'.format(name)]
-        res = dset[:].reshape(self.scanline, self.ground_pixel)
-        if data_sel is not None:
-            res = res[data_sel]
-
-        if fill_as_nan:
-            return res.filled(np.nan)
-
-        return res.data
+        res = self.__nc_rows(dset, data_sel, fill_as_nan)
+        return res.astype(policy_dtype(res.dtype, dtype), copy=False)
 
-    def get_dataset(self, name, data_sel=None, fill_as_nan=True):
+    @traced
+    def get_dataset(self, name, data_sel=None, fill_as_nan=True,
+                    dtype=None):
         """
         Read level 2 dataset from PRODUCT group
 
@@ -441,15 +553,20 @@ class LV2io():
            a 3-dimensional numpy slice: time, scan_line, ground_pixel
         fill_as_nan :  boolean
             Replace (float) FillValues with Nan's, when True
+        dtype  :  {'native', 'float64', 'float32'}, optional
+            dtype policy, default is the policy of the object
 
         Returns
         -------
         out  :  array
         """
+        if dtype is None:
+            dtype = self.dtype
+
         if self.science_product:
-            return self.__nc_dataset(name, data_sel, fill_as_nan)
+            return self.__nc_dataset(name, data_sel, fill_as_nan, dtype)
 
-        return self.__h5_dataset(name, data_sel, fill_as_nan)
+        return self.__h5_dataset(name, data_sel, fill_as_nan, dtype)
 
     # -------------------------
     def __h5_data_as_s5pmsm(self, name, data_sel, fill_as_nan, mol_m2):
@@ -461,15 +578,21 @@ class LV2io():
         Return: S5Pmsm object
         """
         from pys5p.s5p_msm import S5Pmsm
+        from .s5p_dtype import read_dataset
 
         if name not in self.fid['/PRODUCT']:
             raise ValueError('dataset {} for found'.format(name))
 
+        # value and error are read with the dtype policy of this object,
+        # FillValues of the error are always replaced by NaN
         dset = self.fid['/PRODUCT/{}'.format(name)]
-        msm = S5Pmsm(dset, data_sel=data_sel)
+        msm = S5Pmsm(dset, data_sel=data_sel, lazy=True)
+        sel = () if data_sel is None else data_sel
+        msm.value = np.squeeze(read_dataset(dset, sel, policy=self.dtype))
         if '{}_precision'.format(name) in self.fid['/PRODUCT']:
-            msm.error = self.get_dataset('{}_precision'.format(name),
-                                         data_sel=data_sel)
+            msm.error = np.squeeze(self.get_dataset(
+                '{}_precision'.format(name), data_sel=data_sel))
+        msm.load()
 
         if not mol_m2:
             factor = dset.attrs[
@@ -509,6 +632,7 @@ class LV2io():
 
         return msm
 
+    @traced
     def get_data_as_s5pmsm(self, name, data_sel=None, fill_as_nan=True,
                            mol_m2=False):
         """
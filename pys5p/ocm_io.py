@@ -13,9 +13,12 @@ License:  BSD-3-Clause
 """
 from pathlib import Path
 
-import h5py
 import numpy as np
 
+from .s5p_dtype import DTYPE_POLICY, read_dataset
+from .s5p_hdf5 import open_product
+from .s5p_trace import traced
+
 # - global parameters ------------------------------
 
 
@@ -103,7 +106,7 @@ class OCMio():
     This class should offer all the necessary functionality to read Tropomi
     on-ground calibration products (Lx)
     """
-    def __init__(self, ocm_product):
+    def __init__(self, ocm_product, dtype='float64'):
         """
         Initialize access to an OCAL Lx product
 
@@ -111,10 +114,16 @@ class OCMio():
         ----------
         ocm_product :  string
            Full path to on-ground calibration measurement
+        dtype       :  {'native', 'float64', 'float32'}
+           dtype policy of get_msm_data, see s5p_dtype.read_dataset
 
         """
+        if dtype not in DTYPE_POLICY:
+            raise ValueError('unknown dtype policy {}'.format(dtype))
+
         # initialize class-attributes
         self.filename = ocm_product
+        self.dtype = dtype
         self.__msm_path = None
         self.__patched_msm = []
         self.band = None
@@ -124,7 +133,7 @@ class OCMio():
             raise FileNotFoundError('{} does not exist'.format(ocm_product))
 
         # open OCM product as HDF5 file
-        self.fid = h5py.File(ocm_product, "r")
+        self.fid = open_product(ocm_product, "r", product='ocm')
 
     def __repr__(self):
         class_name = type(self).__name__
@@ -232,6 +241,7 @@ class OCMio():
 
         return res
 
+    @traced
     def get_instrument_settings(self):
         """
         Returns instrument settings of measurement
@@ -247,6 +257,7 @@ class OCMio():
 
         return res
 
+    @traced
     def get_gse_stimuli(self):
         """
         Returns GSE stimuli parameters
@@ -279,6 +290,7 @@ class OCMio():
 
         return instr['exposure_time']
 
+    @traced
     def get_housekeeping_data(self):
         """
         Returns housekeeping data of measurements
@@ -372,8 +384,9 @@ class OCMio():
 
         return None
 
+    @traced
     def get_msm_data(self, msm_dset, fill_as_nan=True,
-                     frames=None, columns=None):
+                     frames=None, columns=None, dtype=None):
         """
         Returns data of measurement dataset "msm_dset"
 
@@ -392,6 +405,9 @@ class OCMio():
         fill_as_nan :  boolean
             replace (float) FillValues with Nan's
 
+        dtype     :  {'native', 'float64', 'float32'}, optional
+            dtype policy, default is the policy of the object
+
         Returns
         -------
         out   :   dictionary
@@ -440,16 +456,12 @@ class OCMio():
                     raise ValueError
 
             # read data
-            if dset.dtype == np.float32:
-                with dset.astype(np.float):
-                    data = np.squeeze(dset[data_sel])
-            else:
-                data = np.squeeze(dset[data_sel])
-
-            if fill_as_nan and dset.attrs['_FillValue'] == fillvalue:
-                data[(data == fillvalue)] = np.nan
+            apply_nan = fill_as_nan and dset.attrs['_FillValue'] == fillvalue
+            data = read_dataset(dset, data_sel,
+                                policy=self.dtype if dtype is None else dtype,
+                                fillvalue=fillvalue if apply_nan else None)
 
             # add data to dictionary
-            res[msm_grp] = data
+            res[msm_grp] = np.squeeze(data)
 
         return res
@@ -0,0 +1,164 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Compare datasets of two HDF5 products chunk by chunk, in bounded memory,
+e.g. a patched product with its original product
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+
+# - local functions --------------------------------
+def _same_storage(dset1, dset2):
+    """
+    Returns True when the raw chunks of two datasets can be compared
+    """
+    if dset1.chunks is None or dset1.chunks != dset2.chunks:
+        return False
+
+    return all(getattr(dset1, key) == getattr(dset2, key)
+               for key in ('dtype', 'shape', 'compression',
+                           'compression_opts', 'shuffle', 'fletcher32',
+                           'scaleoffset'))
+
+
+def _raw_chunk(dset, offset):
+    """
+    Returns the raw (filtered) data of a chunk, or None when not available
+    """
+    try:
+        return dset.id.read_direct_chunk(offset)
+    except (KeyError, OSError, RuntimeError):
+        return None
+
+
+def compare_datasets(dset1, dset2, rtol=0., atol=0., fillvalue=None,
+                     max_bytes=16 * 2**20):
+    """
+    Compare two datasets chunk by chunk, in bounded memory
+
+    Identical raw chunks are skipped without decompression. Floating-point
+    values are equal when both are NaN (or fillvalue), or when
+    |value2 - value1| <= atol + rtol * |value1|
+
+    Parameters
+    ----------
+    dset1     :  h5py.Dataset
+       reference dataset, e.g. of the original product
+    dset2     :  h5py.Dataset
+       dataset to compare, e.g. of the patched product
+    rtol      :  float
+       relative tolerance for floating-point values
+    atol      :  float
+       absolute tolerance for floating-point values
+    fillvalue :  float, optional
+       floating-point values equal to fillvalue are handled as NaN
+    max_bytes :  int
+       maximum size of the blocks read from contiguous datasets
+
+    Returns
+    -------
+    dictionary with the keys:
+      name          :  name of the dataset
+      shape         :  shape of the dataset
+      chunks        :  shape of the chunks (or blocks) compared
+      nchunks       :  number of chunks
+      nchunks_raw   :  number of chunks skipped, because raw data is equal
+      nchunks_diff  :  number of chunks with differences
+      changed       :  number of different values
+      nan_mismatch  :  number of values which are NaN in only one dataset
+      max_abs_diff  :  maximum absolute difference
+      max_rel_diff  :  maximum relative difference
+      chunk_map     :  boolean array, True for chunks with differences
+    """
+    if dset1.shape != dset2.shape:
+        raise ValueError('datasets {} have different shapes'.format(
+            dset1.name))
+
+    chunks = dset1.chunks
+    if chunks is None:
+        # compare contiguous datasets in blocks along the first dimensions
+        chunks = list(dset1.shape)
+        for ii in range(len(chunks)):
+            nbytes = dset1.dtype.itemsize * int(np.prod(chunks[ii + 1:]))
+            chunks[ii] = max(1, min(chunks[ii], max_bytes // max(1, nbytes)))
+            if nbytes * chunks[ii] <= max_bytes:
+                break
+        chunks = tuple(chunks)
+
+    grid = tuple(-(-x // y) for x, y in zip(dset1.shape, chunks))
+    res = {'name': dset1.name,
+           'shape': dset1.shape,
+           'chunks': chunks,
+           'nchunks': int(np.prod(grid)),
+           'nchunks_raw': 0,
+           'nchunks_diff': 0,
+           'changed': 0,
+           'nan_mismatch': 0,
+           'max_abs_diff': 0.,
+           'max_rel_diff': 0.,
+           'chunk_map': np.zeros(grid, dtype=bool)}
+    if dset1.size == 0:
+        return res
+
+    is_float = np.issubdtype(dset1.dtype, np.floating)
+    raw_compare = _same_storage(dset1, dset2)
+    buff1 = np.empty(chunks, dtype=dset1.dtype)
+    buff2 = np.empty(chunks, dtype=dset2.dtype)
+    for index in np.ndindex(*grid):
+        sel = tuple(slice(ii * size, min((ii + 1) * size, dim))
+                    for ii, size, dim in zip(index, chunks, dset1.shape))
+        if raw_compare:
+            offset = tuple(x.start for x in sel)
+            raw1 = _raw_chunk(dset1, offset)
+            if raw1 is not None and raw1 == _raw_chunk(dset2, offset):
+                res['nchunks_raw'] += 1
+                continue
+
+        dest_sel = tuple(slice(0, x.stop - x.start) for x in sel)
+        data1 = buff1[dest_sel]
+        data2 = buff2[dest_sel]
+        dset1.read_direct(buff1, source_sel=sel, dest_sel=dest_sel)
+        dset2.read_direct(buff2, source_sel=sel, dest_sel=dest_sel)
+
+        if is_float:
+            if fillvalue is not None:
+                data1[data1 == fillvalue] = np.nan
+                data2[data2 == fillvalue] = np.nan
+            nan1 = np.isnan(data1)
+            nan2 = np.isnan(data2)
+            valid = ~(nan1 | nan2)
+            diff = np.abs(data2[valid].astype(float) - data1[valid])
+            ref = np.abs(data1[valid].astype(float))
+            mask = diff > atol + rtol * ref
+            nan_mismatch = int(np.count_nonzero(nan1 != nan2))
+            changed = int(np.count_nonzero(mask)) + nan_mismatch
+        else:
+            diff = np.abs(data2.astype(float) - data1)
+            ref = np.abs(data1.astype(float))
+            mask = diff > 0
+            nan_mismatch = 0
+            changed = int(np.count_nonzero(mask))
+
+        if changed == 0:
+            continue
+
+        res['nchunks_diff'] += 1
+        res['chunk_map'][index] = True
+        res['changed'] += changed
+        res['nan_mismatch'] += nan_mismatch
+        if np.any(mask):
+            res['max_abs_diff'] = max(res['max_abs_diff'],
+                                      float(diff[mask].max()))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rel = diff[mask] / ref[mask]
+            res['max_rel_diff'] = max(res['max_rel_diff'],
+                                      float(np.nanmax(rel)))
+
+    return res
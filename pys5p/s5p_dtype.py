@@ -0,0 +1,78 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Read HDF5 datasets with a dtype policy. The readers ICMio, LV2io and OCMio
+return floating-point data according to a dtype policy, see read_dataset:
+  native      :  as stored in the product
+  float64     :  floating-point data as float64 (default)
+  float32     :  floating-point data as float32, half the memory of float64
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+# - global parameters ------------------------------
+# dtype policies of the product readers, see read_dataset
+DTYPE_POLICY = ('native', 'float64', 'float32')
+
+
+# - local functions --------------------------------
+def policy_dtype(dtype, policy='float64'):
+    """
+    Returns the dtype of data, stored as dtype, read with a dtype policy.
+    Only floating-point data is converted
+
+    Parameters
+    ----------
+    dtype   :  numpy dtype
+       dtype of the dataset
+    policy  :  {'native', 'float64', 'float32'}
+       dtype policy, see DTYPE_POLICY
+    """
+    if policy not in DTYPE_POLICY:
+        raise ValueError('unknown dtype policy {}'.format(policy))
+
+    dtype = np.dtype(dtype)
+    if policy == 'native' or dtype.kind != 'f':
+        return dtype
+
+    return np.dtype(policy)
+
+
+def read_dataset(dset, data_sel=(), policy='float64', fillvalue=None):
+    """
+    Read a selection of a dataset with a dtype policy, the conversion is
+    performed by the HDF5 library while reading
+
+    Parameters
+    ----------
+    dset       :  h5py.Dataset
+    data_sel   :  tuple
+       selection of the dataset
+    policy     :  {'native', 'float64', 'float32'}
+       dtype policy, see DTYPE_POLICY
+    fillvalue  :  float, optional
+       replace this value by NaN, in the precision of the returned data
+
+    Returns
+    -------
+    ndarray
+    """
+    dtype = policy_dtype(dset.dtype, policy)
+    if dtype == dset.dtype:
+        res = dset[data_sel]
+    else:
+        res = dset.astype(dtype)[data_sel]
+
+    if fillvalue is not None and res.dtype.kind == 'f':
+        if np.ndim(res) == 0:
+            return res.dtype.type(np.nan) \
+                if res == res.dtype.type(fillvalue) else res
+        res[res == res.dtype.type(fillvalue)] = np.nan
+
+    return res
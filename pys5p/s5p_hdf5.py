@@ -0,0 +1,235 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Shared layer to open HDF5 products with a named file-access profile.
+A profile defines the raw-data chunk cache (rdcc_nbytes, rdcc_nslots,
+rdcc_w0), page buffering or the file driver used by h5py.
+
+Profiles:
+  default     :  HDF5 library defaults (chunk cache of 1 MiB)
+  chunked     :  chunk cache of 64 MiB, for random access to compressed data
+  sequential  :  chunk cache of 256 MiB, fully read chunks are evicted first,
+                 for reading compressed data per scanline or frame
+  paged       :  page buffer of 16 MiB, for products written with the paged
+                 file-space strategy (ignored for other products)
+  core        :  read the whole product in memory
+  small       :  read the whole product in memory, if smaller than 32 MiB,
+                 else use profile 'chunked'
+
+The product readers (CKDio, ICMio, L1Bio, LV2io, OCMio) use the profile
+selected for their product type, change the default with set_profile.
+The profile 'sequential' is opt-in, because of its large chunk cache per
+open product:
+
+  set_profile('l1b', 'sequential')
+
+Use the benchmark to select a profile for a product and access pattern:
+
+  python3 -m pys5p.s5p_hdf5 S5P_OFFL_L1B_RA_BD7_*.nc \
+          BAND7_RADIANCE/STANDARD_MODE/OBSERVATIONS/radiance
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+
+import h5py
+
+# - global parameters ------------------------------
+PROFILES = {
+    'default': {},
+    'chunked': {'rdcc_nbytes': 64 * 2**20,
+                'rdcc_nslots': 10007,
+                'rdcc_w0': 0.75},
+    'sequential': {'rdcc_nbytes': 256 * 2**20,
+                   'rdcc_nslots': 40009,
+                   'rdcc_w0': 1.},
+    'paged': {'page_buf_size': 16 * 2**20,
+              'rdcc_nbytes': 16 * 2**20},
+    'core': {'driver': 'core',
+             'backing_store': False},
+    'small': {'driver': 'core',
+              'backing_store': False,
+              'max_size': 32 * 2**20,
+              'fallback': 'chunked'}
+}
+
+# profile used by the product readers, see set_profile
+PRODUCT_PROFILE = {
+    'ckd': 'small',
+    'icm': 'chunked',
+    'l1b': 'chunked',
+    'lv2': 'chunked',
+    'ocm': 'chunked'
+}
+
+
+# - local functions --------------------------------
+def set_profile(product, profile):
+    """
+    Set the file-access profile used to open products of a given type
+
+    Parameters
+    ----------
+    product  :  {'ckd', 'icm', 'l1b', 'lv2', 'ocm'}
+       product type
+    profile  :  string or dict
+       name of the profile in PROFILES or dictionary with h5py.File keywords
+    """
+    if product not in PRODUCT_PROFILE:
+        raise ValueError('unknown product type {}'.format(product))
+    if isinstance(profile, str) and profile not in PROFILES:
+        raise ValueError('unknown profile {}'.format(profile))
+
+    PRODUCT_PROFILE[product] = profile
+
+
+def profile_kwargs(flname, mode='r', product=None, profile=None):
+    """
+    Returns the h5py.File keywords of a profile
+
+    Parameters
+    ----------
+    flname   :  str or Path
+       name of the HDF5 product
+    mode     :  {'r', 'r+'}
+       access mode
+    product  :  string, optional
+       product type, selects the profile, see PRODUCT_PROFILE
+    profile  :  string or dict, optional
+       name of the profile or dictionary with h5py.File keywords,
+       overrules the profile of the product type
+    """
+    if profile is None:
+        profile = PRODUCT_PROFILE.get(product, 'default')
+    if isinstance(profile, str):
+        if profile not in PROFILES:
+            raise ValueError('unknown profile {}'.format(profile))
+        profile = PROFILES[profile]
+
+    kwargs = dict(profile)
+    max_size = kwargs.pop('max_size', None)
+    fallback = kwargs.pop('fallback', 'default')
+    if max_size is not None and Path(flname).stat().st_size > max_size:
+        return profile_kwargs(flname, mode, profile=fallback)
+
+    # changes to products in memory are not written to disk
+    if mode != 'r' and kwargs.get('driver') == 'core':
+        return profile_kwargs(flname, mode, profile='chunked')
+
+    return kwargs
+
+
+def open_product(flname, mode='r', product=None, profile=None):
+    """
+    Open a HDF5 product with the file-access profile of the product type
+
+    Parameters
+    ----------
+    flname   :  str or Path
+       name of the HDF5 product
+    mode     :  {'r', 'r+'}
+       access mode
+    product  :  {'ckd', 'icm', 'l1b', 'lv2', 'ocm'}, optional
+       product type, selects the profile
+    profile  :  string or dict, optional
+       name of the profile or dictionary with h5py.File keywords,
+       overrules the profile of the product type
+
+    Returns
+    -------
+    h5py.File, or s5p_trace.TracedFile within s5p_trace.io_trace
+    """
+    from .s5p_trace import TracedFile, active_trace
+
+    h5_file = h5py.File if active_trace() is None else TracedFile
+    kwargs = profile_kwargs(flname, mode, product, profile)
+    if 'page_buf_size' not in kwargs:
+        return h5_file(flname, mode, **kwargs)
+
+    # page buffering requires a product with paged file-space strategy
+    try:
+        return h5_file(flname, mode, **kwargs)
+    except (OSError, TypeError):
+        kwargs.pop('page_buf_size')
+        return h5_file(flname, mode, **kwargs)
+
+
+def benchmark_profiles(flname, ds_name, profiles=None, block=1, repeat=3):
+    """
+    Returns time to read a dataset in blocks of scanlines (or frames) for
+    each profile
+
+    Parameters
+    ----------
+    flname   :  str or Path
+       name of the HDF5 product
+    ds_name  :  string
+       full name of the dataset
+    profiles :  list of strings, optional
+       names of the profiles, default all profiles
+    block    :  int
+       number of scanlines (or frames) per read
+    repeat   :  int
+       the minimum time of repeated reads is returned
+
+    Returns
+    -------
+    dictionary with the read time [s] of each profile
+
+    Note the first read of a product is affected by the file-system cache
+    """
+    from time import perf_counter
+
+    if profiles is None:
+        profiles = list(PROFILES)
+
+    res = {}
+    for profile in profiles:
+        times = []
+        for _ in range(repeat):
+            tstart = perf_counter()
+            with open_product(flname, profile=profile) as fid:
+                dset = fid[ds_name]
+
+                # L1B datasets have dimensions (time, scanline, ...)
+                axis = 1 if dset.ndim > 2 and dset.shape[0] == 1 else 0
+                for ii in range(0, dset.shape[axis], block):
+                    sel = [slice(None)] * dset.ndim
+                    sel[axis] = slice(ii, ii + block)
+                    _ = dset[tuple(sel)]
+            times.append(perf_counter() - tstart)
+        res[profile] = min(times)
+
+    return res
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='benchmark HDF5 file-access profiles')
+    parser.add_argument('product', help='name of the HDF5 product')
+    parser.add_argument('dataset', help='full name of the dataset')
+    parser.add_argument('--block', type=int, default=1,
+                        help='number of scanlines (or frames) per read')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    res = benchmark_profiles(args.product, args.dataset,
+                             block=args.block, repeat=args.repeat)
+    for profile, value in sorted(res.items(), key=lambda x: x[1]):
+        print('{:12s} {:10.4f} s'.format(profile, value))
+    print('recommended profile: {}'.format(min(res, key=res.get)))
+
+
+if __name__ == '__main__':
+    main()
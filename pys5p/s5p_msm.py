@@ -21,6 +21,11 @@ dimensions. Initialization:
 
 Limited to 3 dimensions
 
+With lazy=True only the attributes of the h5py dataset are read at
+initialization, value, error and coords are read when accessed. The
+methods nanpercentile, biweight, nanmedian and nanmean read only the frames
+selected by data_sel, when this selection is a hyperslab.
+
 Copyright (c) 2017 SRON - Netherlands Institute for Space Research
    All Rights Reserved
 
@@ -59,12 +64,146 @@ def pad_rows(arr1, arr2):
     return (arr1, arr2)
 
 
+def _normalize_sel(shape, data_sel):
+    """
+    Returns selection as a tuple with one element per dimension
+    """
+    if data_sel is None:
+        return (slice(None),) * len(shape)
+    if not isinstance(data_sel, tuple):
+        data_sel = (data_sel,)
+
+    if any(x is Ellipsis for x in data_sel):
+        indx = [ii for ii, x in enumerate(data_sel) if x is Ellipsis][0]
+        fill = (slice(None),) * (len(shape) - len(data_sel) + 1)
+        data_sel = data_sel[:indx] + fill + data_sel[indx+1:]
+
+    return data_sel + (slice(None),) * (len(shape) - len(data_sel))
+
+
+def selection_shape(shape, data_sel):
+    """
+    Returns the shape of the data selected by 'data_sel', dimensions
+    indexed by an integer are kept with length one
+    """
+    res = ()
+    for dim, elmnt in zip(shape, _normalize_sel(shape, data_sel)):
+        if isinstance(elmnt, (int, np.integer)):
+            res += (1,)
+        elif isinstance(elmnt, slice):
+            res += (len(range(*elmnt.indices(dim))),)
+        else:
+            res += (np.arange(dim)[elmnt].size,)
+
+    return res
+
+
+def select_subset(shape, data_sel, subset):
+    """
+    Combine the selection 'data_sel' of a dataset with the selection 'subset'
+    of the (squeezed) selected data into one hyperslab of the dataset
+
+    Returns None when the combined selection is not a hyperslab
+    """
+    sel = []
+    for dim, elmnt in zip(shape, _normalize_sel(shape, data_sel)):
+        if isinstance(elmnt, (int, np.integer)):
+            sel.append(int(elmnt) % dim)
+        elif isinstance(elmnt, slice) and (elmnt.step or 1) > 0:
+            sel.append(slice(*elmnt.indices(dim)))
+        else:
+            return None
+    if subset is None:
+        return tuple(sel)
+
+    # only dimensions with length larger than one are kept in the data
+    sel_shape = selection_shape(shape, data_sel)
+    kept = [ii for ii in range(len(shape)) if sel_shape[ii] != 1]
+    if not isinstance(subset, tuple):
+        subset = (subset,)
+    if len(subset) > len(kept):
+        return None
+    subset = _normalize_sel([sel_shape[ii] for ii in kept], subset)
+
+    for ii, elmnt in zip(kept, subset):
+        (start, step) = (sel[ii].start, sel[ii].step)
+        if isinstance(elmnt, (int, np.integer)):
+            if not -sel_shape[ii] <= elmnt < sel_shape[ii]:
+                return None
+            sel[ii] = start + (int(elmnt) % sel_shape[ii]) * step
+        elif isinstance(elmnt, slice) and (elmnt.step or 1) > 0:
+            (first, last, incr) = elmnt.indices(sel_shape[ii])
+            last = max(first, last)
+            sel[ii] = slice(start + first * step, start + last * step,
+                            step * incr)
+        else:
+            return None
+
+    return tuple(sel)
+
+
+def read_hyperslab(h5_dset, source_sel, dest, dest_start, field=None):
+    """
+    Read a hyperslab of a h5py dataset directly into a block of array 'dest'
+
+    Parameters
+    ----------
+    h5_dset    :  h5py.Dataset
+    source_sel :  tuple
+       selection of the dataset, one integer or slice (step > 0) per dimension
+    dest       :  ndarray
+       C-contiguous array, the block starts at index 'dest_start'
+    field      :  str, optional
+       name of the field to read from a compound dataset
+    """
+    from time import perf_counter
+
+    from h5py import h5s, h5t
+
+    start = []
+    stride = []
+    count = []
+    for dim, elmnt in zip(h5_dset.shape, source_sel):
+        if isinstance(elmnt, slice):
+            (first, last, step) = elmnt.indices(dim)
+            start.append(first)
+            stride.append(step)
+            count.append(len(range(first, last, step)))
+        else:
+            start.append(elmnt)
+            stride.append(1)
+            count.append(1)
+    if np.prod(count) == 0:
+        return
+
+    fspace = h5_dset.id.get_space()
+    fspace.select_hyperslab(tuple(start), tuple(count), tuple(stride))
+
+    # the number of elements of both selections should be equal
+    block = tuple(x for x in count if x != 1)
+    block = (1,) * (dest.ndim - len(block)) + block
+    mspace = h5s.create_simple(dest.shape)
+    mspace.select_hyperslab(tuple(dest_start), block)
+
+    if field is None:
+        mtype = h5t.py_create(dest.dtype)
+    else:
+        mtype = h5t.py_create(np.dtype([(field, dest.dtype)]))
+    tstart = perf_counter()
+    h5_dset.id.read(mspace, fspace, dest, mtype)
+
+    # datasets of products opened within s5p_trace.io_trace
+    if hasattr(h5_dset, 'record_read'):
+        h5_dset.record_read(tuple(count), np.prod(count) * dest.itemsize,
+                            perf_counter() - tstart)
+
+
 # - class definition -------------------------------
 class S5Pmsm():
     """
     Definition of class S5Pmsm
     """
-    def __init__(self, dset, data_sel=None, datapoint=False):
+    def __init__(self, dset, data_sel=None, datapoint=False, lazy=False):
         """
         Read measurement data from a Tropomi OCAL, ICM, of L1B product
 
@@ -77,6 +216,10 @@ class S5Pmsm():
            a numpy slice generated for example numpy.s_
         datapoint :  boolean
            to indicate that the dataset is a compound of type datapoint
+        lazy      :  boolean
+           postpone reading of 'value', 'error' and 'coords' of an h5py
+           dataset until they are accessed. Note the HDF5 file should be
+           kept open until then
 
         Returns
         -------
@@ -95,18 +238,78 @@ class S5Pmsm():
         self.units = None
         self.long_name = ''
         self.fillvalue = None
+        self.__lazy = None
 
         if isinstance(dset, Dataset):
-            self.__from_h5_dset(dset, data_sel, datapoint)
+            self.__from_h5_dset(dset, data_sel, datapoint, lazy)
         else:
             self.__from_ndarray(dset, data_sel)
 
-    def __from_h5_dset(self, h5_dset, data_sel, datapoint):
+    def __getattr__(self, name):
+        """
+        Read 'value', 'error' or 'coords' of a lazy S5Pmsm object when
+        they are accessed for the first time
+        """
+        if name not in ('value', 'error', 'coords') \
+           or self.__dict__.get('_S5Pmsm__lazy') is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                type(self).__name__, name))
+
+        if name == 'coords':
+            res = self.__h5_coords(self.__lazy['dset'],
+                                   self.__lazy['data_sel'])
+        else:
+            res = self.__h5_read(name)
+        self.__dict__[name] = res
+        return res
+
+    def __from_h5_dset(self, h5_dset, data_sel, datapoint, lazy):
         """
         initialize S5Pmsm object from h5py dataset
         """
         self.name = Path(h5_dset.name).name
 
+        if h5_dset.ndim > 3:
+            raise ValueError('not implemented for ndim > 3')
+
+        if lazy:
+            # value, error and coords are read when accessed
+            self.__lazy = {'dset': h5_dset, 'data_sel': data_sel,
+                           'datapoint': datapoint, 'fill_as_nan': False}
+            del self.value, self.coords
+            if datapoint:
+                del self.error
+        else:
+            self.__from_h5_data(h5_dset, data_sel, datapoint)
+
+        # copy FillValue (same for value/error in a datapoint)
+        if datapoint:
+            self.fillvalue = h5_dset.fillvalue[0]
+        else:
+            self.fillvalue = h5_dset.fillvalue
+
+        # copy its units
+        if 'units' in h5_dset.attrs:
+            if isinstance(h5_dset.attrs['units'], np.ndarray):
+                self.units = h5_dset.attrs['units']
+                if isinstance(self.units[0], bytes):
+                    self.units = self.units.astype(str)
+            else:
+                self.units = h5_dset.attrs['units']
+                if isinstance(self.units, bytes):
+                    self.units = self.units.decode('ascii')
+
+        # copy its long_name
+        if 'long_name' in h5_dset.attrs:
+            if isinstance(h5_dset.attrs['long_name'], bytes):
+                self.long_name = h5_dset.attrs['long_name'].decode('ascii')
+            else:
+                self.long_name = h5_dset.attrs['long_name']
+
+    def __from_h5_data(self, h5_dset, data_sel, datapoint):
+        """
+        read values (and errors) and coordinates from h5py dataset
+        """
         # copy dataset values (and error) to object
         if data_sel is None:
             if datapoint:
@@ -115,20 +318,27 @@ class S5Pmsm():
             else:
                 self.value = h5_dset[...]
         else:
-            # we need to keep all dimensions to get the dimensions
-            # of the output data right
             if datapoint:
                 self.value = h5_dset['value'][data_sel]
                 self.error = h5_dset['error'][data_sel]
-                for ii, elmt in enumerate(data_sel):
-                    if isinstance(elmt, int):
-                        self.value = np.expand_dims(self.value, axis=ii)
-                        self.error = np.expand_dims(self.error, axis=ii)
             else:
                 self.value = h5_dset[data_sel]
-                for ii, elmnt in enumerate(data_sel):
-                    if isinstance(elmnt, int):
-                        self.value = np.expand_dims(self.value, axis=ii)
+
+        self.coords = self.__h5_coords(h5_dset, data_sel)
+
+        # remove all dimensions with size equal 1 from value (and error)
+        self.value = np.squeeze(self.value)
+        if datapoint:
+            self.error = np.squeeze(self.error)
+
+    @staticmethod
+    def __h5_coords(h5_dset, data_sel):
+        """
+        Returns coordinates of the data selected from a h5py dataset
+        """
+        # we need to keep all dimensions to get the dimensions
+        # of the output data right
+        shape = selection_shape(h5_dset.shape, data_sel)
 
         # set default dimension names
         if h5_dset.ndim == 1:
@@ -144,12 +354,12 @@ class S5Pmsm():
         keys = []
         dims = []
         for ii in range(h5_dset.ndim):
-            if self.value.shape[ii] == 1:
+            if shape[ii] == 1:
                 continue
             elif len(h5_dset.dims[ii]) != 1:   # bug in some KMNI HDF5 files
                 keys.append(keys_default[ii])
-                dims.append(np.arange(self.value.shape[ii]))
-            elif self.value.shape[ii] == h5_dset.shape[ii]:
+                dims.append(np.arange(shape[ii]))
+            elif shape[ii] == h5_dset.shape[ii]:
                 buff = Path(h5_dset.dims[ii][0].name).name
                 if len(buff.split()) > 1:
                     buff = buff.split()[0]
@@ -178,36 +388,73 @@ class S5Pmsm():
 
         # add dimensions as a namedtuple
         coords_namedtuple = namedtuple('Coords', keys)
-        self.coords = coords_namedtuple._make(dims)
+        return coords_namedtuple._make(dims)
 
-        # remove all dimensions with size equal 1 from value (and error)
-        self.value = np.squeeze(self.value)
-        if datapoint:
-            self.error = np.squeeze(self.error)
-
-        # copy FillValue (same for value/error in a datapoint)
-        if datapoint:
-            self.fillvalue = h5_dset.fillvalue[0]
+    def __h5_read(self, key, data_sel=None):
+        """
+        Read 'value' or 'error' of a lazy S5Pmsm object, optionally only
+        the subset 'data_sel' of the (squeezed) data is read
+        """
+        h5_dset = self.__lazy['dset']
+        if key == 'error' and not self.__lazy['datapoint']:
+            return None
+
+        sel = select_subset(h5_dset.shape, self.__lazy['data_sel'], data_sel)
+        if sel is None:
+            # selection is not a hyperslab, use a selection in memory
+            sel = self.__lazy['data_sel']
+            if sel is None:
+                sel = ()
+            elif not isinstance(sel, tuple):
+                sel = (sel,)
+            if data_sel is not None:
+                return self.__h5_read(key)[data_sel]
+
+        if self.__lazy['datapoint']:
+            res = h5_dset[sel + (key,)]
         else:
-            self.fillvalue = h5_dset.fillvalue
+            res = h5_dset[sel]
 
-        # copy its units
-        if 'units' in h5_dset.attrs:
-            if isinstance(h5_dset.attrs['units'], np.ndarray):
-                self.units = h5_dset.attrs['units']
-                if isinstance(self.units[0], bytes):
-                    self.units = self.units.astype(str)
-            else:
-                self.units = h5_dset.attrs['units']
-                if isinstance(self.units, bytes):
-                    self.units = self.units.decode('ascii')
+        # reshape to the dimensions of the (squeezed) data
+        shape = selection_shape(h5_dset.shape, self.__lazy['data_sel'])
+        dims = tuple(x for x in shape if x != 1)
+        if data_sel is not None:
+            dims = np.empty(dims, dtype=bool)[data_sel].shape
+        res = np.asarray(res).reshape(dims)
 
-        # copy its long_name
-        if 'long_name' in h5_dset.attrs:
-            if isinstance(h5_dset.attrs['long_name'], bytes):
-                self.long_name = h5_dset.attrs['long_name'].decode('ascii')
+        if self.__lazy['fill_as_nan']:
+            res[(res == self.fillvalue)] = np.nan
+
+        return res
+
+    def __select(self, data_sel):
+        """
+        Returns value and error of the selection 'data_sel' of the data.
+        For a lazy S5Pmsm object only this selection is read
+        """
+        res = ()
+        for key in ('value', 'error'):
+            if key not in self.__dict__:
+                res += (self.__h5_read(key, data_sel),)
+            elif data_sel is None or self.__dict__[key] is None:
+                res += (self.__dict__[key],)
             else:
-                self.long_name = h5_dset.attrs['long_name']
+                res += (self.__dict__[key][data_sel],)
+
+        return res
+
+    def load(self):
+        """
+        Read all data of a lazy S5Pmsm object
+        """
+        if self.__lazy is None:
+            return self
+
+        for key in ('value', 'error', 'coords'):
+            getattr(self, key)
+        self.__lazy = None
+
+        return self
 
     def __from_ndarray(self, data, data_sel):
         """
@@ -245,7 +492,7 @@ class S5Pmsm():
         """
         import copy
 
-        return copy.deepcopy(self)
+        return copy.deepcopy(self.load())
 
     def set_coverage(self, coverage, force=False):
         """
@@ -267,7 +514,14 @@ class S5Pmsm():
         """
         Set fillvalue to KNMI undefined
         """
-        if self.value.dtype in (np.float, np.float32):
+        if 'value' in self.__dict__:
+            dtype = self.value.dtype
+        elif self.__lazy['datapoint']:
+            dtype = self.__lazy['dset'].dtype['value']
+        else:
+            dtype = self.__lazy['dset'].dtype
+
+        if dtype in (np.float64, np.float32):
             if self.fillvalue is None or self.fillvalue == 0.:
                 self.fillvalue = float.fromhex('0x1.ep+122')
 
@@ -285,8 +539,12 @@ class S5Pmsm():
         Works only on datasets with HDF5 datatype 'float' or 'datapoints'
         """
         if self.fillvalue == float.fromhex('0x1.ep+122'):
-            self.value[(self.value == self.fillvalue)] = np.nan
-            if self.error is not None:
+            if self.__lazy is not None:
+                # applied to the data when read
+                self.__lazy['fill_as_nan'] = True
+            if 'value' in self.__dict__:
+                self.value[(self.value == self.fillvalue)] = np.nan
+            if 'error' in self.__dict__ and self.error is not None:
                 self.error[(self.error == self.fillvalue)] = np.nan
 
     def sort(self, axis=0):
@@ -409,7 +667,166 @@ class S5Pmsm():
         self.coords = self.coords._replace(**{key: dims})
         return self
 
-    def nanpercentile(self, vperc, data_sel=None, axis=0, keepdims=False):
+    @classmethod
+    def join(cls, sources, axis=0, data_sel=None, datapoint=False):
+        """
+        Concatenate measurement datasets along an existing axis
+
+        The output arrays are allocated once and the data of h5py datasets
+        (or lazy S5Pmsm objects) are read directly into their block
+
+        Parameters
+        ----------
+        sources   :  list of h5py.Dataset or pys5p.S5Pmsm
+           datasets to concatenate, all with the same name
+        axis      :  int, optional
+           The axis for which the arrays will be joined. Default is 0.
+        data_sel  :  numpy slice, optional
+           selection of the data, used for h5py datasets only
+        datapoint :  boolean
+           to indicate that the h5py datasets are a compound of type datapoint
+
+        Returns
+        -------
+        New S5Pmsm object, identical to the result of S5Pmsm.concatenate
+        applied to the sources in sequence.
+
+        Note:
+         - The arrays must have the same shape, except in the dimension
+        corresponding to axis. When axis is the last dimension, arrays with
+        less rows are padded with NaN's
+        """
+        from h5py import Dataset
+
+        if not sources:
+            raise ValueError('no datasets to concatenate')
+
+        msm_list = []
+        for source in sources:
+            if isinstance(source, Dataset):
+                source = cls(source, data_sel=data_sel,
+                             datapoint=datapoint, lazy=True)
+            msm_list.append(source)
+
+        res = msm_list[0]
+        keys = ('value',) if res.__shape('error') is None \
+            else ('value', 'error')
+        for msm in msm_list[1:]:
+            if res.name != Path(msm.name).name:
+                raise TypeError('combining dataset with different name')
+            if (msm.__shape('error') is None) != (len(keys) == 1):
+                raise RuntimeError(
+                    "S5Pmsm: combining non-datapoint and datapoint")
+
+        # determine the shape of the output arrays
+        shapes = [msm.__shape('value') for msm in msm_list]
+        ndim = len(shapes[0])
+        if not 0 <= axis < ndim or ndim > 3:
+            raise ValueError("S5Pmsm: implemented for ndim <= 3")
+        if any(len(shape) != ndim for shape in shapes):
+            raise TypeError('all datasets should have the same dimensions')
+        if any(shape[:-2] != shapes[0][:-2] for shape in shapes):
+            raise TypeError('all but the last 2 dimensions should be equal')
+
+        # only the rows are padded, when joining along the last dimension
+        pad_dim = ndim - 2 if ndim >= 2 and axis == ndim - 1 else None
+        shape = list(shapes[0])
+        shape[axis] = sum(x[axis] for x in shapes)
+        for ii in range(ndim):
+            if ii == pad_dim:
+                shape[ii] = max(x[ii] for x in shapes)
+            elif ii != axis and any(x[ii] != shape[ii] for x in shapes):
+                raise ValueError('all the input array dimensions except for'
+                                 ' the concatenation axis must match')
+
+        # allocate output arrays and copy the data into its blocks
+        buffers = {}
+        for key in keys:
+            dtype = np.result_type(*[msm.__dtype(key) for msm in msm_list])
+            if pad_dim is not None \
+               and any(x[pad_dim] != shape[pad_dim] for x in shapes):
+                buffers[key] = np.full(shape, np.nan, dtype=dtype)
+            else:
+                buffers[key] = np.empty(shape, dtype=dtype)
+
+        offset = 0
+        for msm, msm_shape in zip(msm_list, shapes):
+            dest_start = [0] * ndim
+            dest_start[axis] = offset
+            block = tuple(slice(ii, ii + jj)
+                          for ii, jj in zip(dest_start, msm_shape))
+            for key in keys:
+                msm.__read_into(key, buffers[key], dest_start, block)
+            offset += msm_shape[axis]
+
+        # extent coordinate of the concatenation axis
+        coords = res.coords
+        dims = coords[axis]
+        for msm in msm_list[1:]:
+            if msm.coords[axis][0] == 0:
+                dims = np.concatenate((dims, len(dims) + msm.coords[axis]))
+            else:
+                dims = np.concatenate((dims, msm.coords[axis]))
+
+        msm = cls(buffers['value'])
+        msm.name = res.name
+        msm.error = buffers.get('error')
+        msm.coords = coords._replace(**{coords._fields[axis]: dims})
+        msm.coverage = res.coverage
+        msm.units = res.units
+        msm.long_name = res.long_name
+        msm.fillvalue = res.fillvalue
+        return msm
+
+    def __dtype(self, key):
+        """
+        Returns data type of value or error, without reading the data
+        """
+        if key in self.__dict__:
+            return self.__dict__[key].dtype
+
+        h5_dset = self.__lazy['dset']
+        return h5_dset.dtype[key] if self.__lazy['datapoint'] \
+            else h5_dset.dtype
+
+    def __shape(self, key):
+        """
+        Returns shape of value or error, without reading the data.
+        Returns None when there is no error
+        """
+        if key in self.__dict__:
+            return None if self.__dict__[key] is None \
+                else self.__dict__[key].shape
+        if key == 'error' and not self.__lazy['datapoint']:
+            return None
+
+        shape = selection_shape(self.__lazy['dset'].shape,
+                                self.__lazy['data_sel'])
+        return tuple(x for x in shape if x != 1)
+
+    def __read_into(self, key, dest, dest_start, block):
+        """
+        Write value or error to the selection 'block' of array 'dest',
+        the data of a lazy S5Pmsm object is read directly into 'dest'
+        """
+        if key in self.__dict__:
+            dest[block] = self.__dict__[key]
+            return
+
+        h5_dset = self.__lazy['dset']
+        sel = select_subset(h5_dset.shape, self.__lazy['data_sel'], None)
+        if sel is None or not dest.flags.c_contiguous:
+            dest[block] = getattr(self, key)
+            return
+
+        read_hyperslab(h5_dset, sel, dest, dest_start,
+                       field=key if self.__lazy['datapoint'] else None)
+        if self.__lazy['fill_as_nan']:
+            buff = dest[block]
+            buff[(buff == self.fillvalue)] = np.nan
+
+    def nanpercentile(self, vperc, data_sel=None, axis=0, keepdims=False,
+                      pool=None):
         """
         Returns percentile(s) of the data in the S5Pmsm
 
@@ -427,6 +844,9 @@ class S5Pmsm():
            If this is set to True, the axes which are reduced are left in the
            result as dimensions with size one. With this option, the result
            will broadcast correctly against the original arr.
+        pool      : pys5p.S5Ppool, optional
+           pool of worker processes used to calculate the percentiles, only
+           used when the percentiles are computed along one axis
 
         Returns
         -------
@@ -460,16 +880,16 @@ class S5Pmsm():
         if len(vperc) != 1 and len(vperc) != 3:
             raise TypeError('dimension vperc must be 1 or 3')
 
-        if data_sel is None:
-            if self.value.size <= 1 or self.value.ndim <= max(axis):
-                return self
-            perc = np.nanpercentile(self.value, vperc,
-                                    axis=axis, keepdims=keepdims)
+        data = self.__select(data_sel)[0]
+        if data.size <= 1 or data.ndim <= max(axis):
+            return self
+
+        if pool is not None and len(axis) == 1:
+            perc = pool.nanpercentile(data, vperc, axis=axis[0])
+            if keepdims:
+                perc = np.expand_dims(perc, axis=axis[0] + 1)
         else:
-            if self.value[data_sel].size <= 1 \
-               or self.value[data_sel].ndim <= max(axis):
-                return self
-            perc = np.nanpercentile(self.value[data_sel], vperc,
+            perc = np.nanpercentile(data, vperc,
                                     axis=axis, keepdims=keepdims)
         if len(vperc) == 3:
             self.value = perc[1, ...]
@@ -497,7 +917,7 @@ class S5Pmsm():
 
         return self
 
-    def biweight(self, data_sel=None, axis=0, keepdims=False):
+    def biweight(self, data_sel=None, axis=0, keepdims=False, pool=None):
         """
         Returns biweight median of the data in the S5Pmsm
 
@@ -512,6 +932,8 @@ class S5Pmsm():
            If this is set to True, the axes which are reduced are left in the
            result as dimensions with size one. With this option, the result
            will broadcast correctly against the original arr.
+        pool      : pys5p.S5Ppool, optional
+           pool of worker processes used to calculate the biweight medians
 
         Returns
         -------
@@ -520,20 +942,16 @@ class S5Pmsm():
         """
         from .biweight import biweight
 
-        if data_sel is None:
-            if self.error is not None:
-                self.value = biweight(self.value, axis=axis)
-                self.error = biweight(self.error, axis=axis)
-            else:
-                (self.value, self.error) = biweight(self.value,
-                                                    axis=axis, spread=True)
+        if pool is not None:
+            biweight = pool.biweight
+
+        (value, error) = self.__select(data_sel)
+        if error is not None:
+            self.value = biweight(value, axis=axis)
+            self.error = biweight(error, axis=axis)
         else:
-            if self.error is not None:
-                self.value = biweight(self.value[data_sel], axis=axis)
-                self.error = biweight(self.error[data_sel], axis=axis)
-            else:
-                (self.value, self.error) = biweight(self.value[data_sel],
-                                                    axis=axis, spread=True)
+            (self.value, self.error) = biweight(value, axis=axis,
+                                                spread=True)
         if keepdims:
             self.value = np.expand_dims(self.value, axis=axis)
             self.error = np.expand_dims(self.error, axis=axis)
@@ -558,7 +976,7 @@ class S5Pmsm():
 
         return self
 
-    def nanmedian(self, data_sel=None, axis=0, keepdims=False):
+    def nanmedian(self, data_sel=None, axis=0, keepdims=False, pool=None):
         """
         Returns S5Pmsm object containing median & standard deviation of the
         original data
@@ -574,6 +992,9 @@ class S5Pmsm():
            If this is set to True, the axes which are reduced are left in the
            result as dimensions with size one. With this option, the result
            will broadcast correctly against the original arr.
+        pool      : pys5p.S5Ppool, optional
+           pool of worker processes used to calculate the medians, only
+           used when the medians are computed along one axis
 
         Returns
         -------
@@ -581,23 +1002,25 @@ class S5Pmsm():
         and standard deviation along one axis.
         The coordinates are adjusted, accordingly.
         """
-        if data_sel is None:
-            if self.error is not None:
-                self.error = np.nanmedian(self.error,
-                                          axis=axis, keepdims=keepdims)
+        (value, error) = self.__select(data_sel)
+
+        # the pool computes the medians along one axis
+        if pool is None or not isinstance(axis, (int, np.integer)):
+            if error is not None:
+                self.error = np.nanmedian(error, axis=axis, keepdims=keepdims)
             else:
-                self.error = np.nanstd(self.value, ddof=1,
+                self.error = np.nanstd(value, ddof=1,
                                        axis=axis, keepdims=keepdims)
-            self.value = np.nanmedian(self.value, axis=axis, keepdims=keepdims)
+            self.value = np.nanmedian(value, axis=axis, keepdims=keepdims)
         else:
-            if self.error is not None:
-                self.error = np.nanmedian(self.error[data_sel],
-                                          axis=axis, keepdims=keepdims)
+            if error is not None:
+                self.error = pool.nanmedian(error, axis=axis)
             else:
-                self.error = np.nanstd(self.value[data_sel], ddof=1,
-                                       axis=axis, keepdims=keepdims)
-            self.value = np.nanmedian(self.value[data_sel],
-                                      axis=axis, keepdims=keepdims)
+                self.error = pool.nanstd(value, ddof=1, axis=axis)
+            self.value = pool.nanmedian(value, axis=axis)
+            if keepdims:
+                self.value = np.expand_dims(self.value, axis=axis)
+                self.error = np.expand_dims(self.error, axis=axis)
 
         # adjust the coordinates
         if keepdims:
@@ -642,23 +1065,13 @@ class S5Pmsm():
         standard deviation along one axis.
         The coordinates are adjusted, accordingly.
         """
-        if data_sel is None:
-            if self.error is not None:
-                self.error = np.nanmean(self.error,
-                                        axis=axis, keepdims=keepdims)
-            else:
-                self.error = np.nanstd(self.value, ddof=1,
-                                       axis=axis, keepdims=keepdims)
-            self.value = np.nanmean(self.value, axis=axis, keepdims=keepdims)
+        (value, error) = self.__select(data_sel)
+        if error is not None:
+            self.error = np.nanmean(error, axis=axis, keepdims=keepdims)
         else:
-            if self.error is not None:
-                self.error = np.nanmean(self.error[data_sel],
-                                        axis=axis, keepdims=keepdims)
-            else:
-                self.error = np.nanstd(self.value[data_sel], ddof=1,
-                                       axis=axis, keepdims=keepdims)
-            self.value = np.nanmean(self.value[data_sel],
-                                    axis=axis, keepdims=keepdims)
+            self.error = np.nanstd(value, ddof=1,
+                                   axis=axis, keepdims=keepdims)
+        self.value = np.nanmean(value, axis=axis, keepdims=keepdims)
 
         # adjust the coordinates
         if keepdims:
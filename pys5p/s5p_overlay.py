@@ -0,0 +1,352 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Write patched products as an overlay: a small HDF5 file which holds only
+the modified datasets, all other objects are external links to the
+original product. Use materialize to generate the complete product:
+
+  overlay = create_overlay(l1b_product, 'patched.overlay.nc')
+  with h5py.File(overlay, 'r+') as fid:
+      dset = overlay_require(fid, '/BAND7_RADIANCE/STANDARD_MODE/'
+                                  'OBSERVATIONS/radiance')
+      dset[...] = radiance
+  materialize(overlay, 'patched.nc')
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import os
+import shutil
+
+from pathlib import Path, PurePosixPath
+
+import h5py
+import numpy as np
+
+# - global parameters ------------------------------
+# ioctl to clone a file on file systems with copy-on-write (btrfs, xfs)
+_FICLONE = 0x40049409
+
+# root attribute of an overlay with the name of the original product
+_OVERLAY_ATTR = 'overlay_of'
+
+# attributes which refer to objects in the original product
+_REFERENCE_ATTRS = ('DIMENSION_LIST', 'REFERENCE_LIST')
+
+
+# - local functions --------------------------------
+def copy_product(src, dst):
+    """
+    Copy a product, using a copy-on-write clone (reflink) or an in-kernel
+    copy when supported by the file system
+
+    Parameters
+    ----------
+    src  :  str or Path
+       name of the product
+    dst  :  str or Path
+       name of the copy
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            import fcntl
+
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except (ImportError, OSError):
+            pass
+        else:
+            shutil.copymode(src, dst)
+            return
+
+        size = os.fstat(fsrc.fileno()).st_size
+        try:
+            offs = 0
+            while offs < size:
+                nbytes = os.copy_file_range(fsrc.fileno(), fdst.fileno(),
+                                            size - offs)
+                if nbytes == 0:
+                    break
+                offs += nbytes
+        except (AttributeError, OSError):
+            offs = 0
+
+        if offs < size:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, 16 * 2**20)
+
+    shutil.copymode(src, dst)
+
+
+def create_overlay(flname, overlay):
+    """
+    Create an overlay of a product: an HDF5 file with external links to
+    all objects in the root group of the product
+
+    Parameters
+    ----------
+    flname   :  str or Path
+       name of the original product
+    overlay  :  str or Path
+       name of the overlay
+
+    Returns
+    -------
+    Path to the overlay
+    """
+    flname = Path(flname).resolve()
+    with h5py.File(flname, 'r') as src, h5py.File(overlay, 'w') as fid:
+        fid.attrs[_OVERLAY_ATTR] = str(flname)
+        for key, value in src.attrs.items():
+            fid.attrs[key] = value
+        for key in src:
+            fid[key] = h5py.ExternalLink(str(flname), '/' + key)
+
+    return Path(overlay)
+
+
+def _copy_attrs(src, dst):
+    """
+    Copy attributes, except references to objects in the original product
+    """
+    for key, value in src.attrs.items():
+        if key not in _REFERENCE_ATTRS:
+            dst.attrs[key] = value
+
+
+def _members(grp):
+    """
+    Returns relative names of all objects in a group
+    """
+    res = []
+    grp.visit(res.append)
+    return res
+
+
+def overlay_require(fid, name, group=False, copy_data=True):
+    """
+    Make an object of the original product a real object of the overlay,
+    thus it can be modified without changing the original product
+
+    The parent groups of the object are created in the overlay with
+    external links to their members. A dataset is copied with its data,
+    a group is copied with all its members. A group which does not exist
+    in the original product is created.
+
+    Parameters
+    ----------
+    fid    :  h5py.File
+       overlay opened with read/write access
+    name   :  string
+       full name of the dataset or group
+    group  :  boolean
+       create a group when the object does not exist in the original product
+    copy_data :  boolean
+       copy the data of a dataset, use False when all data is overwritten
+
+    Returns
+    -------
+    h5py.Dataset or h5py.Group
+    """
+    orig_name = fid.attrs[_OVERLAY_ATTR]
+    parts = PurePosixPath(name).relative_to('/').parts \
+        if name.startswith('/') else PurePosixPath(name).parts
+
+    with h5py.File(orig_name, 'r') as src:
+        grp = fid
+        for ii, key in enumerate(parts):
+            link = grp.get(key, getlink=True)
+            is_last = ii == len(parts) - 1
+            if link is not None and not isinstance(link, h5py.ExternalLink):
+                grp = grp[key]
+                continue
+
+            path = '/' + '/'.join(parts[:ii + 1])
+            if path not in src and not group:
+                raise KeyError('{} not in {}'.format(path, orig_name))
+            if link is not None:
+                del grp[key]
+            if path not in src:
+                grp = grp.create_group(key)
+                continue
+
+            obj = src[path]
+            if is_last and not copy_data and isinstance(obj, h5py.Dataset):
+                grp = grp.create_dataset_like(key, obj)
+                _copy_attrs(obj, grp)
+            elif is_last:
+                src.copy(obj, grp, name=key, without_attrs=True)
+                grp = grp[key]
+                _copy_attrs(obj, grp)
+                if isinstance(grp, h5py.Group):
+                    for member in _members(obj):
+                        _copy_attrs(obj[member], grp[member])
+            else:
+                grp = grp.create_group(key)
+                _copy_attrs(obj, grp)
+                for member in obj:
+                    grp[member] = h5py.ExternalLink(
+                        orig_name, '{}/{}'.format(path, member))
+
+    return grp
+
+
+def overlay_objects(fid):
+    """
+    Returns names of the datasets and groups which are real objects in an
+    overlay, thus modified with respect to the original product
+    """
+    def has_links(grp):
+        for key in grp:
+            link = grp.get(key, getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                return True
+            if isinstance(grp[key], h5py.Group) and has_links(grp[key]):
+                return True
+        return False
+
+    def walk(grp):
+        for key in grp:
+            if isinstance(grp.get(key, getlink=True), h5py.ExternalLink):
+                continue
+            obj = grp[key]
+            # a group without external links is completely modified
+            if isinstance(obj, h5py.Group) and has_links(obj):
+                walk(obj)
+            else:
+                res.append(obj.name)
+
+    res = []
+    walk(fid)
+    return res
+
+
+def _sync_attrs(src, dst, skip=_REFERENCE_ATTRS):
+    """
+    Copy new and modified attributes and remove deleted attributes, the
+    references to dimension scales of the product are kept
+    """
+    for key in [x for x in dst.attrs if x not in src.attrs]:
+        if key not in skip:
+            del dst.attrs[key]
+    for key, value in src.attrs.items():
+        if key in skip:
+            continue
+        if key in dst.attrs and np.array_equal(dst.attrs[key], value):
+            continue
+        dst.attrs[key] = value
+
+
+def _replace_dataset(obj, grp, key):
+    """
+    Replace a dataset by a copy of an overlay dataset, the dimension
+    scales of the original dataset are re-attached
+    """
+    dset = grp[key]
+    scales = []
+    for ii, dim in enumerate(dset.dims):
+        for scale in dim.values():
+            scales.append((ii, scale.name))
+            dim.detach_scale(scale)
+    attached = []
+    if h5py.h5ds.is_scale(dset.id) and 'REFERENCE_LIST' in dset.attrs:
+        for ref, ii in dset.attrs['REFERENCE_LIST'].tolist():
+            name = grp.file[ref].name
+            attached.append((name, ii))
+            grp.file[name].dims[ii].detach_scale(dset)
+
+    del grp[key]
+    obj.file.copy(obj, grp, name=key)
+    dset = grp[key]
+    for ii, name in scales:
+        dset.dims[ii].attach_scale(grp.file[name])
+    if attached and not h5py.h5ds.is_scale(dset.id):
+        dset.make_scale(key)
+    for name, ii in attached:
+        grp.file[name].dims[ii].attach_scale(dset)
+
+
+def _write_dataset(obj, grp, key):
+    """
+    Write values and attributes of an overlay dataset into the dataset of
+    the product
+    """
+    dset = grp[key]
+    if dset.dtype != obj.dtype or dset.ndim != obj.ndim \
+       or (dset.shape != obj.shape
+           and (dset.chunks is None
+                or any(mx is not None and mx < size
+                       for mx, size in zip(dset.maxshape, obj.shape)))):
+        _replace_dataset(obj, grp, key)
+        return
+
+    _sync_attrs(obj, dset)
+    if dset.shape != obj.shape:
+        dset.resize(obj.shape)
+    if obj.chunks is None:
+        dset[...] = obj[...]
+    else:
+        for sel in obj.iter_chunks():
+            dset[sel] = obj[sel]
+
+
+def _merge_group(src, dst):
+    """
+    Write the real objects of an overlay group into the group of the
+    product, external links refer to unchanged objects
+    """
+    for key in [x for x in dst if x not in src]:
+        del dst[key]
+    for key in src:
+        if isinstance(src.get(key, getlink=True), h5py.ExternalLink):
+            continue
+        obj = src[key]
+        if key not in dst:
+            src.copy(obj, dst, name=key)
+        elif isinstance(obj, h5py.Group) \
+                and isinstance(dst[key], h5py.Group):
+            _sync_attrs(obj, dst[key])
+            _merge_group(obj, dst[key])
+        elif isinstance(obj, h5py.Dataset) \
+                and isinstance(dst[key], h5py.Dataset):
+            _write_dataset(obj, dst, key)
+        else:
+            del dst[key]
+            src.copy(obj, dst, name=key)
+
+
+def materialize(overlay, flname):
+    """
+    Write the complete product of an overlay: a copy of the original
+    product with the modified datasets, groups and attributes of the overlay
+
+    The modified objects are written into the objects of the copy, thus
+    dimension scales remain attached.
+
+    Parameters
+    ----------
+    overlay  :  str or Path
+       name of the overlay
+    flname   :  str or Path
+       name of the product to be written
+
+    Returns
+    -------
+    Path to the product
+    """
+    with h5py.File(overlay, 'r') as fid:
+        orig_name = fid.attrs[_OVERLAY_ATTR]
+        if Path(orig_name).resolve() == Path(flname).resolve():
+            raise ValueError('materialize would overwrite the original')
+
+        copy_product(orig_name, flname)
+        with h5py.File(flname, 'r+') as dst:
+            _sync_attrs(fid, dst, skip=_REFERENCE_ATTRS + (_OVERLAY_ATTR,))
+            _merge_group(fid, dst)
+
+    return Path(flname)
@@ -0,0 +1,378 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+The class S5Ppool provides a persistent pool of worker processes to perform
+per-pixel reductions (biweight, nanmedian, nanpercentile, nanstd) on large
+frame stacks. The data is shared with the workers using
+multiprocessing.shared_memory, thus only a reference to the data is send to
+the workers, instead of a (pickled) copy.
+
+Usage:
+
+  with S5Ppool(cpu_count=8) as pool:
+      cube = pool.empty(dset.shape, dtype=dset.dtype)
+      dset.read_direct(cube)
+      median = pool.nanmedian(cube, axis=0)
+
+or use the pool shared by all modules in this process:
+
+  median = shared_pool().biweight(data, axis=0)
+
+Note requires Python 3.8 or later
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+# - global parameters ------------------------------
+_SHARED_POOL = None
+
+
+# - local functions --------------------------------
+def _byte_bounds(arr):
+    """
+    Returns pointers to the end-points of an array
+    """
+    low = high = arr.__array_interface__['data'][0]
+    for dim, stride in zip(arr.shape, arr.strides):
+        if stride < 0:
+            low += (dim - 1) * stride
+        else:
+            high += (dim - 1) * stride
+
+    return (low, high + arr.itemsize)
+
+
+def attach_array(layout):
+    """
+    Attach to shared memory and return it, and the array described by layout
+    """
+    from multiprocessing import shared_memory
+
+    (name, offset, shape, strides, dtype) = layout
+    shm = shared_memory.SharedMemory(name=name)
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                     offset=offset, strides=strides)
+    return (shm, arr)
+
+
+def share_array(data):
+    """
+    Copy an array to a new block of shared memory, returns the block and the
+    layout of the copy to be used by attach_array
+
+    Note the caller should close and unlink the block
+    """
+    from multiprocessing import shared_memory
+
+    data = np.ascontiguousarray(data)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+    arr = np.ndarray(data.shape, dtype=data.dtype, buffer=shm.buf)
+    arr[...] = data
+    return (shm, (shm.name, 0, arr.shape, arr.strides, arr.dtype.str))
+
+
+def _reduce_block(args):
+    """
+    Reduce one block of the data, called by the worker processes
+
+    The block is selected with 'block_sel' from the data in shared memory,
+    the result is written to the output arrays in shared memory.
+    """
+    from .biweight import biweight
+
+    (method, kwargs, layout, block_sel, out_layouts, out_sel) = args
+
+    block = None
+    (shm, data) = attach_array(layout)
+    out_shm = []
+    outs = []
+    for out_layout in out_layouts:
+        (buff_shm, buff) = attach_array(out_layout)
+        out_shm.append(buff_shm)
+        outs.append(buff)
+    try:
+        block = data[block_sel]
+        if method == 'biweight':
+            res = biweight(block, **kwargs)
+        elif method == 'nanmedian':
+            res = np.nanmedian(block, **kwargs)
+        elif method == 'nanpercentile':
+            res = np.nanpercentile(block, **kwargs)
+        elif method == 'nanstd':
+            res = np.nanstd(block, **kwargs)
+        else:
+            raise ValueError('unknown method {}'.format(method))
+
+        if not isinstance(res, tuple):
+            res = (res,)
+        for ii, buff in enumerate(res):
+            outs[ii][out_sel] = buff
+    finally:
+        # all references to the shared buffers have to be released
+        block = buff = data = None
+        outs.clear()
+        shm.close()
+        for buff_shm in out_shm:
+            buff_shm.close()
+
+
+# - class definition -------------------------------
+class S5Ppool():
+    """
+    Persistent pool of worker processes for per-pixel reductions
+    """
+    def __init__(self, cpu_count=None):
+        """
+        Start the worker processes
+
+        Parameters
+        ----------
+        cpu_count  :  int, optional
+           number of worker processes, default is os.cpu_count()
+        """
+        from multiprocessing import Pool, resource_tracker
+        from os import cpu_count as os_cpu_count
+
+        self.cpu_count = os_cpu_count() if cpu_count is None else cpu_count
+        self.__shm = []
+
+        # the workers should share the resource tracker of this process,
+        # which removes the shared memory blocks left behind at exit
+        resource_tracker.ensure_running()
+        self.__pool = Pool(self.cpu_count)
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}(cpu_count={!r})'.format(class_name, self.cpu_count)
+
+    def __enter__(self):
+        """
+        method called to initiate the context manager
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        method called when exiting the context manager
+        """
+        self.close()
+        return False  # any exception is raised by the with statement.
+
+    def close(self):
+        """
+        Stop the worker processes and release all shared memory
+
+        Note arrays obtained by 'empty' or 'share' should not be used after
+        the pool is closed
+        """
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+
+        while self.__shm:
+            self.__release(self.__shm.pop())
+
+    @staticmethod
+    def __release(shm):
+        """
+        Release and remove a shared memory block
+        """
+        try:
+            shm.close()
+        except BufferError:
+            # the block is still referenced by an array of the user
+            pass
+        shm.unlink()
+
+    # -------------------------
+    def empty(self, shape, dtype=np.float64):
+        """
+        Returns a new array in shared memory, without initializing entries
+
+        Use this array as destination of a read, for example using
+        h5py.Dataset.read_direct, to avoid any copy of the data
+        """
+        from multiprocessing import shared_memory
+
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        self.__shm.append(shm)
+
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def share(self, data):
+        """
+        Returns a copy of the array in shared memory.
+        Arrays already in shared memory of this pool are returned as is
+        """
+        if self.__layout(data) is not None:
+            return data
+
+        res = self.empty(data.shape, dtype=data.dtype)
+        res[...] = data
+        return res
+
+    def release(self, data):
+        """
+        Release the shared memory of an array obtained by 'empty' or 'share'
+        """
+        layout = self.__layout(data)
+        if layout is None:
+            return
+
+        for shm in self.__shm:
+            if shm.name == layout[0]:
+                self.__shm.remove(shm)
+                del data
+                self.__release(shm)
+                break
+
+    def __layout(self, data):
+        """
+        Returns description of an array in shared memory of this pool,
+        or None when the array is not in shared memory
+        """
+        (low, high) = _byte_bounds(data)
+        for shm in self.__shm:
+            addr = np.frombuffer(shm.buf, dtype=np.uint8).ctypes.data
+            if addr <= low and high <= addr + shm.size:
+                return (shm.name, data.__array_interface__['data'][0] - addr,
+                        data.shape, data.strides, data.dtype.str)
+
+        return None
+
+    # -------------------------
+    def __reduce(self, method, data, axis, kwargs, out_shapes, dtype=None):
+        """
+        Perform a reduction along 'axis' by splitting the data in blocks
+        along the largest of the other dimensions
+
+        The output has type dtype, default the (floating-point) type of data
+        """
+        if self.__pool is None:
+            raise RuntimeError('pool of worker processes is closed')
+
+        data = np.asarray(data)
+        if not isinstance(axis, int):
+            raise TypeError('axis not an integer')
+        if not 0 <= axis < data.ndim:
+            raise ValueError('axis out-of-range')
+
+        # only copy data to shared memory when not already present
+        temporary = self.__layout(data) is None
+        if temporary:
+            data = self.share(data)
+        layout = self.__layout(data)
+
+        # output arrays in shared memory
+        if dtype is None:
+            if np.issubdtype(data.dtype, np.floating):
+                dtype = data.dtype
+            else:
+                dtype = np.float64
+        red_shape = data.shape[:axis] + data.shape[axis+1:]
+        outs = [self.empty(x + red_shape, dtype=dtype) for x in out_shapes]
+        out_layouts = [self.__layout(x) for x in outs]
+
+        # split data in blocks of the largest dimension (except axis)
+        dims = [ii for ii in range(data.ndim) if ii != axis]
+        tasks = []
+        if dims:
+            split_dim = max(dims, key=lambda ii: data.shape[ii])
+            out_dim = dims.index(split_dim)
+            bounds = np.linspace(0, data.shape[split_dim],
+                                 min(self.cpu_count, data.shape[split_dim]) + 1)
+            bounds = bounds.astype(int)
+            for ii in range(len(bounds) - 1):
+                block_sel = [slice(None)] * data.ndim
+                block_sel[split_dim] = slice(bounds[ii], bounds[ii+1])
+                out_sel = [slice(None)] * (len(out_shapes[0]) + len(dims))
+                out_sel[len(out_shapes[0]) + out_dim] = \
+                    slice(bounds[ii], bounds[ii+1])
+                tasks.append((method, kwargs, layout, tuple(block_sel),
+                              out_layouts, tuple(out_sel)))
+        else:
+            tasks.append((method, kwargs, layout, Ellipsis,
+                          out_layouts, Ellipsis))
+
+        try:
+            self.__pool.map(_reduce_block, tasks, chunksize=1)
+            res = tuple(np.array(x) for x in outs)
+        finally:
+            for out in outs:
+                self.release(out)
+            if temporary:
+                self.release(data)
+
+        if len(res) == 1:
+            return res[0]
+
+        return res
+
+    def biweight(self, data, axis=0, spread=False):
+        """
+        Returns biweight median (and spread) along an axis, as float64
+
+        See pys5p.biweight.biweight
+        """
+        if spread:
+            return self.__reduce('biweight', data, axis,
+                                 {'axis': axis, 'spread': True}, [(), ()],
+                                 dtype=np.float64)
+
+        return self.__reduce('biweight', data, axis, {'axis': axis}, [()],
+                             dtype=np.float64)
+
+    def nanmedian(self, data, axis=0):
+        """
+        Returns median along an axis, while ignoring NaNs
+
+        See numpy.nanmedian
+        """
+        return self.__reduce('nanmedian', data, axis, {'axis': axis}, [()])
+
+    def nanpercentile(self, data, vperc, axis=0):
+        """
+        Returns percentile(s) along an axis, while ignoring NaNs
+
+        See numpy.nanpercentile
+        """
+        kwargs = {'q': vperc, 'axis': axis}
+        if np.ndim(vperc) == 0:
+            return self.__reduce('nanpercentile', data, axis, kwargs, [()])
+
+        return self.__reduce('nanpercentile', data, axis, kwargs,
+                             [(len(vperc),)])
+
+    def nanstd(self, data, axis=0, ddof=0):
+        """
+        Returns standard deviation along an axis, while ignoring NaNs
+
+        See numpy.nanstd
+        """
+        return self.__reduce('nanstd', data, axis,
+                             {'axis': axis, 'ddof': ddof}, [()])
+
+
+# --------------------------------------------------
+def shared_pool(cpu_count=None):
+    """
+    Returns a pool of worker processes shared by all callers in this process.
+    The pool is started at the first call and closed at exit of the process
+    """
+    import atexit
+
+    global _SHARED_POOL
+
+    if _SHARED_POOL is None:
+        _SHARED_POOL = S5Ppool(cpu_count)
+        atexit.register(_SHARED_POOL.close)
+
+    return _SHARED_POOL
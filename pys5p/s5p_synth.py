@@ -0,0 +1,913 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Write synthetic Tropomi products, to test and benchmark the readers of
+pys5p without access to real products
+
+The products have the group layout, dimension scales, compound datasets,
+fill values, chunking and compression of the operational products, as far
+as they are used by the readers of pys5p. The data values are random, but
+within the range of real measurements.
+
+Usage:
+
+  python3 -m pys5p.s5p_synth --size medium /data/synthetic
+
+  products = write_products('/tmp/synthetic', size='small')
+  with L1BioRAD(products['l1b_rad']) as l1b:
+      l1b.select()
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+# - global parameters ------------------------------
+FILLVALUE = float.fromhex('0x1.ep+122')
+
+# reference time of the synthetic products: 2019-01-01 (since 2010-01-01)
+REF_TIME = 283996800
+
+# master cycle period of the SWIR measurements [ms]
+MASTER_CYCLE = 1080
+
+# dimensions of the synthetic products for each size:
+#  - nscans, nrows and ncols of the L1b measurement groups
+#  - det_rows and det_cols of the SWIR detector bands (without row 257)
+#  - nframes of the on-ground calibration measurements
+#  - npkts of the engineering product
+SIZES = {
+    'small': {'nscans': 32, 'nrows': 16, 'ncols': 24,
+              'det_rows': 16, 'det_cols': 24, 'nframes': 8, 'npkts': 64},
+    'medium': {'nscans': 400, 'nrows': 215, 'ncols': 480,
+               'det_rows': 256, 'det_cols': 500, 'nframes': 50,
+               'npkts': 1000},
+    'orbit': {'nscans': 3245, 'nrows': 215, 'ncols': 480,
+              'det_rows': 256, 'det_cols': 500, 'nframes': 200,
+              'npkts': 6000}}
+
+# file names of the synthetic products
+PRODUCTS = {
+    'l1b_rad': ('S5P_OFFL_L1B_RA_BD7_20190101T000000_20190101T014000'
+                '_06470_01_010000_20190101T030000.nc'),
+    'l1b_irr': ('S5P_OFFL_L1B_IR_SIR_20190101T000000_20190101T014000'
+                '_06470_01_010000_20190101T030000.nc'),
+    'l1b_cal': ('S5P_OFFL_L1B_CA_SIR_20190101T000000_20190101T014000'
+                '_06470_01_010000_20190101T030000.nc'),
+    'l1b_eng': ('S5P_OFFL_L1B_ENG_DB_20190101T000000_20190101T014000'
+                '_06470_01_010000_20190101T030000.nc'),
+    'icm': ('S5P_OFFL_ICM_CA_SIR_20190101T000000_20190101T014000'
+            '_06470_01_010000_20190101T030000.h5'),
+    'ocm': 'trl1brb8g.lx.nc',
+    'lv2': ('S5P_OFFL_L2__CH4____20190101T000000_20190101T014000'
+            '_06470_01_010000_20190101T030000.nc')}
+
+# data type, fill value and units of the measurement datasets
+MSM_DSETS = {
+    'radiance': ('f4', FILLVALUE, 'mol.m-2.nm-1.sr-1.s-1'),
+    'radiance_error': ('i1', -127, '1'),
+    'radiance_noise': ('i1', -127, '1'),
+    'irradiance': ('f4', FILLVALUE, 'mol.m-2.nm-1.s-1'),
+    'irradiance_error': ('i1', -127, '1'),
+    'irradiance_noise': ('i1', -127, '1'),
+    'signal': ('f4', FILLVALUE, 'electrons'),
+    'signal_error_vals': ('f4', FILLVALUE, 'electrons'),
+    'signal_avg': ('f4', FILLVALUE, 'electrons'),
+    'signal_avg_std': ('f4', FILLVALUE, 'electrons'),
+    'quality_level': ('u1', 255, '1'),
+    'spectral_channel_quality': ('u1', 255, '1')}
+
+# HDF5 compression of the measurement datasets
+COMPRESSION = {'compression': 'gzip', 'compression_opts': 3,
+               'shuffle': True}
+
+HEADER = '/METADATA/earth_exploirer_header/fixed_header'
+
+# conversion of level 2 column densities from mol/m2 to molecules/cm2
+MOL_M2_ATTR = 'multiplication_factor_to_convert_to_molecules_percm2'
+
+
+# - local functions --------------------------------
+def _compression(compression):
+    """
+    Returns the keywords of create_dataset for the compression
+    """
+    return COMPRESSION if compression else {}
+
+
+def _add_scales(grp, dims):
+    """
+    Add dimension scales to a group, returns the scales
+    """
+    res = []
+    for name, size in dims:
+        if name in grp:
+            res.append(grp[name])
+            continue
+        dset = grp.create_dataset(name, data=np.arange(size, dtype='i4'))
+        dset.make_scale(name)
+        res.append(dset)
+
+    return res
+
+
+def _attach_scales(dset, scales):
+    """
+    Attach dimension scales to a dataset
+    """
+    for ii, scale in enumerate(scales):
+        dset.dims[ii].attach_scale(scale)
+
+
+def _random_block(name, shape, rng):
+    """
+    Returns a block of synthetic measurement data
+    """
+    (dtype, fillvalue, _) = MSM_DSETS[name]
+    if name.endswith('_error') or name.endswith('_noise'):
+        return rng.randint(10, 40, shape).astype(dtype)
+    if name == 'quality_level':
+        return rng.randint(0, 101, shape).astype(dtype)
+    if name == 'spectral_channel_quality':
+        data = np.zeros(shape, dtype=dtype)
+        mask = rng.random_sample(shape) < 0.02
+        data[mask] = 1 << rng.randint(0, 8, np.count_nonzero(mask))
+        return data
+
+    # smooth spectrum with noise, and some missing values
+    spectrum = 1 + 0.5 * np.sin(np.linspace(0, 6 * np.pi, shape[-1]))
+    scale = 1e-9 if name.startswith('radiance') else 1e4
+    if name.endswith('_std') or name.endswith('_vals'):
+        scale /= 100
+    data = scale * spectrum * rng.normal(1, 0.02, shape)
+    data = data.astype(dtype)
+    data[rng.random_sample(shape) < 0.001] = fillvalue
+    return data
+
+
+def _write_msm_dset(grp, name, shape, scales, rng, chunks, compression,
+                    block=64):
+    """
+    Write a measurement dataset in blocks along the second dimension
+    """
+    (dtype, fillvalue, units) = MSM_DSETS[name]
+    dset = grp.create_dataset(name, shape, dtype=dtype, chunks=chunks,
+                              fillvalue=np.array(fillvalue, dtype=dtype),
+                              **_compression(compression))
+    dset.attrs['_FillValue'] = np.array(fillvalue, dtype=dtype)
+    dset.attrs['units'] = units
+    dset.attrs['long_name'] = name.replace('_', ' ')
+    _attach_scales(dset, scales)
+
+    for ibgn in range(0, shape[1], block):
+        iend = min(ibgn + block, shape[1])
+        dset[:, ibgn:iend, ...] = _random_block(
+            name, (shape[0], iend - ibgn) + shape[2:], rng)
+
+    return dset
+
+
+def _swath(nscans, npixels, lon_center=0., lat_range=(-85., 85.)):
+    """
+    Returns latitude and longitude of the pixel corners of a swath, with
+    dimensions (nscans + 1, npixels + 1)
+    """
+    lats = np.linspace(lat_range[0], lat_range[1], nscans + 1)
+    offset = np.linspace(-13.5, 13.5, npixels + 1)
+    lons = lon_center + offset[np.newaxis, :] \
+        / np.cos(np.radians(lats[:, np.newaxis]))
+    lons = (lons + 180.) % 360. - 180.
+    lats = np.repeat(lats[:, np.newaxis], npixels + 1, axis=1)
+    lats += 0.1 * offset[np.newaxis, :]
+    return (lats, lons)
+
+
+def _corners(mesh):
+    """
+    Returns the 4 corners of the pixels of a mesh
+    """
+    return np.stack((mesh[:-1, :-1], mesh[:-1, 1:],
+                     mesh[1:, 1:], mesh[1:, :-1]), axis=-1)
+
+
+def _centers(lats, lons):
+    """
+    Returns the centers of the pixels of a mesh
+    """
+    lat = _corners(lats).mean(axis=-1)
+    # average longitudes across the antimeridian
+    lon = np.degrees(np.arctan2(
+        np.sin(np.radians(_corners(lons))).mean(axis=-1),
+        np.cos(np.radians(_corners(lons))).mean(axis=-1)))
+    return (lat, lon)
+
+
+def _write_root(fid, orbit=6470):
+    """
+    Write the global attributes and the ESA header of a product
+    """
+    fid.attrs['orbit'] = np.int32(orbit)
+    fid.attrs['processor_version'] = b'01.00.00'
+    fid.attrs['time_coverage_start'] = b'2019-01-01T00:00:00Z'
+    fid.attrs['time_coverage_end'] = b'2019-01-01T01:40:00Z'
+    grp = fid.require_group('/METADATA/ESA_METADATA/earth_explorer_header')
+    grp = grp.require_group('fixed_header/source')
+    grp.attrs['Creation_Date'] = b'UTC=2019-01-01T03:00:00'
+
+
+def _instrument_settings(icid_list, band):
+    """
+    Returns instrument settings of the measurements
+    """
+    res = np.zeros((icid_list.size,), dtype=[
+        ('ic_id', 'u2'), ('ic_version', 'u1'), ('exposure_time', 'f8'),
+        ('master_cycle_period_us', 'u4'), ('int_delay', 'u4'),
+        ('int_hold', 'u4'), ('nr_coadditions', 'u2')])
+    res['ic_id'] = icid_list
+    res['ic_version'] = 1
+    res['master_cycle_period_us'] = 1000 * MASTER_CYCLE
+    if int(band) > 6:
+        res['int_hold'] = np.where(icid_list % 2 == 0, 13000, 2000)
+        res['exposure_time'] = 1.25e-6 * (65540 - res['int_delay']
+                                          + res['int_hold'])
+    else:
+        res['exposure_time'] = np.where(icid_list % 2 == 0, 1.08, 0.18)
+    res['nr_coadditions'] = 1
+    return res
+
+
+def _housekeeping_data(shape, rng):
+    """
+    Returns housekeeping data of the measurements
+    """
+    names = ('temp_det_ts1', 'temp_det_ts2', 'temp_obm_swir',
+             'temp_obm_swir_grating', 'temp_pelt_swir_cu')
+    res = np.zeros(shape, dtype=[(x, 'f4') for x in names])
+    for name, temp in zip(names, (140., 140., 203., 203., 283.)):
+        res[name] = rng.normal(temp, 0.01, shape)
+    return res
+
+
+def _write_msm_group(grp, msm_dsets, icid_list, nrows, ncols, rng,
+                     band='7', compression=True, geo='earth',
+                     row_name='ground_pixel'):
+    """
+    Write a measurement group of a L1b product, or a calibration group of
+    an ICM product, with the sub-groups INSTRUMENT, OBSERVATIONS and GEODATA
+    """
+    nscans = icid_list.size
+    (scanline, row, column) = _add_scales(
+        grp, (('scanline', nscans), (row_name, nrows),
+              ('spectral_channel', ncols)))
+
+    sgrp = grp.create_group('INSTRUMENT')
+    buff = np.zeros((1, nscans), dtype=[('ic_id', 'u2'), ('ic_version', 'u1')])
+    buff['ic_id'] = icid_list
+    buff['ic_version'] = 1
+    sgrp['instrument_configuration'] = buff
+    sgrp['instrument_settings'] = _instrument_settings(icid_list, band)
+    sgrp['housekeeping_data'] = _housekeeping_data((1, nscans), rng)
+
+    sgrp = grp.create_group('OBSERVATIONS')
+    dset = sgrp.create_dataset('time', data=np.array([REF_TIME], dtype='i4'))
+    dset.make_scale('time')
+    scales = (sgrp['time'], scanline, row, column)
+    dset = sgrp.create_dataset(
+        'delta_time', data=MASTER_CYCLE * np.arange(
+            nscans, dtype='i4').reshape(1, nscans))
+    _attach_scales(dset, scales[:2])
+    for name in msm_dsets:
+        _write_msm_dset(sgrp, name, (1, nscans, nrows, ncols), scales, rng,
+                        (1, 1, nrows, ncols), compression)
+
+    sgrp = grp.create_group('GEODATA')
+    (lats, lons) = _swath(nscans, nrows)
+    (lat, lon) = _centers(lats, lons)
+    if geo == 'earth':
+        for name, data in (('latitude', lat), ('longitude', lon)):
+            dset = sgrp.create_dataset(name, data=data[np.newaxis, ...],
+                                       dtype='f4')
+            _attach_scales(dset, scales[:3])
+        dset = sgrp.create_dataset(
+            'solar_zenith_angle', dtype='f4',
+            data=np.abs(lat[np.newaxis, ...]) * 0.9 + 5)
+        _attach_scales(dset, scales[:3])
+    for name, data in (('satellite_latitude', lat[:, nrows // 2]),
+                       ('satellite_longitude', lon[:, nrows // 2]),
+                       ('satellite_altitude', np.full(nscans, 824000.))):
+        dset = sgrp.create_dataset(name, data=data[np.newaxis, :],
+                                   dtype='f4')
+        _attach_scales(dset, scales[:2])
+
+
+def _default_icids(nscans):
+    """
+    Returns a typical ICID sequence of a radiance product
+    """
+    return np.repeat([4, 6, 4], [nscans // 4, nscans // 4,
+                                 nscans - 2 * (nscans // 4)])
+
+
+def _datapoint(shape, rng, value=1., spread=0.01):
+    """
+    Returns a CKD as compound of value and error
+    """
+    res = np.empty(shape, dtype=[('value', 'f4'), ('error', 'f4')])
+    res['value'] = rng.normal(value, spread * abs(value) or spread, shape)
+    res['error'] = np.abs(rng.normal(0, spread * abs(value) or spread,
+                                     shape))
+    return res
+
+
+def write_l1b_rad(flname, nscans=32, nrows=16, ncols=24, band='7',
+                  icid_list=None, compression=True, seed=None):
+    """
+    Write a synthetic L1b radiance product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    nscans      :  int
+       number of scanlines
+    nrows       :  int
+       number of ground pixels
+    ncols       :  int
+       number of spectral channels
+    band        :  str
+       spectral band of the product
+    icid_list   :  ndarray, optional
+       ICID of each scanline, default a sequence of ICID 4 and 6
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    if icid_list is None:
+        icid_list = _default_icids(nscans)
+    icid_list = np.asarray(icid_list)
+
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        grp = fid.create_group('BAND{}_RADIANCE/STANDARD_MODE'.format(band))
+        _write_msm_group(grp, ('radiance', 'radiance_error', 'radiance_noise',
+                               'quality_level', 'spectral_channel_quality'),
+                         icid_list, nrows, ncols, rng, band=band,
+                         compression=compression)
+
+    return Path(flname)
+
+
+def write_l1b_irr(flname, nscans=32, nrows=16, ncols=24, bands='78',
+                  compression=True, seed=None):
+    """
+    Write a synthetic L1b irradiance product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    nscans      :  int
+       number of measurements
+    nrows       :  int
+       number of pixels
+    ncols       :  int
+       number of spectral channels
+    bands       :  str
+       spectral bands of the product
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        for band in bands:
+            grp = fid.create_group(
+                'BAND{}_IRRADIANCE/STANDARD_MODE'.format(band))
+            _write_msm_group(grp, ('irradiance', 'irradiance_error',
+                                   'irradiance_noise', 'quality_level',
+                                   'spectral_channel_quality'),
+                             np.full(nscans, 32), nrows, ncols, rng,
+                             band=band, compression=compression, geo='sun')
+
+    return Path(flname)
+
+
+def write_l1b_cal(flname, msm_type='BACKGROUND_RADIANCE_MODE_0005',
+                  nscans=32, nrows=16, ncols=24, bands='78',
+                  compression=True, seed=None):
+    """
+    Write a synthetic L1b calibration product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    msm_type    :  str
+       name of the calibration measurement group
+    nscans      :  int
+       number of measurements
+    nrows       :  int
+       number of detector rows
+    ncols       :  int
+       number of detector columns of each band
+    bands       :  str
+       spectral bands of the product
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    icid = int(msm_type.split('_')[-1])
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        for band in bands:
+            grp = fid.create_group('BAND{}_CALIBRATION/{}'.format(band,
+                                                                  msm_type))
+            _write_msm_group(grp, ('signal', 'signal_error_vals',
+                                   'quality_level'),
+                             np.full(nscans, icid), nrows, ncols, rng,
+                             band=band, compression=compression,
+                             geo='satellite')
+
+    return Path(flname)
+
+
+def write_l1b_eng(flname, npkts=64, seed=None):
+    """
+    Write a synthetic L1b engineering product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    npkts       :  int
+       number of engineering packets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+
+    def hk_table(names, temp, spread=0.01):
+        res = np.zeros((npkts,), dtype=[(x, 'f4') for x in names])
+        for name in names:
+            res[name] = rng.normal(temp, spread, npkts)
+            res[name][rng.random_sample(npkts) < 0.01] = 999.
+        return res
+
+    icid = np.repeat([4, 6, 4, 32], [npkts // 4] * 3
+                     + [npkts - 3 * (npkts // 4)])
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        fid['reference_time'] = np.array([REF_TIME], dtype='i4')
+        fid['nr_of_engdat_pkts'] = np.arange(npkts, dtype='i4')
+        fid['nr_of_engdat_pkts'].make_scale('nr_of_engdat_pkts')
+
+        buff = np.zeros((npkts,), dtype=[('icid', 'u2'), ('icv', 'u1'),
+                                         ('class', 'u1'),
+                                         ('delta_time', 'i4')])
+        buff['icid'] = icid
+        buff['icv'] = 1
+        buff['class'] = np.where(icid == 32, 2, 1)
+        buff['delta_time'] = MASTER_CYCLE * np.arange(npkts)
+        fid['/MSMTSET/msmtset'] = buff
+
+        buff = np.zeros((npkts,), dtype=[('mcp_us', 'u4'),
+                                         ('exp_time_us', 'u4'),
+                                         ('exp_per_mcp', 'u2')])
+        buff['mcp_us'] = 1000 * MASTER_CYCLE
+        buff['exp_time_us'] = np.where(icid % 2 == 0, 98175, 84675)
+        buff['exp_per_mcp'] = 11
+        fid['/DETECTOR4/timing'] = buff
+
+        fid['/DETECTOR4/DETECTOR_HK/temperature_info'] = hk_table(
+            ('temp_det_ts1', 'temp_det_ts2', 'temp_d1_box', 'temp_d5_cold',
+             'temp_a3_vref', 'temp_d6_vamp', 'temp_d4_vadc'), 140.)
+        fid['/DETECTOR4/DETECTOR_HK/heater_data'] = hk_table(
+            ('det_htr_curr',), 0.2)
+        fid['/NOMINAL_HK/TEMPERATURES/hires_temperatures'] = hk_table(
+            ['hires_temp_{}'.format(x) for x in range(1, 5)], 293.)
+        fid['/NOMINAL_HK/TEMPERATURES/instr_temperatures'] = hk_table(
+            ['instr_temp_{}'.format(x) for x in range(1, 31)], 293.)
+        fid['/NOMINAL_HK/HEATERS/heater_data'] = hk_table(
+            ['{}_htr{}'.format(x, y) for y in range(1, 15)
+             for x in ('meas_cur_val', 'last_pwm_val')], 0.5)
+
+        buff = np.zeros((npkts,), dtype=[('jday', 'f8'), ('x', 'f4'),
+                                         ('y', 'f4'), ('z', 'f4')])
+        buff['jday'] = 3287 + MASTER_CYCLE * np.arange(npkts) / 86400e3
+        phase = np.linspace(0, 2 * np.pi, npkts)
+        (buff['x'], buff['y']) = (7.2e6 * np.cos(phase), 7.2e6 * np.sin(phase))
+        fid['/SATELLITE_INFO/satellite_pos'] = buff
+
+    return Path(flname)
+
+
+def write_icm(flname, msm_types=('BACKGROUND_RADIANCE_MODE_0005',
+                                 'BACKGROUND_RADIANCE_MODE_0006'),
+              nscans=8, nrows=16, ncols=24, bands='78', compression=True,
+              seed=None):
+    """
+    Write a synthetic in-flight calibration monitoring (ICM) product
+
+    The calibration groups hold the averaged signal of each measurement,
+    the analysis group ANALOG_OFFSET_SWIR is derived from all calibration
+    groups. The SWIR detector data include row 257.
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    msm_types   :  list of str
+       names of the calibration measurement groups
+    nscans      :  int
+       number of measurements in each calibration group
+    nrows       :  int
+       number of detector rows, without row 257
+    ncols       :  int
+       number of detector columns of each band
+    bands       :  str
+       spectral bands of the product
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        for band in bands:
+            for msm_type in msm_types:
+                grp = fid.create_group('BAND{}_CALIBRATION/{}'.format(
+                    band, msm_type))
+                _write_msm_group(grp, ('signal_avg', 'signal_avg_std'),
+                                 np.full(nscans, int(msm_type[-4:])),
+                                 nrows + 1, ncols, rng, band=band,
+                                 compression=compression, geo='satellite',
+                                 row_name='pixel')
+
+            grp = fid.create_group(
+                'BAND{}_ANALYSIS/ANALOG_OFFSET_SWIR'.format(band))
+            scales = _add_scales(grp, (('pixel', nrows + 1),
+                                       ('spectral_channel', ncols)))
+            buff = np.zeros((len(msm_types),), dtype=[('group', 'S64')])
+            buff['group'] = [x.encode('ascii') for x in msm_types]
+            grp['analog_offset_swir_group_keys'] = buff
+            for name in ('value', 'error'):
+                dset = grp.create_dataset(
+                    'analog_offset_swir_{}'.format(name),
+                    data=rng.normal(1e3 if name == 'value' else 10, 1,
+                                    (nrows + 1, ncols)).astype('f4'),
+                    **_compression(compression))
+                dset.attrs['_FillValue'] = np.float32(FILLVALUE)
+                dset.attrs['units'] = 'V'
+                _attach_scales(dset, scales)
+
+    return Path(flname)
+
+
+def write_ocm(flname, ic_id=31523, band='8', ngroups=2, nframes=8,
+              nrows=16, ncols=24, compression=True, seed=None):
+    """
+    Write a synthetic on-ground calibration (OCM) product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    ic_id       :  int
+       ICID of the measurements
+    band        :  str
+       spectral band of the product
+    ngroups     :  int
+       number of measurement groups
+    nframes     :  int
+       number of frames in each measurement group
+    nrows       :  int
+       number of detector rows, without row 257
+    ncols       :  int
+       number of detector columns
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        for ii in range(ngroups):
+            grp = fid.create_group('BAND{}/ICID_{:05}_GROUP_{:05}'.format(
+                band, ic_id, ii))
+
+            sgrp = grp.create_group('GEODATA')
+            sgrp['time'] = np.array([REF_TIME + 3600 * ii], dtype='i4')
+            sgrp['delta_time'] = MASTER_CYCLE * np.arange(nframes,
+                                                          dtype='i4')
+
+            sgrp = grp.create_group('INSTRUMENT')
+            sgrp['instrument_settings'] = _instrument_settings(
+                np.array([ic_id]), band).reshape(1, 1)
+            buff = np.zeros((1, 1), dtype=[('lamp', 'S8'),
+                                           ('wavelength', 'f4'),
+                                           ('flux', 'f4')])
+            buff['lamp'] = b'QTH'
+            buff['wavelength'] = 2315.
+            sgrp['gse_stimuli'] = buff
+            sgrp['housekeeping_data'] = _housekeeping_data((nframes,), rng)
+
+            sgrp = grp.create_group('OBSERVATIONS')
+            scales = _add_scales(sgrp, (('msmt_time', nframes),
+                                        ('row', nrows + 1),
+                                        ('column', ncols)))
+            _write_msm_dset(sgrp, 'signal', (nframes, nrows + 1, ncols),
+                            scales, rng, (1, nrows + 1, ncols), compression)
+
+    return Path(flname)
+
+
+def write_lv2(flname, nscans=32, npixels=16, lon_center=0.,
+              lat_range=(-85., 85.), compression=True, seed=None):
+    """
+    Write a synthetic operational level 2 methane product
+
+    Parameters
+    ----------
+    flname      :  str or Path
+       name of the product
+    nscans      :  int
+       number of scanlines
+    npixels     :  int
+       number of ground pixels
+    lon_center  :  float
+       longitude of the sub-satellite track at the equator
+    lat_range   :  tuple
+       latitude of the first and last scanline
+    compression :  boolean
+       compress the datasets
+    seed        :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the product
+    """
+    rng = np.random.RandomState(seed)
+    (lats, lons) = _swath(nscans, npixels, lon_center=lon_center,
+                          lat_range=lat_range)
+    (lat, lon) = _centers(lats, lons)
+    with h5py.File(flname, 'w') as fid:
+        _write_root(fid)
+        fid.attrs['institution'] = b'KNMI'
+        fid.attrs['algorithm_version'] = b'1.0.0'
+        fid.attrs['product_version'] = b'1.0.0'
+        fid.attrs['date_created'] = b'2019-01-01T03:00:00Z'
+
+        grp = fid.create_group('PRODUCT')
+        scales = _add_scales(grp, (('time', 1), ('scanline', nscans),
+                                   ('ground_pixel', npixels),
+                                   ('corner', 4)))
+        grp['time'][0] = REF_TIME
+        dset = grp.create_dataset(
+            'delta_time', data=MASTER_CYCLE * np.arange(
+                nscans, dtype='i4').reshape(1, nscans))
+        _attach_scales(dset, scales[:2])
+
+        chunks = (1, min(nscans, 512), npixels)
+        for name, data in (('latitude', lat), ('longitude', lon)):
+            dset = grp.create_dataset(name, data=data[np.newaxis, ...],
+                                      dtype='f4', chunks=chunks,
+                                      **_compression(compression))
+            _attach_scales(dset, scales[:3])
+
+        valid = rng.random_sample((1, nscans, npixels)) > 0.3
+        value = rng.normal(1.8e-6, 2e-8, valid.shape).astype('f4')
+        for name, data, factor in (
+                ('methane_mixing_ratio', value, 1.),
+                ('methane_mixing_ratio_precision', value / 200, 1.),
+                ('qa_value', rng.randint(0, 101, valid.shape), 0.01)):
+            dtype = 'f4' if factor == 1. else 'u1'
+            fillvalue = np.array(FILLVALUE if factor == 1. else 255,
+                                 dtype=dtype)
+            dset = grp.create_dataset(
+                name, data=np.where(valid, data, fillvalue).astype(dtype),
+                chunks=chunks, fillvalue=fillvalue,
+                **_compression(compression))
+            dset.attrs['_FillValue'] = fillvalue
+            dset.attrs['units'] = b'1'
+            dset.attrs['long_name'] = name.replace('_', ' ').encode('ascii')
+            dset.attrs[MOL_M2_ATTR] = np.float32(6.02214e19)
+            if factor != 1.:
+                dset.attrs['scale_factor'] = np.float32(factor)
+            _attach_scales(dset, scales[:3])
+
+        sgrp = grp.create_group('SUPPORT_DATA/GEOLOCATIONS')
+        for name, mesh in (('latitude_bounds', lats),
+                           ('longitude_bounds', lons)):
+            dset = sgrp.create_dataset(
+                name, data=_corners(mesh)[np.newaxis, ...], dtype='f4',
+                chunks=chunks + (4,), **_compression(compression))
+            _attach_scales(dset, scales)
+
+    return Path(flname)
+
+
+def write_ckd_dir(ckd_dir, nrows=256, ncols=500,
+                  validity=('20180430T000000', '20991231T235959'),
+                  seed=None):
+    """
+    Write a synthetic Static CKD product and the dynamic CKD products of
+    the SWIR detector, in the sub-directories 'static' and 'dynamic'
+
+    Parameters
+    ----------
+    ckd_dir   :  str or Path
+       directory of the CKD products
+    nrows     :  int
+       number of detector rows, without row 257
+    ncols     :  int
+       number of detector columns of each band
+    validity  :  tuple of str
+       validity period of the CKD products, as YYYYmmddTHHMMSS
+    seed      :  int, optional
+       seed of the random generator
+
+    Returns
+    -------
+    Path to the CKD directory
+    """
+    rng = np.random.RandomState(seed)
+    shape = (nrows + 1, ncols)
+
+    ckd_dir = Path(ckd_dir)
+    (ckd_dir / 'static').mkdir(parents=True, exist_ok=True)
+    (ckd_dir / 'dynamic').mkdir(parents=True, exist_ok=True)
+
+    flname = ckd_dir / 'static' / 'S5P_TEST_AUX_L1_CKD_{}_{}.h5'.format(
+        *validity)
+    with h5py.File(flname, 'w') as fid:
+        grp = fid.create_group(HEADER + '/validity_period')
+        grp.attrs['Validity_Start'] = validity[0].encode('ascii')
+        grp.attrs['Validity_Stop'] = validity[1].encode('ascii')
+        grp = fid.create_group(HEADER + '/source')
+        grp.attrs['Creator_Date'] = np.array([b'20180430T000000'])
+        grp.attrs['Creator_Verion'] = np.array([b'1.0.0'])
+
+        fid['/BAND7/v2c_factor_swir'] = _datapoint((1,), rng, 6300.)
+        fid['/BAND7/dpqf_threshold'] = np.array([0.8])
+        for band in '78':
+            wavelength = np.linspace(2300., 2390., 2 * ncols)
+            wavelength = wavelength[(int(band) - 7) * ncols:][:ncols]
+            for name, value in (
+                    ('PRNU', 1.), ('abs_rad_conv_factor', 4e-12),
+                    ('abs_irr_conv_factor_qvd1', 3e-9),
+                    ('abs_irr_conv_factor_qvd2', 3e-9),
+                    ('mem_lin_neg_swir', 0.), ('mem_lin_pos_swir', 0.),
+                    ('mem_qua_neg_swir', 0.), ('mem_qua_pos_swir', 0.)):
+                fid['/BAND{}/{}'.format(band, name)] = \
+                    _datapoint(shape, rng, value)
+            buff = _datapoint(shape, rng, 0., spread=0.001)
+            buff['value'] += wavelength
+            fid['/BAND{}/wavelength_map'.format(band)] = buff
+
+    for ckd_name, key, value in (
+            ('offset', 'analog_offset_swir', 1e3),
+            ('dark', 'long_term_swir', 5e3),
+            ('readnoise', 'readout_noise_swir', 10.)):
+        flname = ckd_dir / 'dynamic' / 'ckd.{}.detector4.nc'.format(ckd_name)
+        with h5py.File(flname, 'w') as fid:
+            for band in '78':
+                fid['/BAND{}/{}'.format(band, key)] = \
+                    _datapoint(shape, rng, value)
+
+    flname = ckd_dir / 'dynamic' / 'ckd.saturation_preoffset.detector4.nc'
+    with h5py.File(flname, 'w') as fid:
+        for band in '78':
+            fid['/BAND{}/saturation_preoffset'.format(band)] = \
+                rng.normal(2.5e6, 1e4, shape).astype('f4')
+
+    flname = ckd_dir / 'dynamic' / 'ckd.dpqf.detector4.nc'
+    with h5py.File(flname, 'w') as fid:
+        fid['/BAND7/dpqf_threshold'] = np.array([0.8])
+        for band in '78':
+            fid['/BAND{}/dpqf_map'.format(band)] = np.clip(
+                rng.normal(0.95, 0.1, shape), 0, 1).astype('f4')
+
+    return ckd_dir
+
+
+def write_products(data_dir, size='small', compression=True, seed=0,
+                   **kwargs):
+    """
+    Write a set of synthetic products of all types
+
+    Parameters
+    ----------
+    data_dir    :  str or Path
+       directory to write the products
+    size        :  {'small', 'medium', 'orbit'}
+       dimensions of the products, see SIZES
+    compression :  boolean
+       compress the measurement datasets
+    seed        :  int
+       seed of the random generator
+    kwargs      :  dict
+       overrule dimensions of SIZES, e.g. nscans=100
+
+    Returns
+    -------
+    dictionary with the path of each product type, see PRODUCTS, and the
+    path to the CKD directory (key 'ckd_dir')
+    """
+    if size not in SIZES:
+        raise ValueError('unknown size {}'.format(size))
+    dims = dict(SIZES[size], **kwargs)
+
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    res = {key: data_dir / value for key, value in PRODUCTS.items()}
+
+    write_l1b_rad(res['l1b_rad'], nscans=dims['nscans'],
+                  nrows=dims['nrows'], ncols=dims['ncols'],
+                  compression=compression, seed=seed)
+    write_l1b_irr(res['l1b_irr'], nscans=max(1, dims['nscans'] // 100),
+                  nrows=dims['nrows'], ncols=dims['ncols'],
+                  compression=compression, seed=seed)
+    write_l1b_cal(res['l1b_cal'], nscans=dims['nframes'],
+                  nrows=dims['det_rows'], ncols=dims['det_cols'],
+                  compression=compression, seed=seed)
+    write_l1b_eng(res['l1b_eng'], npkts=dims['npkts'], seed=seed)
+    write_icm(res['icm'], nscans=dims['nframes'], nrows=dims['det_rows'],
+              ncols=dims['det_cols'], compression=compression, seed=seed)
+    write_ocm(res['ocm'], nframes=dims['nframes'], nrows=dims['det_rows'],
+              ncols=2 * dims['det_cols'], compression=compression,
+              seed=seed)
+    write_lv2(res['lv2'], nscans=dims['nscans'], npixels=dims['nrows'],
+              compression=compression, seed=seed)
+    res['ckd_dir'] = write_ckd_dir(data_dir / 'ckd', nrows=dims['det_rows'],
+                                   ncols=dims['det_cols'], seed=seed)
+
+    return res
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='write synthetic Tropomi products')
+    parser.add_argument('data_dir', help='directory to write the products')
+    parser.add_argument('--size', default='small', choices=list(SIZES),
+                        help='dimensions of the products')
+    parser.add_argument('--no-compression', dest='compression',
+                        action='store_false',
+                        help='do not compress the measurement datasets')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random generator')
+    args = parser.parse_args()
+
+    res = write_products(args.data_dir, size=args.size,
+                         compression=args.compression, seed=args.seed)
+    for key, flname in res.items():
+        print('{:8s} {}'.format(key, flname))
+
+
+if __name__ == '__main__':
+    main()
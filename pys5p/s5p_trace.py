@@ -0,0 +1,275 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Opt-in instrumentation of the product readers of pys5p
+
+Within the context manager io_trace, products opened with
+s5p_hdf5.open_product record every read of a dataset: the dataset path,
+the shape of the selection, the number of bytes and the wall time of the
+h5py call. The reads are collected per call of a reader method decorated
+with 'traced', e.g. L1BioRAD.get_msm_data, together with the wall time
+spent in post-processing (squeeze, astype, fill_as_nan, ...). Outside
+io_trace the readers open plain h5py.File objects, thus there is no
+overhead.
+
+Usage:
+
+  with io_trace() as trace:
+      with L1BioRAD(l1b_product) as l1b:
+          l1b.select()
+          data = l1b.get_msm_data('radiance')
+
+  print(trace.summary())
+  trace.to_json('io_trace.json')
+  frame = pandas.DataFrame(trace.table())
+
+Note only products opened within io_trace are traced. Reads in worker
+processes are not recorded.
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import functools
+import json
+import threading
+
+from contextlib import contextmanager
+from time import perf_counter
+
+import h5py
+import numpy as np
+
+# - global parameters ------------------------------
+_IO_TRACE = None
+
+
+# - local functions --------------------------------
+def active_trace():
+    """
+    Returns the active IOtrace, or None when I/O is not traced
+    """
+    return _IO_TRACE
+
+
+@contextmanager
+def io_trace():
+    """
+    Trace the reads of all products opened within this context
+
+    Returns
+    -------
+    IOtrace, which holds the records after the context is closed
+    """
+    global _IO_TRACE
+
+    previous = _IO_TRACE
+    _IO_TRACE = IOtrace()
+    try:
+        yield _IO_TRACE
+    finally:
+        _IO_TRACE = previous
+
+
+def traced(method):
+    """
+    Decorator to collect the reads of a reader method in the active IOtrace
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        trace = _IO_TRACE
+        if trace is None:
+            return method(self, *args, **kwargs)
+
+        name = '{}.{}'.format(type(self).__name__, method.__name__)
+        trace.enter(name, getattr(self, 'filename',
+                                  getattr(self, 'ckd_dir', None)))
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            trace.leave()
+
+    return wrapper
+
+
+def _traced_object(obj):
+    """
+    Returns a traced version of a h5py Group or Dataset
+    """
+    if isinstance(obj, h5py.Dataset):
+        return TracedDataset(obj.id)
+    if isinstance(obj, h5py.Group) and not isinstance(obj, h5py.File):
+        return TracedGroup(obj.id)
+
+    return obj
+
+
+# - class definition -------------------------------
+class IOtrace():
+    """
+    Records of the dataset reads, collected per call of a reader method
+    """
+    def __init__(self):
+        self.records = []
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}({} calls)'.format(class_name, len(self.records))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __stack(self):
+        if not hasattr(self.__local, 'stack'):
+            self.__local.stack = []
+        return self.__local.stack
+
+    def enter(self, method, product=None):
+        """
+        Start a record of a call of a reader method
+        """
+        self.__stack().append({'method': method,
+                               'product': None if product is None
+                                          else str(product),
+                               'reads': [],
+                               'child_time': 0.,
+                               'tstart': perf_counter()})
+
+    def leave(self):
+        """
+        Close the record of the current call of a reader method
+        """
+        stack = self.__stack()
+        call = stack.pop()
+        duration = perf_counter() - call.pop('tstart')
+        child_time = call.pop('child_time')
+        if stack:
+            stack[-1]['child_time'] += duration
+
+        call['h5py_calls'] = len(call['reads'])
+        call['nbytes'] = sum(x['nbytes'] for x in call['reads'])
+        call['read_time'] = sum(x['time'] for x in call['reads'])
+        call['post_time'] = max(0., duration - call['read_time']
+                                - child_time)
+        call['time'] = duration
+        with self.__lock:
+            call['call'] = len(self.records)
+            self.records.append(call)
+
+    def add_read(self, dataset, selection, nbytes, duration):
+        """
+        Add a read of a dataset to the current call, reads outside a traced
+        reader method are recorded as a call without method
+        """
+        read = {'dataset': dataset,
+                'selection': tuple(int(x) for x in selection),
+                'nbytes': int(nbytes),
+                'time': duration}
+        stack = self.__stack()
+        if stack:
+            stack[-1]['reads'].append(read)
+            return
+
+        self.enter(None)
+        self.__stack()[-1]['reads'].append(read)
+        self.leave()
+
+    def table(self):
+        """
+        Returns the reads as list of flat dictionaries, one per dataset read
+        (or call without reads), e.g. as input for pandas.DataFrame
+        """
+        res = []
+        for call in self.records:
+            reads = call['reads'] or [{'dataset': None, 'selection': (),
+                                       'nbytes': 0, 'time': 0.}]
+            for read in reads:
+                res.append({'call': call['call'],
+                            'method': call['method'],
+                            'product': call['product'],
+                            'dataset': read['dataset'],
+                            'selection': read['selection'],
+                            'nbytes': read['nbytes'],
+                            'read_time': read['time'],
+                            'post_time': call['post_time'],
+                            'time': call['time']})
+        return res
+
+    def summary(self):
+        """
+        Returns totals per reader method: number of calls, number of h5py
+        calls, bytes read, read time, post-processing time and total time
+        """
+        res = {}
+        for call in self.records:
+            key = call['method']
+            if key not in res:
+                res[key] = dict.fromkeys(('calls', 'h5py_calls', 'nbytes'), 0)
+                res[key].update(dict.fromkeys(
+                    ('read_time', 'post_time', 'time'), 0.))
+            res[key]['calls'] += 1
+            for name in ('h5py_calls', 'nbytes', 'read_time', 'post_time',
+                         'time'):
+                res[key][name] += call[name]
+
+        return res
+
+    def to_json(self, flname=None):
+        """
+        Returns the records as JSON string, or writes them to a file
+        """
+        if flname is None:
+            return json.dumps(self.records, indent=2)
+
+        with open(flname, 'w') as fp:
+            json.dump(self.records, fp, indent=2)
+        return None
+
+
+class TracedDataset(h5py.Dataset):
+    """
+    h5py.Dataset which records its reads in the active IOtrace
+    """
+    def __getitem__(self, args, new_dtype=None):
+        tstart = perf_counter()
+        if new_dtype is None:
+            res = super().__getitem__(args)
+        else:
+            res = super().__getitem__(args, new_dtype=new_dtype)
+        self.record_read(np.shape(res), np.asarray(res).nbytes,
+                         perf_counter() - tstart)
+        return res
+
+    def read_direct(self, dest, source_sel=None, dest_sel=None):
+        tstart = perf_counter()
+        super().read_direct(dest, source_sel=source_sel, dest_sel=dest_sel)
+        view = dest if dest_sel is None else dest[dest_sel]
+        self.record_read(view.shape, view.nbytes, perf_counter() - tstart)
+
+    def record_read(self, selection, nbytes, duration):
+        """
+        Add a read of this dataset to the active IOtrace, also used by
+        low-level reads via the dataset identifier
+        """
+        trace = _IO_TRACE
+        if trace is not None:
+            trace.add_read(self.name, selection, nbytes, duration)
+
+
+class TracedGroup(h5py.Group):
+    """
+    h5py.Group which returns traced groups and datasets
+    """
+    def __getitem__(self, name):
+        return _traced_object(super().__getitem__(name))
+
+
+class TracedFile(TracedGroup, h5py.File):
+    """
+    h5py.File which returns traced groups and datasets
+    """
@@ -0,0 +1,265 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Calibration chain of SWIR (ir)radiance measurements, used to replace CKD's
+applied by the L1b processor by alternative CKD's
+
+The L1b processor applies the calibration steps below (in this order) to
+the detector signal S, with exposure time t:
+
+  offset   :  S - offset
+  darkflux :  S - darkflux * t
+  prnu     :  S * prnu
+  texp     :  S / t                    (not a CKD, never patched)
+  relrad   :  S * relrad
+  absrad   :  S * absrad
+
+Each step is an affine function, thus reversing the applied steps and
+reapplying the steps with alternative CKD's reduces to one affine function
+per pixel: radiance_new = A * radiance + B, where A and B only depend on
+the exposure time. The class CalibChain computes A and B once per exposure
+time, and applies them in-place on blocks of scanlines.
+
+The CKD's are given in level-2 geometry (ground_pixel, spectral_channel),
+in the units of the signal at the corresponding step of the chain.
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+# - global parameters ------------------------------
+CHAIN = ('offset', 'darkflux', 'prnu', 'texp', 'relrad', 'absrad')
+
+# calibration steps which can be patched
+CALIB_STEPS = ('offset', 'darkflux', 'prnu', 'relrad', 'absrad')
+
+# CKDio methods of the CKD's of the calibration steps
+STEP_CKD = {'offset': 'offset',
+            'darkflux': 'darkflux',
+            'prnu': 'prnu',
+            'absrad': 'absrad'}
+
+# fill value of the CKD's, replaced by NaN
+FILLVALUE = float.fromhex('0x1.ep+122')
+
+# steps with a CKD which is not provided by CKDio, assumed unity when
+# the original CKD is not given
+UNITY_CKD = ('relrad',)
+
+
+# - local functions --------------------------------
+def read_calib_ckds(ckd_dir, steps, band, date=None):
+    """
+    Returns CKD's of the calibration steps in level-2 geometry
+
+    Parameters
+    ----------
+    ckd_dir  :  str or Path
+       directory with the SWIR CKD products
+    steps    :  list of strings
+       names of the calibration steps
+    band     :  {'7', '8'}
+       spectral band of the L1b product
+    date     :  datetime, optional
+       use the CKD's valid at this date, default the latest CKD's
+
+    Returns
+    -------
+    dictionary with the CKD (ndarray) of each step, steps without a CKD
+    in CKDio are omitted
+    """
+    from .ckd_io import CKDio
+
+    res = {}
+    with CKDio(ckd_dir, date=date) as ckd:
+        for step in steps:
+            if step in STEP_CKD:
+                res[step] = getattr(ckd, STEP_CKD[step])().value
+
+    return level2_ckds(res, band)
+
+
+def level2_ckds(ckds, band):
+    """
+    Returns CKD's in level-2 geometry, CKD's of the SWIR detector (bands 7
+    and 8 combined, row 257 excluded) are reduced to the level-2 region of
+    the spectral band
+    """
+    from .swir_region import coords
+
+    res = {}
+    for key, value in ckds.items():
+        value = np.asarray(value)
+        if value.shape == (256, 1000):
+            value = value[coords(mode='level2', band=band)]
+        res[key] = value
+
+    return res
+
+
+def _ckd_array(value):
+    """
+    Returns CKD as float64 array, with its fill values replaced by NaN
+    """
+    res = np.array(value, dtype=float)
+    res[res == FILLVALUE] = np.nan
+    return res
+
+
+def _db_to_noise(signal, value):
+    """
+    Convert noise expressed in dB, as 10 * log10(signal / noise), to noise
+    """
+    return np.abs(signal) / 10 ** (value / 10.)
+
+
+def _noise_to_db(signal, noise, dtype):
+    """
+    Convert noise to dB, as 10 * log10(signal / noise)
+    """
+    info = np.iinfo(dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        res = 10 * np.log10(np.abs(signal) / noise)
+    return np.clip(np.nan_to_num(res, nan=0.), info.min + 1,
+                   info.max).round().astype(dtype)
+
+
+# - class definition -------------------------------
+class CalibChain():
+    """
+    Reverse and reapply SWIR calibration steps in one pass
+    """
+    def __init__(self, steps, ckd_orig, ckd_new):
+        """
+        Parameters
+        ----------
+        steps     :  list of strings
+           calibration steps which are patched, see CALIB_STEPS
+        ckd_orig  :  dict
+           CKD's applied by the L1b processor, required for the patched
+           steps and all steps which follow them in the chain
+        ckd_new   :  dict
+           alternative CKD's of the patched steps
+        """
+        if not steps:
+            raise ValueError('no calibration steps selected')
+        for step in steps:
+            if step not in CALIB_STEPS:
+                raise ValueError('unknown calibration step {}'.format(step))
+            if step not in ckd_new:
+                raise KeyError('no alternative CKD for step {}'.format(step))
+
+        self.steps = tuple(x for x in CHAIN if x in steps)
+        self.first = CHAIN.index(self.steps[0])
+        self.ckd_orig = {}
+        self.ckd_new = {}
+        for step in CHAIN[self.first:]:
+            if step == 'texp':
+                continue
+            if step in ckd_orig:
+                self.ckd_orig[step] = _ckd_array(ckd_orig[step])
+            elif step in UNITY_CKD:
+                self.ckd_orig[step] = np.float64(1)
+            else:
+                raise KeyError('no original CKD for step {}'.format(step))
+            self.ckd_new[step] = _ckd_array(ckd_new[step]) \
+                if step in self.steps else self.ckd_orig[step]
+        self.__coeffs = {}
+
+    def __repr__(self):
+        class_name = type(self).__name__
+        return '{}({!r})'.format(class_name, self.steps)
+
+    @staticmethod
+    def __forward(ckds, steps, texp):
+        """
+        Returns (A, B) of the affine function of the calibration steps
+        """
+        (coef_a, coef_b) = (np.float64(1), np.float64(0))
+        for step in steps:
+            if step == 'offset':
+                coef_b = coef_b - ckds[step]
+            elif step == 'darkflux':
+                coef_b = coef_b - ckds[step] * texp
+            elif step == 'texp':
+                (coef_a, coef_b) = (coef_a / texp, coef_b / texp)
+            else:
+                (coef_a, coef_b) = (coef_a * ckds[step], coef_b * ckds[step])
+
+        return (coef_a, coef_b)
+
+    def coefficients(self, texp):
+        """
+        Returns (A, B) of radiance_new = A * radiance + B, for measurements
+        with exposure time texp
+        """
+        texp = float(texp)
+        if texp not in self.__coeffs:
+            steps = CHAIN[self.first:]
+            (orig_a, orig_b) = self.__forward(self.ckd_orig, steps, texp)
+            (new_a, new_b) = self.__forward(self.ckd_new, steps, texp)
+
+            coef_a = new_a / orig_a
+            coef_b = new_b - coef_a * orig_b
+            self.__coeffs[texp] = (np.asarray(coef_a, dtype=np.float32),
+                                   np.asarray(coef_b, dtype=np.float32))
+
+        return self.__coeffs[texp]
+
+    def apply(self, data, texp, error=None, fillvalue=None):
+        """
+        Reverse and reapply the calibration steps, in-place
+
+        Parameters
+        ----------
+        data      :  ndarray
+           radiance with dimensions (scanline, ground_pixel, spectral_channel)
+        texp      :  array-like
+           exposure time of each scanline
+        error     :  list of ndarray, optional
+           uncertainties of the radiance, which are scaled with |A|.
+           Integer uncertainties are expressed in dB relative to the radiance
+        fillvalue :  float, optional
+           radiance values equal to fillvalue are not modified, pixels with
+           a CKD equal to FILLVALUE are set to fillvalue (else NaN)
+        """
+        texp = np.asarray(texp)
+        if error is None:
+            error = []
+
+        fill = None if fillvalue is None else data == fillvalue
+        for value in np.unique(texp):
+            (coef_a, coef_b) = self.coefficients(value)
+            indx = np.s_[...] if texp.size == 1 or np.all(texp == value) \
+                else texp == value
+
+            for err in error:
+                if np.issubdtype(err.dtype, np.integer):
+                    noise = np.abs(coef_a) * _db_to_noise(data[indx],
+                                                          err[indx])
+                    err_orig = err[indx].copy()
+                    buff = data[indx] * coef_a + coef_b
+                    err[indx] = _noise_to_db(buff, noise, err.dtype)
+                    if fill is not None:
+                        err[indx] = np.where(fill[indx], err_orig, err[indx])
+                else:
+                    err[indx] *= np.abs(coef_a)
+
+            if indx is Ellipsis:
+                data *= coef_a
+                data += coef_b
+            else:
+                data[indx] = data[indx] * coef_a + coef_b
+
+        if fill is not None:
+            # pixels with filled CKD's have non-finite coefficients
+            fill |= ~np.isfinite(data)
+            data[fill] = fillvalue
+            for err in error:
+                if not np.issubdtype(err.dtype, np.integer):
+                    err[fill] = fillvalue
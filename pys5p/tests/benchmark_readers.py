@@ -0,0 +1,330 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Benchmark the readers of pys5p on synthetic products, see pys5p.s5p_synth
+
+Each benchmark is a function 'bench_<name>(products)', the fastest time of
+several runs is reported. The results can be saved as baseline, and later
+runs are compared with the baseline to catch performance regressions.
+
+Usage:
+
+  python3 -m pys5p.tests.benchmark_readers --size medium --save base.json
+  python3 -m pys5p.tests.benchmark_readers --size medium --compare base.json
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from ..biweight import biweight
+from ..ckd_cache import ckd_cache
+from ..ckd_io import CKDio
+from ..icm_io import ICMio
+from ..l1b_io import L1BioCAL, L1BioENG, L1BioIRR, L1BioRAD
+from ..lv2_io import LV2io
+from ..ocm_io import OCMio
+from ..s5p_msm import S5Pmsm
+from ..s5p_synth import write_products
+
+# - global parameters ------------------------------
+# a benchmark is a regression when slower than threshold * baseline
+THRESHOLD = 1.25
+
+
+# - benchmarks -------------------------------------
+def bench_l1b_rad_select(products):
+    """
+    Benchmark select of a L1b radiance product
+    """
+    with L1BioRAD(products['l1b_rad']) as l1b:
+        l1b.select()
+
+
+def bench_l1b_rad_msm_info(products):
+    """
+    Benchmark msm_info of a L1b radiance product
+    """
+    with L1BioRAD(products['l1b_rad']) as l1b:
+        l1b.msm_info('BAND7_RADIANCE/STANDARD_MODE')
+
+
+def bench_l1b_rad_get_msm_data(products):
+    """
+    Benchmark get_msm_data of a L1b radiance product
+    """
+    with L1BioRAD(products['l1b_rad']) as l1b:
+        l1b.select()
+        l1b.get_msm_data('radiance', icid=4, fill_as_nan=True)
+
+
+def bench_l1b_rad_get_geo_data(products):
+    """
+    Benchmark get_geo_data of a L1b radiance product
+    """
+    with L1BioRAD(products['l1b_rad']) as l1b:
+        l1b.select()
+        l1b.get_geo_data(icid=4)
+
+
+def bench_l1b_irr_get_msm_data(products):
+    """
+    Benchmark get_msm_data of a L1b irradiance product
+    """
+    with L1BioIRR(products['l1b_irr']) as l1b:
+        l1b.select()
+        l1b.get_msm_data('irradiance')
+
+
+def bench_l1b_cal_get_msm_data(products):
+    """
+    Benchmark get_msm_data of a L1b calibration product
+    """
+    with L1BioCAL(products['l1b_cal']) as l1b:
+        l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+        l1b.get_msm_data('signal', fill_as_nan=True)
+
+
+def bench_l1b_eng_swir_hk(products):
+    """
+    Benchmark SWIR housekeeping of a L1b engineering product
+    """
+    with L1BioENG(products['l1b_eng']) as l1b:
+        l1b.get_msmtset_db()
+        l1b.get_swir_hk_db(stats='median')
+
+
+def bench_icm_get_msm_data(products):
+    """
+    Benchmark get_msm_data of an ICM product
+    """
+    with ICMio(products['icm']) as icm:
+        icm.select('BACKGROUND_RADIANCE_MODE_0005')
+        icm.get_msm_data('signal_avg')
+
+
+def bench_ocm_get_msm_data(products):
+    """
+    Benchmark get_msm_data of an OCM product
+    """
+    with OCMio(products['ocm']) as ocm:
+        ocm.select(31523)
+        ocm.get_msm_data('signal')
+
+
+def bench_lv2_get_dataset(products):
+    """
+    Benchmark get_dataset of a level 2 product
+    """
+    with LV2io(products['lv2']) as lv2:
+        lv2.get_dataset('methane_mixing_ratio')
+
+
+def bench_lv2_get_geo_bounds(products):
+    """
+    Benchmark get_geo_bounds of a level 2 product
+    """
+    with LV2io(products['lv2']) as lv2:
+        lv2.get_geo_bounds(extent=[-20, 20, -10, 10])
+
+
+def bench_biweight(products):
+    """
+    Benchmark biweight median and spread of a frame stack
+    """
+    with L1BioCAL(products['l1b_cal']) as l1b:
+        l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+        data = l1b.get_msm_data('signal', fill_as_nan=True)
+    biweight(data, axis=0, spread=True)
+
+
+def bench_s5pmsm_reductions(products):
+    """
+    Benchmark reductions of S5Pmsm along the time axis
+    """
+    with L1BioCAL(products['l1b_cal']) as l1b:
+        l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+        msm = S5Pmsm(l1b.get_msm_data('signal', fill_as_nan=True))
+    msm.biweight(axis=0)
+    msm.nanmedian(axis=0)
+    msm.nanpercentile([1, 99], axis=0)
+    msm.nanmean(axis=0)
+
+
+def bench_ckd_getters(products):
+    """
+    Benchmark read the SWIR CKD's, without cache
+    """
+    ckd_cache().clear()
+    with CKDio(products['ckd_dir'], use_bundle=False) as ckd:
+        for name in ('prnu', 'absrad', 'absirr', 'wavelength', 'memory',
+                     'offset', 'darkflux', 'noise', 'saturation',
+                     'pixel_quality'):
+            getattr(ckd, name)()
+
+
+def bench_plot_signal(products):
+    """
+    Benchmark S5Pplot.draw_signal
+    """
+    from ..s5p_plot import S5Pplot
+
+    with L1BioCAL(products['l1b_cal']) as l1b:
+        l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+        data = l1b.get_msm_data('signal', fill_as_nan=True)
+
+    with TemporaryDirectory() as tmp_dir:
+        plot = S5Pplot(str(Path(tmp_dir, 'signal.pdf')))
+        plot.draw_signal(np.nanmean(data, axis=0))
+        plot.close()
+
+
+def bench_plot_geo(products):
+    """
+    Benchmark S5Pgeoplot.draw_geo_subsat
+    """
+    from ..s5p_geoplot import S5Pgeoplot
+
+    with L1BioRAD(products['l1b_rad']) as l1b:
+        l1b.select()
+        geo = l1b.get_geo_data(geo_dset='satellite_latitude,'
+                               'satellite_longitude')
+
+    with TemporaryDirectory() as tmp_dir:
+        plot = S5Pgeoplot(str(Path(tmp_dir, 'geo.pdf')))
+        plot.draw_geo_subsat(geo['satellite_longitude'],
+                             geo['satellite_latitude'])
+        plot.close()
+
+
+# - local functions --------------------------------
+def benchmarks(pattern=None):
+    """
+    Returns the benchmark functions, optionally only those with pattern in
+    their name
+    """
+    return {key[6:]: func for key, func in globals().items()
+            if key.startswith('bench_') and callable(func)
+            and (pattern is None or pattern in key)}
+
+
+def run_benchmarks(products, pattern=None, repeat=3):
+    """
+    Run the benchmarks on the products
+
+    Parameters
+    ----------
+    products  :  dict
+       paths of the synthetic products, see s5p_synth.write_products
+    pattern   :  str, optional
+       only run the benchmarks with pattern in their name
+    repeat    :  int
+       number of runs of each benchmark
+
+    Returns
+    -------
+    dictionary with the fastest time [s] of each benchmark, or the error
+    message of a benchmark which failed
+    """
+    from time import perf_counter
+
+    res = {}
+    for name, func in benchmarks(pattern).items():
+        timings = []
+        try:
+            for _ in range(repeat):
+                tstart = perf_counter()
+                func(products)
+                timings.append(perf_counter() - tstart)
+        except Exception as exc:
+            res[name] = {'error': '{}: {}'.format(type(exc).__name__, exc)}
+        else:
+            res[name] = {'time': min(timings)}
+
+    return res
+
+
+def regressions(res, baseline, threshold=THRESHOLD):
+    """
+    Returns the benchmarks which are slower than threshold times their
+    baseline, or which failed while the baseline did not
+    """
+    slower = []
+    for name, value in res.items():
+        if name not in baseline or 'time' not in baseline[name]:
+            continue
+        if 'time' not in value \
+           or value['time'] > threshold * baseline[name]['time']:
+            slower.append(name)
+
+    return slower
+
+
+# - main function ----------------------------------
+def main():
+    """
+    main function when called from the command-line
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='benchmark the readers of pys5p on synthetic products')
+    parser.add_argument('--size', default='small',
+                        help='dimensions of the synthetic products')
+    parser.add_argument('--data_dir', default=None,
+                        help='directory to write the synthetic products,'
+                        ' default a temporary directory')
+    parser.add_argument('-k', dest='pattern', default=None,
+                        help='only run benchmarks with pattern in their name')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs of each benchmark')
+    parser.add_argument('--save', default=None,
+                        help='write results to JSON file')
+    parser.add_argument('--compare', default=None,
+                        help='compare results with JSON file')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='maximum slowdown relative to the baseline')
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as tmp_dir:
+        data_dir = tmp_dir if args.data_dir is None else args.data_dir
+        products = write_products(data_dir, size=args.size)
+        res = run_benchmarks(products, pattern=args.pattern,
+                             repeat=args.repeat)
+
+    for name, value in res.items():
+        if 'time' in value:
+            print('{:24s} {:10.4f} s'.format(name, value['time']))
+        else:
+            print('{:24s} failed, {}'.format(name, value['error']))
+
+    if args.save is not None:
+        with open(args.save, 'w') as fp:
+            json.dump({'size': args.size, 'results': res}, fp, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        if baseline['size'] != args.size:
+            raise ValueError('baseline is generated for size {}'.format(
+                baseline['size']))
+        slower = regressions(res, baseline['results'], args.threshold)
+        for name in slower:
+            print('REGRESSION: {}'.format(name))
+        if slower:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
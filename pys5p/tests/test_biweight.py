@@ -0,0 +1,87 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.biweight
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+from ..biweight import biweight, biweight_chunked
+
+
+#-------------------------
+def _test_data():
+    """
+    Generate a small frame stack with NaN's, a fully masked pixel and
+    pixels without spread
+    """
+    rng = np.random.RandomState(42)
+    data = rng.normal(loc=100., scale=5., size=(25, 8, 12))
+    data[rng.random_sample(data.shape) < 0.1] = np.nan
+    data[:, 0, 0] = np.nan
+    data[:, 1, 1] = 7.
+    data[:20, 2, 2] = 3.
+
+    return data
+
+
+def test_biweight_axis():
+    """
+    Compare biweight along an axis with the biweight of each pixel
+    """
+    data = _test_data()
+
+    for axis in range(data.ndim):
+        (median, spread) = biweight(data, axis=axis, spread=True)
+        tmp = np.moveaxis(data, axis, 0)
+        for indx in np.ndindex(tmp.shape[1:]):
+            ref = biweight(tmp[(slice(None),) + indx], spread=True)
+            assert np.allclose(median[indx], ref[0], equal_nan=True)
+            assert np.allclose(spread[indx], ref[1])
+
+        res = biweight(data, axis=axis, cpu_count=2)
+        assert np.array_equal(res, median, equal_nan=True)
+
+    # the results are in double precision, cpu_count=None uses all CPUs
+    res = biweight(data.astype(np.float32), axis=0, cpu_count=None)
+    assert res.dtype == np.float64
+    assert np.allclose(res, biweight(data.astype(np.float32), axis=0),
+                       equal_nan=True)
+
+
+def test_biweight_chunked():
+    """
+    Compare biweight of a frame stack processed in tiles with biweight
+    along the time axis
+    """
+    data = _test_data()
+    (median, spread) = biweight(data[1:, ...], axis=0, spread=True)
+
+    # tiles of a few rows, or even a single pixel
+    for max_memory in (2**20, 8 * 8 * 24 * 12 * 3, 1):
+        res = biweight_chunked(data, frames=[1, None], spread=True,
+                               max_memory=max_memory)
+        assert np.allclose(res[0], median, equal_nan=True)
+        assert np.allclose(res[1], spread)
+
+    # frame stack provided as blocks of frames
+    blocks = (data[ii:ii+4, ...] for ii in range(0, data.shape[0], 4))
+    res = biweight_chunked(blocks, frames=[1, None], max_memory=2**10)
+    assert np.allclose(res, median, equal_nan=True)
+
+
+if __name__ == '__main__':
+    test_biweight_axis()
+    test_biweight_chunked()
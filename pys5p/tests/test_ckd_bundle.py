@@ -0,0 +1,73 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.ckd_bundle
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import os
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from ..ckd_bundle import CKDbundle, write_ckd_bundle
+from ..ckd_io import CKDio
+from .test_ckd_cache import _write_ckd_dir
+
+
+#-------------------------
+def test_ckd_bundle():
+    """
+    Compare CKD's read from a bundle with CKD's read from the CKD products
+    """
+    with TemporaryDirectory() as tmp_dir:
+        ckd_dir = Path(tmp_dir)
+        _write_ckd_dir(ckd_dir)
+
+        with CKDio(ckd_dir) as ckd:
+            prnu = ckd.prnu()
+            dpqf = ckd.dpqf()
+
+        bundle_dir = write_ckd_bundle(ckd_dir)
+        bundle = CKDbundle(bundle_dir)
+        assert 'prnu' in bundle and 'offset' not in bundle
+        assert bundle.is_current(ckd_dir)
+
+        with CKDio(ckd_dir) as ckd:
+            res = ckd.prnu()
+            assert isinstance(res.value, np.memmap)
+            assert np.array_equal(res.value, prnu.value)
+            assert np.array_equal(res.error, prnu.error)
+            assert res.long_name == prnu.long_name
+            for dims, dims_ref in zip(res.coords, prnu.coords):
+                assert np.array_equal(dims, dims_ref)
+            assert np.array_equal(ckd.dpqf(), dpqf)
+
+            # modifications are not written to the bundle
+            res.value[...] = 0
+            assert np.array_equal(ckd.prnu().value, prnu.value)
+
+        # a bundle of modified CKD products is not used
+        dpqf_file = ckd_dir / 'dynamic' / 'ckd.dpqf.detector4.nc'
+        stat = dpqf_file.stat()
+        os.utime(dpqf_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert not bundle.is_current(ckd_dir)
+        with CKDio(ckd_dir) as ckd:
+            assert not isinstance(ckd.prnu().value, np.memmap)
+
+
+if __name__ == '__main__':
+    test_ckd_bundle()
@@ -0,0 +1,110 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.ckd_cache
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from datetime import datetime
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..ckd_cache import CKDcache, ckd_cache
+from ..ckd_io import CKDio
+
+HEADER = '/METADATA/earth_exploirer_header/fixed_header/validity_period'
+
+
+#-------------------------
+def _write_ckd_dir(ckd_dir):
+    """
+    Write two small Static CKD products and a dynamic DPQF product
+    """
+    dtype = np.dtype([('value', 'f4'), ('error', 'f4')])
+    (ckd_dir / 'static').mkdir()
+    (ckd_dir / 'dynamic').mkdir()
+    for ii, period in enumerate((('20180101T000000', '20181231T235959'),
+                                 ('20190101T000000', '20991231T235959'))):
+        flname = 'S5P_TEST_AUX_L1_CKD_{}_{}'.format(*period)
+        with h5py.File(ckd_dir / 'static' / flname, 'w') as fid:
+            grp = fid.create_group(HEADER)
+            grp.attrs['Validity_Start'] = period[0].encode('ascii')
+            grp.attrs['Validity_Stop'] = period[1].encode('ascii')
+            for band in '78':
+                buff = np.empty((257, 5), dtype=dtype)
+                buff['value'] = ii + int(band)
+                buff['error'] = 0.
+                fid.create_dataset('BAND{}/PRNU'.format(band), data=buff)
+
+    with h5py.File(ckd_dir / 'dynamic' / 'ckd.dpqf.detector4.nc', 'w') as fid:
+        fid['BAND7/dpqf_threshold'] = np.array([0.8])
+        fid['BAND7/dpqf_map'] = np.full((257, 5), 0.5)
+        fid['BAND8/dpqf_map'] = np.full((257, 5), 0.9)
+
+
+def test_ckd_cache():
+    """
+    Read CKD's via the cache and select CKD products by validity period
+    """
+    with TemporaryDirectory() as tmp_dir:
+        ckd_dir = Path(tmp_dir)
+        _write_ckd_dir(ckd_dir)
+
+        ckd_cache().clear()
+        with CKDio(ckd_dir) as ckd:
+            assert ckd.ckd_file.name.endswith('20991231T235959')
+            prnu = ckd.prnu()
+            assert prnu.value.shape == (256, 10)
+            assert np.all(prnu.value[:, :5] == 8)
+
+            # the second read is served by the cache, as independent copy
+            hits = ckd_cache().hits
+            prnu.value[...] = 0
+            prnu = ckd.prnu()
+            assert ckd_cache().hits == hits + 1
+            assert np.all(prnu.value[:, :5] == 8)
+
+            dpqf = ckd.dpqf()
+            assert dpqf.shape == (256, 10)
+            assert np.all(dpqf[:, :5]) and not np.any(dpqf[:, 5:])
+
+        with CKDio(ckd_dir, date=datetime(2018, 6, 1)) as ckd:
+            assert ckd.ckd_file.name.endswith('20181231T235959')
+            assert np.all(ckd.prnu().value[:, :5] == 7)
+
+
+def test_ckd_cache_eviction():
+    """
+    Check that least recently used CKD's are removed from the cache
+    """
+    cache = CKDcache(max_bytes=3 * 800)
+    for key in range(4):
+        cache.get(key, lambda: np.zeros(100))
+    assert len(cache) == 3 and 0 not in cache
+
+    cache.get(1, lambda: None)
+    cache.get(4, lambda: np.zeros(100))
+    assert 1 in cache and 2 not in cache
+    assert cache.nbytes == 3 * 800
+
+    cache.resize(800)
+    assert len(cache) == 1 and 4 in cache
+
+
+if __name__ == '__main__':
+    test_ckd_cache()
+    test_ckd_cache_eviction()
@@ -0,0 +1,72 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on the modules loaded by the import of pys5p
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+import subprocess
+import sys
+
+# - global parameters ------------------------------
+# packages which should not be loaded by the I/O modules
+HEAVY_PACKAGES = ('cartopy', 'matplotlib', 'shapely')
+
+# modules which should not be loaded by 'import pys5p'
+LAZY_MODULES = ('h5py', 'netCDF4', 'pys5p.ckd_io', 'pys5p.icm_io',
+                'pys5p.l1b_io', 'pys5p.lv2_io', 'pys5p.ocm_io',
+                'pys5p.s5p_hdf5', 'pys5p.s5p_plot', 'pys5p.s5p_geoplot')
+
+LOADED_MODULES = """
+import json, sys
+import pys5p
+imported = sorted(sys.modules)
+pys5p.l1b_io.L1BioRAD
+print(json.dumps({'import': imported, 'l1b_io': sorted(sys.modules)}))
+"""
+
+
+# - local functions --------------------------------
+def loaded_modules():
+    """
+    Returns the modules loaded by 'import pys5p' and by the access of
+    L1BioRAD, in a new interpreter
+    """
+    proc = subprocess.run([sys.executable, '-c', LOADED_MODULES],
+                          stdout=subprocess.PIPE, check=True)
+    return json.loads(proc.stdout)
+
+
+#-------------------------
+def test_import():
+    """
+    Check that 'import pys5p' loads no submodules, and that the I/O
+    modules are imported without the plotting packages
+    """
+    import pys5p
+
+    assert 's5p_plot' in dir(pys5p)
+    res = loaded_modules()
+    for name in LAZY_MODULES + HEAVY_PACKAGES:
+        assert name not in res['import'], \
+            '{} is loaded by import pys5p'.format(name)
+    assert 'pys5p.l1b_io' in res['l1b_io']
+    for name in HEAVY_PACKAGES:
+        assert name not in res['l1b_io'], \
+            '{} is loaded by pys5p.l1b_io'.format(name)
+
+
+if __name__ == '__main__':
+    test_import()
@@ -141,7 +141,372 @@ def test_rd_rad(icid=4, msm_dset='radiance'):
     print(msm_dset, l1b.get_msm_data(msm_dset, icid=icid).shape)
     l1b.close()
 
+def test_msm_index():
+    """
+    Compare the index of the measurements with a per-sequence reference
+    """
+    import numpy as np
+
+    from ..l1b_io import msm_index
+
+    rng = np.random.RandomState(42)
+    icid_list = np.repeat(rng.choice([4, 6, 8], 40), rng.randint(1, 9, 40))
+    delta_time = np.cumsum(rng.choice([1080, 1080, 1080, 20000],
+                                      icid_list.size))
+    index = msm_index(icid_list, delta_time, 1080.)
+
+    # reference: loop over the sequences
+    buff_icid = np.concatenate(([-10], icid_list, [icid_list[-1] + 10]))
+    buff_time = np.concatenate(([delta_time[0] - 10**6], delta_time,
+                                [delta_time[-1] + 10**6]))
+    indx = np.where((np.diff(buff_time) > 10800.)
+                    | (np.diff(buff_icid) != 0))[0]
+    sequence = np.zeros(icid_list.size, dtype='u2')
+    for ii in range(len(indx) - 1):
+        sequence[indx[ii]:indx[ii+1]] = ii
+    assert np.array_equal(index.sequence, sequence)
+    assert not index.sequence.flags.writeable
+
+    for icid in (4, 6, 8):
+        indx = np.flatnonzero(icid_list == icid)
+        assert np.array_equal(index.indices(icid), indx)
+        assert index.size(icid) == indx.size
+        for ibgn, iend in index.runs[icid]:
+            assert np.all(icid_list[ibgn:iend] == icid)
+    assert index.size(5) == 0
+
+
+def _write_l1b_rad(flname, icid_list):
+    """
+    Write a small radiance product with the measurements of one band
+    """
+    import h5py
+    import numpy as np
+
+    fillvalue = float.fromhex('0x1.ep+122')
+    (nscans, nrows, ncols) = (icid_list.size, 5, 7)
+    rng = np.random.RandomState(42)
+    with h5py.File(flname, 'w') as fid:
+        grp = fid.create_group('BAND7_RADIANCE/STANDARD_MODE')
+        grp['scanline'] = np.arange(nscans)
+        grp['ground_pixel'] = np.arange(nrows)
+
+        sgrp = grp.create_group('INSTRUMENT')
+        buff = np.zeros((1, nscans), dtype=[('ic_id', 'u2')])
+        buff['ic_id'] = icid_list
+        sgrp['instrument_configuration'] = buff
+        buff = np.zeros((nscans,), dtype=[('master_cycle_period_us', 'u4'),
+                                          ('int_delay', 'u4'),
+                                          ('int_hold', 'u4')])
+        buff['master_cycle_period_us'] = 1080000
+        buff['int_hold'] = 13000
+        sgrp['instrument_settings'] = buff
+        buff = np.zeros((1, nscans), dtype=[('temp_det_ts1', 'f4')])
+        buff['temp_det_ts1'] = rng.normal(140, 0.1, nscans)
+        sgrp['housekeeping_data'] = buff
+
+        sgrp = grp.create_group('OBSERVATIONS')
+        sgrp['time'] = np.array([283996800])
+        sgrp['delta_time'] = 1080 * np.arange(nscans).reshape(1, nscans)
+        data = rng.normal(size=(1, nscans, nrows, ncols)).astype('f4')
+        data[0, ::3, 0, 0] = fillvalue
+        dset = sgrp.create_dataset('radiance', data=data,
+                                   chunks=(1, 4, nrows, ncols))
+        dset.attrs['_FillValue'] = np.float32(fillvalue)
+        for name in ('radiance_error', 'radiance_noise'):
+            dset = sgrp.create_dataset(name, data=rng.randint(
+                10, 40, (1, nscans, nrows, ncols)).astype('i1'))
+            dset.attrs['_FillValue'] = np.int8(-127)
+        sgrp['quality_level'] = rng.randint(
+            0, 101, (1, nscans, nrows, ncols)).astype('u1')
+        sgrp.create_dataset('spectral_channel_quality', data=rng.randint(
+            0, 256, (1, nscans, nrows, ncols)).astype('u1'),
+                            chunks=(1, 4, nrows, 4))
+
+        sgrp = grp.create_group('GEODATA')
+        for name in ('latitude', 'longitude'):
+            sgrp[name] = rng.uniform(-90, 90, (1, nscans, nrows)).astype('f4')
+
+
+def test_rad_icid():
+    """
+    Read measurements with a given ICID from a small radiance product
+    """
+    from tempfile import TemporaryDirectory
+
+    import h5py
+    import numpy as np
+
+    from ..l1b_io import L1BioRAD
+
+    icid_list = np.repeat([4, 6, 4, 8, 4, 6], [3, 2, 5, 1, 2, 4])
+    with TemporaryDirectory() as tmp_dir:
+        flname = str(Path(tmp_dir) / 'S5P_TEST_L1B_RA_BD7.nc')
+        _write_l1b_rad(flname, icid_list)
+        with h5py.File(flname, 'r') as fid:
+            grp = fid['BAND7_RADIANCE/STANDARD_MODE']
+            radiance = grp['OBSERVATIONS/radiance'][0, ...]
+            hkdata = grp['INSTRUMENT/housekeeping_data'][0, :]
+            latitude = grp['GEODATA/latitude'][0, ...]
+
+        with L1BioRAD(flname) as l1b:
+            assert l1b.select() == '7'
+            for icid in (4, 6, 8):
+                mask = icid_list == icid
+                res = l1b.get_msm_data('radiance', icid=icid)
+                assert np.array_equal(res, radiance[mask])
+                res = l1b.get_msm_data('radiance', icid=icid,
+                                       fill_as_nan=True)
+                assert np.isnan(res[:, 0, 0]).sum() \
+                    == (radiance[mask, 0, 0] > 1e30).sum()
+
+                res = l1b.get_housekeeping_data(icid=icid)
+                assert np.array_equal(res, hkdata[mask])
+
+                geo = l1b.get_geo_data(icid=icid)
+                assert np.array_equal(geo['latitude'], latitude[mask])
+                assert np.array_equal(geo['sequence'][:, 0],
+                                      l1b.imsm['sequence'][mask])
+
+            geo = l1b.get_geo_data()
+            assert np.array_equal(geo['sequence'][:, -1],
+                                  l1b.imsm['sequence'])
+
+
+def test_rad_iter_scanlines():
+    """
+    Read a small radiance product in blocks of scanlines
+    """
+    from tempfile import TemporaryDirectory
+
+    import h5py
+    import numpy as np
+
+    from ..l1b_io import L1BioRAD
+
+    icid_list = np.repeat([4, 6, 4, 8, 4, 6], [3, 2, 5, 1, 2, 4])
+    with TemporaryDirectory() as tmp_dir:
+        flname = str(Path(tmp_dir) / 'S5P_TEST_L1B_RA_BD7.nc')
+        _write_l1b_rad(flname, icid_list)
+        with h5py.File(flname, 'r') as fid:
+            grp = fid['BAND7_RADIANCE/STANDARD_MODE']
+            quality = grp['OBSERVATIONS/quality_level'][0, ...]
+            latitude = grp['GEODATA/latitude'][0, ...]
+
+        with L1BioRAD(flname) as l1b:
+            l1b.select()
+            radiance = l1b.get_msm_data('radiance', fill_as_nan=True)
+
+            # blocks are aligned with the chunks of 4 scanlines
+            res = list(l1b.iter_scanlines('radiance', block=3))
+            assert [x.scanline.start for x in res] == [0, 4, 8, 12, 16]
+            assert res[0].geo is None and res[0].quality is None
+
+            buff = np.empty_like(radiance)
+            for scans in l1b.iter_scanlines('radiance', block=8,
+                                            geo_dset='latitude',
+                                            quality_dset='quality_level',
+                                            fill_as_nan=True):
+                assert scans.data.shape[0] <= 8
+                buff[scans.scanline] = scans.data
+                assert np.array_equal(scans.geo['latitude'],
+                                      latitude[scans.scanline])
+                assert np.array_equal(scans.quality['quality_level'],
+                                      quality[scans.scanline])
+            assert np.array_equal(buff, radiance, equal_nan=True)
+
+            for icid in (4, 6, 8):
+                res = [x.data.copy() for x in l1b.iter_scanlines(
+                    'radiance', block=4, icid=icid)]
+                assert np.array_equal(np.concatenate(res),
+                                      l1b.get_msm_data('radiance',
+                                                       icid=icid))
+
+
+def test_rad_patch_flags():
+    """
+    Set and clear flags in a small radiance product
+    """
+    from tempfile import TemporaryDirectory
+
+    import h5py
+    import numpy as np
+
+    from ..l1b_io import L1BioRAD
+
+    icid_list = np.repeat([4, 6, 4, 8, 4, 6], [3, 2, 5, 1, 2, 4])
+    ds_name = 'BAND7_RADIANCE/STANDARD_MODE/OBSERVATIONS/{}'
+    with TemporaryDirectory() as tmp_dir:
+        flname = str(Path(tmp_dir) / 'S5P_TEST_L1B_RA_BD7.nc')
+        _write_l1b_rad(flname, icid_list)
+        with h5py.File(flname, 'r') as fid:
+            flags = fid[ds_name.format('spectral_channel_quality')][0, ...]
+
+        with L1BioRAD(flname) as l1b:
+            l1b.select()
+            try:
+                l1b.patch_flags('spectral_channel_quality', set_bits=2)
+            except PermissionError:
+                pass
+            else:
+                raise AssertionError('read/write access required')
+
+        # only the bad pixels in the first four columns are modified
+        bad_pixels = np.zeros(flags.shape[1:], dtype=bool)
+        bad_pixels[1, 2] = True
+        with L1BioRAD(flname, readwrite=True) as l1b:
+            l1b.select()
+            nchunks = l1b.patch_flags('spectral_channel_quality',
+                                      set_bits=np.where(bad_pixels, 2, 0))
+            ref = flags | np.where(bad_pixels, 2, 0).astype('u1')
+            changed = ref != flags
+            assert not np.any(changed[..., 4:])
+            assert nchunks == sum(np.any(changed[ii:ii + 4, ...])
+                                  for ii in range(0, flags.shape[0], 4))
+            assert l1b.patch_flags('spectral_channel_quality',
+                                   set_bits=np.where(bad_pixels, 2, 0)) == 0
+
+            nchunks = l1b.patch_flags('quality_level', clear_bits=0xFF,
+                                      set_bits=50, icid=6)
+            assert nchunks == 2          # two runs of ICID 6
+        with h5py.File(flname, 'r') as fid:
+            res = fid[ds_name.format('spectral_channel_quality')][0, ...]
+            assert res.dtype == np.uint8
+            assert np.array_equal(res, ref)
+            res = fid[ds_name.format('quality_level')][0, ...]
+            assert np.all(res[icid_list == 6] == 50)
+            assert 'SRON_METADATA' in fid['METADATA']
+
+
+def test_l1b_collection():
+    """
+    Read measurements of several radiance products with L1BCollection
+    """
+    from tempfile import TemporaryDirectory
+
+    import numpy as np
+
+    from ..l1b_collection import L1BCollection
+    from ..l1b_io import L1BioRAD
+
+    icid_list = np.repeat([4, 6, 4, 8, 4, 6], [3, 2, 5, 1, 2, 4])
+    with TemporaryDirectory() as tmp_dir:
+        flnames = []
+        for orbit in range(4):
+            flname = str(Path(tmp_dir)
+                         / 'S5P_TEST_L1B_RA_BD7_{:05d}.nc'.format(orbit))
+            _write_l1b_rad(flname, np.roll(icid_list, orbit))
+            flnames.append(flname)
+
+        ref = []
+        for flname in flnames:
+            with L1BioRAD(flname) as l1b:
+                l1b.select()
+                ref.append(l1b.get_msm_data('radiance', icid=4))
+
+        for use_threads in (True, False):
+            with L1BCollection(str(Path(tmp_dir) / 'S5P_*.nc'), max_workers=2,
+                               prefetch=1, use_threads=use_threads) as l1b:
+                assert len(l1b) == len(flnames)
+                assert l1b.select() == ['7'] * len(flnames)
+                for ii, (flname, res) in enumerate(
+                        l1b.iter_msm_data('radiance', icid=4)):
+                    assert flname == flnames[ii]
+                    assert np.array_equal(res, ref[ii])
+
+                res = l1b.get_msm_data('radiance', icid=4)
+                assert np.array_equal(res, np.concatenate(ref))
+                geo = l1b.get_geo_data(icid=4)
+                assert geo.shape == res.shape[:2]
+
+                # products without the measurement group are skipped
+                assert l1b.select('UNKNOWN_MODE') == [''] * len(flnames)
+                assert l1b.get_msm_data('radiance') is None
+
+        # close while reads are prefetched, the pending reads are cancelled
+        l1b = L1BCollection(flnames, max_workers=1, prefetch=3)
+        l1b.select()
+        (flname, res) = next(l1b.iter_msm_data('radiance', icid=4))
+        assert np.array_equal(res, ref[0])
+        l1b.close()
+        try:
+            l1b.get_msm_data('radiance')
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('closed collection is not checked')
+
+
+def test_msm_selection():
+    """
+    Read frames, rows and columns of calibration and irradiance products,
+    with column ranges across the band 7/8 boundary
+    """
+    from tempfile import TemporaryDirectory
+
+    import numpy as np
+
+    from ..l1b_io import L1BioCAL, L1BioIRR
+    from ..s5p_synth import SIZES, write_products
+    from ..swir_region import coords
+
+    ncols = SIZES['small']['det_cols']
+    with TemporaryDirectory() as tmp_dir:
+        products = write_products(tmp_dir, size='small')
+
+        with L1BioCAL(products['l1b_cal']) as l1b:
+            l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+            full = l1b.get_msm_data('signal', fill_as_nan=True)
+            for kwargs in ({'columns': [ncols - 5, ncols + 7]},
+                           {'columns': [ncols - 1, ncols + 5]},
+                           {'columns': [ncols - 5, ncols + 1]},
+                           {'columns': [ncols - 1, ncols + 1]},
+                           {'columns': [2, 9], 'rows': [3, 20]},
+                           {'columns': [ncols + 1, 2 * ncols - 1]},
+                           {'frames': [1, 3], 'rows': [10, 12]},
+                           {'columns': np.s_[ncols // 2:-3]}):
+                res = l1b.get_msm_data('signal', fill_as_nan=True, **kwargs)
+                ref = full[slice(*kwargs.get('frames', (None,))),
+                           slice(*kwargs.get('rows', (None,))), :]
+                columns = kwargs.get('columns', (None,))
+                if not isinstance(columns, slice):
+                    columns = slice(*columns)
+                assert np.array_equal(res, ref[..., columns], equal_nan=True)
+
+            # select a window of band 8 only
+            res = l1b.get_msm_data('signal', band='8', columns=[10, 20])
+            assert res.shape[-1] == 10
+
+            # columns of a dataset without spectral_channel dimension
+            try:
+                l1b.get_msm_data('delta_time', columns=[10, 20])
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('selection of columns is ignored')
+
+        with L1BioIRR(products['l1b_irr']) as l1b:
+            l1b.select()
+            full = l1b.get_msm_data('irradiance')
+            region = coords('level2')
+            rows = slice(region[0].start, min(region[0].stop,
+                                               full.shape[-2]))
+            for (first, last) in ((ncols - 3, ncols + 3),
+                                  (ncols - 1, ncols + 3),
+                                  (ncols - 3, ncols + 1)):
+                res = l1b.get_msm_data('irradiance', rows=rows,
+                                       columns=[first, last])
+                assert np.array_equal(res, full[..., rows, first:last],
+                                      equal_nan=True)
+
+
 if __name__ == '__main__':
+    test_msm_index()
+    test_rad_icid()
+    test_rad_iter_scanlines()
+    test_rad_patch_flags()
+    test_l1b_collection()
+    test_msm_selection()
     test_rd_calib()
     test_rd_irrad()
     test_rd_rad()
@@ -41,6 +41,11 @@ def _main():
                         help='compare patched datasets with original')
     parser.add_argument('-o', '--output', default='/tmp',
                         help='directory to store patched product')
+    parser.add_argument('--overlay', action='store_true',
+                        help=('write only the patched datasets to an overlay'
+                              ' of the original product'))
+    parser.add_argument('--materialize', action='store_true',
+                        help='write the complete product of the overlay')
     parser.add_argument('--quiet', dest='verbose', action='store_false',
                         default=True, help='only show error messages')
     args = parser.parse_args()
@@ -51,7 +56,7 @@ def _main():
         parser.exit()
 
     with L1Bpatch(args.l1b_product, data_dir=args.output,
-                  ckd_dir=args.ckd_dir) as l1b_patch:
+                  ckd_dir=args.ckd_dir, overlay=args.overlay) as l1b_patch:
         if args.patch == 'pixel_quality':
             with CKDio(args.ckd_dir) as ckd:
                 dpqm = ckd.pixel_quality()
@@ -59,29 +64,20 @@ def _main():
             l1b_patch.pixel_quality(dpqm.value)
             print('INFO: applied patch pixel_qualtiy')
 
-        if args.patch == 'offset':
-            l1b_patch.offset()
-            print('WARNING: patch offset not yet implemented')
-
-        if args.patch == 'darkflux':
-            l1b_patch.darkflux()
-            print('WARNING: patch dark-flux not yet implemented')
-
-        if args.patch == 'prnu':
-            l1b_patch.prnu()
-            print('WARNING: patch prnu not yet implemented')
+        if args.patch in ('offset', 'darkflux', 'prnu', 'absrad'):
+            l1b_patch.recalibrate([args.patch])
+            print('INFO: applied patch {}'.format(args.patch))
 
         if args.patch == 'relrad':
-            l1b_patch.relrad()
-            print('WARNING: patch relrad not yet implemented')
-
-        if args.patch == 'absrad':
-            l1b_patch.absrad()
-            print('WARNING: patch absrad not yet implemented')
+            print('WARNING: patch relrad requires an alternative CKD,'
+                  ' which is not provided by CKDio')
 
         if args.check:
             l1b_patch.check()
 
+        if args.overlay and args.materialize:
+            print('INFO: written {}'.format(l1b_patch.materialize()))
+
 
 # --------------------------------------------------
 if __name__ == '__main__':
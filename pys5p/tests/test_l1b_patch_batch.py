@@ -0,0 +1,76 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.l1b_patch_batch
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..l1b_patch_batch import patch_products
+from .test_l1b_io import _write_l1b_rad
+
+
+#-------------------------
+def test_patch_products():
+    """
+    Patch a batch of small radiance products, one of them is corrupt
+    """
+    with TemporaryDirectory() as tmp_dir:
+        l1b_products = []
+        for orbit in range(3):
+            flname = Path(tmp_dir) / \
+                'S5P_OFFL_L1B_RA_BD7_20190101_01_{:06d}.nc'.format(orbit)
+            _write_l1b_rad(str(flname), np.repeat([4, 6], [8, 8]))
+            l1b_products.append(flname)
+        l1b_products[1].write_bytes(b'not a HDF5 product')
+
+        out_dir = Path(tmp_dir) / 'patched'
+        ckd_orig = {'offset': np.full((5, 7), 100.),
+                    'darkflux': np.full((5, 7), 20.),
+                    'prnu': np.ones((5, 7)),
+                    'absrad': np.full((5, 7), 2e-3)}
+        ckds = {'offset': np.full((5, 7), 101.),
+                'darkflux': np.full((5, 7), 19.)}
+        res = patch_products(l1b_products, ['offset', 'darkflux'],
+                             data_dir=out_dir, max_workers=2, ckds=ckds,
+                             ckd_orig=ckd_orig)
+        assert [x['status'] for x in res] == ['ok', 'failed', 'ok']
+        # the calibration steps are applied in one pass
+        assert [x['name'] for x in res[0]['steps']] == ['offset,darkflux']
+        assert 'OSError' in res[1]['error']
+
+        for flname, manifest in zip(l1b_products, res):
+            with open(out_dir / (flname.stem + '.manifest.json')) as fp:
+                assert json.load(fp)['status'] == manifest['status']
+
+        with h5py.File(res[2]['patched'], 'r') as fid:
+            assert 'SRON_METADATA' in fid['/METADATA']
+
+        # overlay mode
+        res = patch_products(l1b_products[:1], ['offset'], data_dir=out_dir,
+                             max_workers=1, overlay=True, ckds=ckds,
+                             ckd_orig=ckd_orig)
+        assert res[0]['status'] == 'ok'
+        assert res[0]['patched'].endswith('.overlay.nc')
+
+
+if __name__ == '__main__':
+    test_patch_products()
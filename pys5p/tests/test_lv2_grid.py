@@ -0,0 +1,104 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.lv2_grid
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from ..lv2_grid import L2grid, grid_products
+from ..lv2_io import LV2io
+from ..s5p_synth import write_lv2
+
+NAME = 'methane_mixing_ratio'
+
+
+#-------------------------
+def test_lv2_grid():
+    """
+    Grid synthetic level 2 products, one crosses the antimeridian
+    """
+    with TemporaryDirectory() as tmp_dir:
+        products = [write_lv2(Path(tmp_dir) / 'lv2_{}.nc'.format(ii),
+                              nscans=120, npixels=16, lon_center=lon,
+                              seed=ii)
+                    for ii, lon in enumerate((-60., 25., 179.))]
+
+        # binning by pixel centers, all valid pixels are counted once
+        nvalid = 0
+        values = []
+        for flname in products:
+            with LV2io(flname) as lv2:
+                data = lv2.get_dataset(NAME)
+                nvalid += np.isfinite(data).sum()
+                values.append(data[np.isfinite(data)])
+        values = np.concatenate(values)
+
+        grid = grid_products(products, NAME, resolution=2., max_workers=1)
+        assert not grid.failed
+        assert grid.shape == (90, 180)
+        assert np.isclose(grid.count.sum(), nvalid)
+        assert np.isclose(grid.sum.sum(), values.sum())
+        assert np.nanmin(grid.mean) >= values.min()
+        assert np.nanmax(grid.weighted_mean) <= values.max()
+        assert grid.min[grid.count > 0].min() == values.min()
+        assert grid.max[grid.count > 0].max() == values.max()
+
+        # parallel gridding gives the same result
+        res = grid_products(products, NAME, resolution=2., max_workers=2)
+        assert sorted(res.products) == sorted(str(x) for x in products)
+        assert np.allclose(res.count, grid.count)
+        assert np.allclose(res.weighted_sum, grid.weighted_sum)
+
+        # oversampling, each pixel has a total weight of one
+        res = grid_products(products, NAME, resolution=2., oversample=3,
+                            max_workers=1)
+        assert np.isclose(res.count.sum(), nvalid)
+        assert np.count_nonzero(res.count) >= np.count_nonzero(grid.count)
+
+        # write incremental, the gridded products are skipped
+        flname = Path(tmp_dir) / 'grid.h5'
+        grid_products(products[:2], NAME, flname, resolution=2.,
+                      max_workers=1, checkpoint=1)
+        res = grid_products(products, NAME, flname, resolution=2.,
+                            max_workers=1)
+        assert len(res.products) == 3
+        assert np.allclose(res.count, grid.count)
+        assert not Path(str(flname) + '.tmp').exists()
+        res = L2grid.read(flname)
+        assert res.name == NAME
+        assert np.allclose(res.sum, grid.sum)
+
+        # an other grid definition is refused
+        try:
+            grid_products(products, NAME, flname, resolution=1.)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('grid definition is not checked')
+
+        # regional grid across the antimeridian
+        grid = L2grid(0.5, (170., -170., -30., 30.))
+        assert grid.shape == (120, 40)
+        grid.add([175., -175., 0.], [0., 0., 0.], [1., 3., 5.])
+        assert grid.count.sum() == 2
+        assert np.nansum(grid.mean) == 4
+
+
+if __name__ == '__main__':
+    test_lv2_grid()
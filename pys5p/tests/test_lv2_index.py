@@ -0,0 +1,90 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.lv2_index
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..lv2_index import GeoIndex, extent_mask, geo_index, sidecar_name
+from ..lv2_io import LV2io
+from ..s5p_synth import write_lv2
+
+
+#-------------------------
+def test_lv2_index():
+    """
+    Compare extent queries using the spatial index with a full search
+    """
+    with TemporaryDirectory() as tmp_dir:
+        # the swath crosses the antimeridian
+        flname = write_lv2(Path(tmp_dir) / 'lv2.nc', nscans=400,
+                           npixels=24, lon_center=178., seed=1)
+        with h5py.File(flname, 'r') as fid:
+            lats = fid['/PRODUCT/latitude'][0, ...]
+            lons = fid['/PRODUCT/longitude'][0, ...]
+
+        def read_latlon(first, last):
+            read_latlon.nread += last - first
+            return (lats[first:last, :], lons[first:last, :])
+
+        read_latlon.nread = 0
+        index = geo_index(flname, read_latlon, lats.shape[0], block=16)
+        assert len(index) == 25
+        assert read_latlon.nread == lats.shape[0]
+        assert sidecar_name(flname).is_file()
+
+        # the index is read from the sidecar
+        loaded = GeoIndex.load(sidecar_name(flname))
+        assert loaded.stamp == index.stamp
+        assert np.array_equal(loaded.lon_width, index.lon_width)
+
+        # a truncated sidecar is replaced by a rebuilt index
+        sidecar = sidecar_name(flname)
+        sidecar.write_bytes(sidecar.read_bytes()[:100])
+        read_latlon.nread = 0
+        index32 = geo_index(flname, read_latlon, lats.shape[0], block=32)
+        assert read_latlon.nread == lats.shape[0]
+        assert GeoIndex.load(sidecar).block == 32
+        assert list(Path(tmp_dir).glob('*.tmp')) == []
+        assert np.array_equal(index32.select(read_latlon, [0, 10, -10, 10]),
+                              index.select(read_latlon, [0, 10, -10, 10]))
+
+        for extent in ([170, 179, -10, 10], [175, -175, -20, 20],
+                       [-180, 180, 60, 70], [0, 10, -10, 10]):
+            read_latlon.nread = 0
+            res = index.select(read_latlon, extent)
+            ref = np.nonzero(extent_mask(lons, lats, extent))
+            assert np.array_equal(res[0], ref[0])
+            assert np.array_equal(res[1], ref[1])
+            if ref[0].size == 0:
+                assert read_latlon.nread == 0
+            else:
+                assert read_latlon.nread < lats.shape[0]
+
+        with LV2io(flname) as lv2:
+            (data_sel, res) = lv2.get_geo_bounds(
+                extent=[175, -175, -20, 20])
+            ref = np.nonzero(extent_mask(lons, lats, [175, -175, -20, 20]))
+            assert data_sel[1] == slice(ref[0].min(), ref[0].max())
+            assert data_sel[2] == slice(ref[1].min(), ref[1].max())
+
+
+if __name__ == '__main__':
+    test_lv2_index()
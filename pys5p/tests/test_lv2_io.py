@@ -0,0 +1,120 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on the netCDF4 read path of pys5p.lv2_io, using a stub of
+a netCDF4 variable
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+from ..lv2_io import LV2io, _scanline_range
+
+NSCANLINE = 50
+NPIXEL = 8
+
+
+class _Variable():
+    """
+    Stub of a netCDF4 variable, records the number of values read
+    """
+    def __init__(self, data, **attrs):
+        self.data = data
+        self.mask = True
+        self.nread = 0
+        for key, value in attrs.items():
+            setattr(self, key, value)
+
+    def set_auto_mask(self, value):
+        self.mask = value
+
+    def __getitem__(self, sel):
+        assert not self.mask
+        res = self.data[sel].copy()
+        self.nread += res.shape[0]
+        return res
+
+
+#-------------------------
+def test_scanline_range():
+    """
+    Map selections of (scanline, ground_pixel) to a range of scanlines
+    """
+    assert _scanline_range(None, NSCANLINE) == (0, NSCANLINE, ())
+    assert _scanline_range(np.s_[3], NSCANLINE) == (3, 4, (0,))
+    assert _scanline_range(np.s_[-1, 2], NSCANLINE) \
+        == (NSCANLINE - 1, NSCANLINE, (0, 2))
+    assert _scanline_range(np.s_[10:20, 2:5], NSCANLINE) \
+        == (10, 20, (slice(None), slice(2, 5)))
+    assert _scanline_range(np.s_[5:5], NSCANLINE) == (5, 5, (slice(None),))
+    assert _scanline_range(np.s_[::2, 1:3], NSCANLINE) is None
+    assert _scanline_range(np.s_[..., 1], NSCANLINE) is None
+    try:
+        _scanline_range(np.s_[NSCANLINE], NSCANLINE)
+    except IndexError:
+        pass
+    else:
+        raise AssertionError('scanline range is not checked')
+
+
+def test_nc_rows():
+    """
+    Read selections of flattened netCDF4 variables
+    """
+    lv2 = LV2io.__new__(LV2io)
+    (lv2.scanline, lv2.ground_pixel) = (NSCANLINE, NPIXEL)
+    nc_rows = lv2._LV2io__nc_rows
+
+    data = np.arange(NSCANLINE * NPIXEL, dtype='f4')
+    data[17] = -999.
+    data[18] = -1.
+    corners = np.arange(NSCANLINE * NPIXEL * 4,
+                        dtype='f4').reshape(-1, 4)
+    ref = data.reshape(NSCANLINE, NPIXEL).copy()
+    ref[ref < 0] = np.nan
+    ref_corners = corners.reshape(NSCANLINE, NPIXEL, 4)
+
+    for data_sel, nread in ((None, NSCANLINE), (np.s_[3], 1),
+                            (np.s_[-1, ::2], 1),
+                            (np.s_[10:20, 2:5], 10),
+                            (np.s_[::2, 1:3], NSCANLINE),
+                            (np.s_[..., 1], NSCANLINE)):
+        var = _Variable(data, _FillValue=np.float32(-999.),
+                        missing_value=np.float32(-1.))
+        res = nc_rows(var, data_sel, fill_as_nan=True)
+        assert var.mask
+        assert var.nread == nread * NPIXEL
+        assert np.array_equal(res, ref if data_sel is None
+                              else ref[data_sel], equal_nan=True)
+
+        var = _Variable(corners)
+        res = nc_rows(var, data_sel)
+        if data_sel is None:
+            assert np.array_equal(res, ref_corners)
+        else:
+            assert np.array_equal(res, ref_corners[data_sel])
+
+    # values outside valid_range are replaced, the auto-mask is restored
+    var = _Variable(data, _FillValue=np.float32(-999.),
+                    valid_range=(0., 100.))
+    var.mask = False
+    res = nc_rows(var, np.s_[:20], fill_as_nan=True)
+    assert not var.mask
+    assert np.isnan(res).sum() == np.sum((data[:20 * NPIXEL] < 0)
+                                         | (data[:20 * NPIXEL] > 100))
+
+
+if __name__ == '__main__':
+    test_scanline_range()
+    test_nc_rows()
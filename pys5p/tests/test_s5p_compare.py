@@ -0,0 +1,86 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_compare
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..s5p_compare import compare_datasets
+
+
+#-------------------------
+def test_compare_datasets():
+    """
+    Compare datasets chunk by chunk
+    """
+    fillvalue = float.fromhex('0x1.ep+122')
+    data = np.arange(24 * 10 * 6, dtype=np.float32).reshape(24, 10, 6)
+    with TemporaryDirectory() as tmp_dir:
+        flname = Path(tmp_dir) / 'compare.h5'
+        with h5py.File(flname, 'w') as fid:
+            for name in ('orig', 'patch'):
+                grp = fid.create_group(name)
+                grp.create_dataset('chunked', data=data, chunks=(4, 10, 6),
+                                   compression='gzip')
+                grp.create_dataset('contiguous', data=data)
+                grp.create_dataset('flags', data=data.astype('u1'),
+                                   chunks=(1, 10, 6))
+            dset = fid['patch/chunked']
+            dset[5, 0, 0] += 1e-3
+            dset[9, 1, 1] += 10
+            dset[13, 2, 2] = np.nan
+            dset[17, 3, 3] = fillvalue
+            fid['orig/chunked'][17, 3, 3] = np.nan
+            fid['patch/contiguous'][23, 9, 5] = 0
+            fid['patch/flags'][2, 0, 0] = 255
+
+        with h5py.File(flname, 'r') as fid:
+            res = compare_datasets(fid['orig/chunked'], fid['patch/chunked'],
+                                   fillvalue=fillvalue)
+            assert res['nchunks'] == 6
+            assert res['nchunks_raw'] == 2
+            assert res['nchunks_diff'] == 3
+            assert res['chunk_map'].ravel().tolist() \
+                == [False, True, True, True, False, False]
+            assert res['changed'] == 3
+            assert res['nan_mismatch'] == 1
+            assert np.isclose(res['max_abs_diff'], 10)
+
+            # differences within the tolerance are ignored
+            res = compare_datasets(fid['orig/chunked'], fid['patch/chunked'],
+                                   atol=0.01, fillvalue=fillvalue)
+            assert res['changed'] == 2
+            assert res['nchunks_diff'] == 2
+
+            res = compare_datasets(fid['orig/contiguous'],
+                                   fid['patch/contiguous'], max_bytes=1024)
+            assert res['chunks'] == (4, 10, 6)
+            assert res['chunk_map'].ravel().tolist() == 5 * [False] + [True]
+            assert res['changed'] == 1
+            assert res['max_rel_diff'] == 1
+
+            res = compare_datasets(fid['orig/flags'], fid['patch/flags'])
+            assert res['nchunks'] == 24
+            assert res['nchunks_raw'] == 23
+            assert res['changed'] == 1
+
+
+if __name__ == '__main__':
+    test_compare_datasets()
@@ -0,0 +1,127 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_dtype
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..icm_io import ICMio
+from ..lv2_io import LV2io
+from ..ocm_io import OCMio
+from ..s5p_dtype import read_dataset
+from ..s5p_synth import write_products
+
+
+#-------------------------
+def test_read_dataset():
+    """
+    Read datasets and products with each of the dtype policies
+    """
+    fillvalue = float.fromhex('0x1.ep+122')
+    with TemporaryDirectory() as tmp_dir:
+        flname = Path(tmp_dir) / 'test_read_dataset.h5'
+        with h5py.File(flname, 'w') as fid:
+            data = np.arange(24, dtype='f4').reshape(4, 6)
+            data[1, 2] = fillvalue
+            fid.create_dataset('signal', data=data)
+            fid.create_dataset('flags', data=np.arange(24, dtype='u1'))
+
+        with h5py.File(flname, 'r') as fid:
+            for policy, dtype in (('native', 'f4'), ('float64', 'f8'),
+                                  ('float32', 'f4')):
+                res = read_dataset(fid['signal'], np.s_[1:, :], policy,
+                                   fillvalue=fillvalue)
+                assert res.dtype == np.dtype(dtype)
+                assert res.shape == (3, 6)
+                assert np.isnan(res[0, 2])
+                assert np.isnan(read_dataset(fid['signal'], np.s_[1, 2],
+                                             policy, fillvalue=fillvalue))
+                assert read_dataset(fid['flags'], np.s_[:],
+                                    policy).dtype == np.uint8
+            try:
+                read_dataset(fid['signal'], policy='float16')
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('dtype policy is not checked')
+
+        products = write_products(tmp_dir, size='small')
+        for policy, dtype in (('native', 'f4'), ('float64', 'f8'),
+                              ('float32', 'f4')):
+            with ICMio(products['icm'], dtype=policy) as icm:
+                icm.select('BACKGROUND_RADIANCE_MODE_0005')
+                res = icm.get_msm_data('signal_avg')
+                assert res.dtype == np.dtype(dtype)
+                assert icm.get_msm_data('signal_avg',
+                                        dtype='float64').dtype == np.float64
+            with OCMio(products['ocm'], dtype=policy) as ocm:
+                ocm.select(31523)
+                for res in ocm.get_msm_data('signal').values():
+                    assert res.dtype == np.dtype(dtype)
+            with LV2io(products['lv2'], dtype=policy) as lv2:
+                res = lv2.get_dataset('methane_mixing_ratio')
+                assert res.dtype == np.dtype(dtype)
+                assert np.isnan(res).any()
+                msm = lv2.get_data_as_s5pmsm('methane_mixing_ratio')
+                assert msm.value.dtype == np.dtype(dtype)
+                assert msm.error.dtype == np.dtype(dtype)
+                assert msm.value.shape == msm.error.shape == res.shape
+                assert np.array_equal(np.isnan(msm.value), np.isnan(res))
+
+
+def test_lv2_s5pmsm():
+    """
+    Read level 2 data as S5Pmsm, compare with the conversion of the values
+    to molecules / cm^2 and FillValues of earlier versions
+    """
+    name = 'methane_mixing_ratio'
+    with TemporaryDirectory() as tmp_dir:
+        products = write_products(tmp_dir, size='small')
+        with h5py.File(products['lv2'], 'r') as fid:
+            dset = fid['/PRODUCT/{}'.format(name)]
+            value = np.squeeze(dset[...])
+            fillvalue = dset.fillvalue
+            factor = dset.attrs[
+                'multiplication_factor_to_convert_to_molecules_percm2']
+            error = fid['/PRODUCT/{}_precision'.format(name)][0, ...]
+        mask = value == fillvalue
+
+        with LV2io(products['lv2']) as lv2:
+            assert lv2.dtype == 'float64'
+            msm = lv2.get_data_as_s5pmsm(name, fill_as_nan=False)
+            assert msm.units == 'molecules / cm$^2$'
+            assert np.all(msm.value[mask] == fillvalue)
+            assert np.allclose(msm.value[~mask],
+                               value[~mask].astype(float) * factor)
+            # FillValues of the error are replaced by NaN
+            assert np.array_equal(np.isnan(msm.error), mask)
+            assert np.allclose(msm.error[~mask],
+                               error[~mask].astype(float) * factor)
+
+            msm = lv2.get_data_as_s5pmsm(name, mol_m2=True)
+            assert msm.units == 'mol / m$^2$'
+            assert np.array_equal(np.isnan(msm.value), mask)
+            assert np.array_equal(msm.value[~mask], value[~mask])
+            assert np.array_equal(msm.error[~mask], error[~mask])
+
+
+if __name__ == '__main__':
+    test_read_dataset()
+    test_lv2_s5pmsm()
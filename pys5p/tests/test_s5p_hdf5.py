@@ -0,0 +1,65 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_hdf5
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..s5p_hdf5 import (PROFILES, PRODUCT_PROFILE, benchmark_profiles,
+                        open_product, set_profile)
+
+
+#-------------------------
+def test_s5p_hdf5():
+    """
+    Open a small product with each of the file-access profiles
+    """
+    with TemporaryDirectory() as tmp_dir:
+        flname = Path(tmp_dir) / 'test_s5p_hdf5.h5'
+        with h5py.File(flname, 'w') as fid:
+            fid.create_dataset('signal', data=np.arange(4 * 50 * 20.).reshape(
+                1, 4 * 50, 20), chunks=(1, 10, 20), compression='gzip')
+
+        for profile in PROFILES:
+            with open_product(flname, profile=profile) as fid:
+                assert fid['signal'][0, 5, 5] == 105.
+                cache = fid.id.get_access_plist().get_cache()
+                if profile == 'sequential':
+                    assert cache[1:] == (40009, 256 * 2**20, 1.)
+                if profile in ('core', 'small'):
+                    assert fid.driver == 'core'
+
+        # products opened in read-write mode are not read in memory
+        with open_product(flname, mode='r+', profile='core') as fid:
+            assert fid.driver != 'core'
+
+        assert PRODUCT_PROFILE['l1b'] == 'chunked'
+        set_profile('l1b', 'sequential')
+        with open_product(flname, product='l1b') as fid:
+            cache = fid.id.get_access_plist().get_cache()
+            assert cache[2] == PROFILES['sequential']['rdcc_nbytes']
+        set_profile('l1b', 'chunked')
+
+        res = benchmark_profiles(flname, 'signal', block=10, repeat=1)
+        assert sorted(res) == sorted(PROFILES)
+
+
+if __name__ == '__main__':
+    test_s5p_hdf5()
@@ -0,0 +1,155 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_msm
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from tempfile import TemporaryDirectory
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ..s5p_msm import S5Pmsm
+
+
+#-------------------------
+def _write_product(flname):
+    """
+    Write a small HDF5 product with a frame stack and its dimensions
+    """
+    rng = np.random.RandomState(42)
+    data = rng.normal(loc=100., scale=5., size=(10, 6, 8)).astype('f4')
+    data[0, 0, 0] = float.fromhex('0x1.ep+122')
+
+    dtype = np.dtype([('value', 'f4'), ('error', 'f4')])
+    with h5py.File(flname, 'w') as fid:
+        for key, size in zip(('time', 'row', 'column'), data.shape):
+            dset = fid.create_dataset(key, data=np.arange(size) + 1)
+            dset.make_scale(key)
+        dset = fid.create_dataset('signal', data=data,
+                                  fillvalue=float.fromhex('0x1.ep+122'))
+        dset.attrs['units'] = 'V'
+        dset.attrs['long_name'] = 'signal'
+        buff = np.empty(data.shape, dtype=dtype)
+        buff['value'] = data
+        buff['error'] = data / 10
+        dpt = fid.create_dataset('signal_dpt', data=buff)
+        for ii, key in enumerate(('time', 'row', 'column')):
+            dset.dims[ii].attach_scale(fid[key])
+            dpt.dims[ii].attach_scale(fid[key])
+
+
+def test_s5p_msm_lazy():
+    """
+    Compare lazy S5Pmsm objects with S5Pmsm objects read at initialization
+    """
+    with TemporaryDirectory() as tmp_dir:
+        flname = str(Path(tmp_dir) / 'test_s5p_msm.h5')
+        _write_product(flname)
+
+        with h5py.File(flname, 'r') as fid:
+            for name, datapoint in (('signal', False), ('signal_dpt', True)):
+                dset = fid[name]
+                for data_sel in (None, np.s_[1:-1, :, :], np.s_[2, 1:5, :],
+                                 np.s_[::2, 3, :], np.s_[[0, 2, 4], ...]):
+                    msm = S5Pmsm(dset, data_sel=data_sel, datapoint=datapoint)
+                    lazy = S5Pmsm(dset, data_sel=data_sel,
+                                  datapoint=datapoint, lazy=True)
+                    assert 'value' not in lazy.__dict__
+                    assert lazy.units == msm.units
+                    assert lazy.fillvalue == msm.fillvalue
+                    assert np.array_equal(lazy.value, msm.value)
+                    if datapoint:
+                        assert np.array_equal(lazy.error, msm.error)
+                    assert lazy.coords._fields == msm.coords._fields
+                    for dims, ref in zip(lazy.coords, msm.coords):
+                        assert np.array_equal(dims, ref)
+
+                # reductions read only the selected frames
+                msm = S5Pmsm(dset, datapoint=datapoint)
+                lazy = S5Pmsm(dset, datapoint=datapoint, lazy=True)
+                msm.fill_as_nan()
+                lazy.fill_as_nan()
+                msm.nanmedian(data_sel=np.s_[1:-1, ...], axis=0)
+                lazy.nanmedian(data_sel=np.s_[1:-1, ...], axis=0)
+                assert np.array_equal(lazy.value, msm.value, equal_nan=True)
+                assert np.array_equal(lazy.error, msm.error, equal_nan=True)
+                assert lazy.coords._fields == ('row', 'column')
+
+                msm = S5Pmsm(dset, datapoint=datapoint)
+                lazy = S5Pmsm(dset, datapoint=datapoint, lazy=True)
+                msm.biweight(data_sel=np.s_[:, 1:4, ::2], axis=0)
+                lazy.biweight(data_sel=np.s_[:, 1:4, ::2], axis=0)
+                assert np.array_equal(lazy.value, msm.value, equal_nan=True)
+
+                # a copy contains all data
+                lazy = S5Pmsm(dset, datapoint=datapoint, lazy=True).copy()
+                assert 'value' in lazy.__dict__
+
+        # data of a loaded object is available after closing the file
+        with h5py.File(flname, 'r') as fid:
+            lazy = S5Pmsm(fid['signal'], lazy=True).load()
+        assert lazy.value.shape == (10, 6, 8)
+
+
+def test_s5p_msm_join():
+    """
+    Compare S5Pmsm.join with S5Pmsm.concatenate applied in sequence
+    """
+    rng = np.random.RandomState(42)
+    dtype = np.dtype([('value', 'f4'), ('error', 'f4')])
+    with TemporaryDirectory() as tmp_dir:
+        flname = str(Path(tmp_dir) / 'test_s5p_msm.h5')
+        with h5py.File(flname, 'w') as fid:
+            for band, shape in (('7', (5, 6)), ('8', (4, 6)), ('9', (5, 3))):
+                buff = np.empty(shape, dtype=dtype)
+                buff['value'] = rng.normal(size=shape)
+                buff['error'] = rng.normal(size=shape)
+                fid.create_dataset('BAND{}/signal_dpt'.format(band), data=buff)
+                fid.create_dataset('BAND{}/signal'.format(band),
+                                   data=buff['value'])
+
+        with h5py.File(flname, 'r') as fid:
+            for name, datapoint in (('signal', False), ('signal_dpt', True)):
+                dsets = [fid['BAND{}/{}'.format(band, name)]
+                         for band in '789']
+                for data_sel in (None, np.s_[:-1, :]):
+                    ref = S5Pmsm(dsets[0], data_sel=data_sel,
+                                 datapoint=datapoint)
+                    for dset in dsets[1:]:
+                        ref.concatenate(S5Pmsm(dset, data_sel=data_sel,
+                                               datapoint=datapoint), axis=1)
+
+                    msm = S5Pmsm.join(dsets, axis=1, data_sel=data_sel,
+                                      datapoint=datapoint)
+                    assert msm.name == ref.name
+                    assert np.array_equal(msm.value, ref.value,
+                                          equal_nan=True)
+                    if datapoint:
+                        assert np.array_equal(msm.error, ref.error,
+                                              equal_nan=True)
+                    for dims, dims_ref in zip(msm.coords, ref.coords):
+                        assert np.array_equal(dims, dims_ref)
+
+                # S5Pmsm objects can be combined with h5py datasets
+                msm = S5Pmsm.join([S5Pmsm(dsets[0], datapoint=datapoint),
+                                   dsets[2]], axis=1, datapoint=datapoint)
+                assert msm.value.shape == (5, 9)
+
+
+if __name__ == '__main__':
+    test_s5p_msm_lazy()
+    test_s5p_msm_join()
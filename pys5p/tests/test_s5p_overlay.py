@@ -0,0 +1,132 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_overlay
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..s5p_overlay import (copy_product, create_overlay, materialize,
+                           overlay_objects, overlay_require)
+from .test_l1b_io import _write_l1b_rad
+
+
+#-------------------------
+def test_overlay():
+    """
+    Patch a dataset in an overlay and materialize the patched product
+    """
+    from ..l1b_patch import L1Bpatch
+
+    msm_path = '/BAND7_RADIANCE/STANDARD_MODE'
+    ds_name = msm_path + '/OBSERVATIONS/radiance'
+    with TemporaryDirectory() as tmp_dir:
+        flname = Path(tmp_dir) / 'S5P_OFFL_L1B_RA_BD7_20190101_01_000001.nc'
+        _write_l1b_rad(str(flname), np.repeat([4, 6], [8, 8]))
+        with h5py.File(flname, 'r') as fid:
+            radiance = fid[ds_name][...]
+            latitude = fid[msm_path + '/GEODATA/latitude'][...]
+
+        copy_product(flname, Path(tmp_dir) / 'copy.nc')
+        assert (Path(tmp_dir) / 'copy.nc').read_bytes() == flname.read_bytes()
+
+        overlay = create_overlay(flname, Path(tmp_dir) / 'patch.overlay.nc')
+        with h5py.File(overlay, 'r+') as fid:
+            dset = overlay_require(fid, ds_name)
+            assert '_FillValue' in dset.attrs
+            dset[...] = 2 * radiance
+            overlay_require(fid, '/METADATA/SRON_METADATA', group=True)
+            assert overlay_objects(fid) == [ds_name, '/METADATA']
+            # unchanged datasets are read from the original product
+            assert np.array_equal(fid[msm_path + '/GEODATA/latitude'][...],
+                                  latitude)
+
+        # the original product is not modified
+        with h5py.File(flname, 'r') as fid:
+            assert np.array_equal(fid[ds_name][...], radiance)
+            assert 'METADATA' not in fid
+
+        product = materialize(overlay, Path(tmp_dir) / 'patched.nc')
+        with h5py.File(product, 'r') as fid:
+            assert np.array_equal(fid[ds_name][...], 2 * radiance)
+            assert 'SRON_METADATA' in fid['/METADATA']
+
+        # patch a product with L1Bpatch in overlay mode
+        with L1Bpatch(str(flname), data_dir=tmp_dir, overlay=True) as patch:
+            ckd = np.full(radiance.shape[2:], 100.)
+            patch.offset(ckd, ckd_orig={'offset': ckd, 'darkflux': ckd,
+                                        'prnu': ckd, 'absrad': ckd})
+            assert patch.l1b_patched.stat().st_size \
+                < flname.stat().st_size
+            report = patch.check(verbose=False)
+            assert report[ds_name]['changed'] == 0
+            product = patch.materialize()
+        assert product.name == flname.name.replace('_01_', '_99_')
+        with h5py.File(product, 'r') as fid:
+            assert np.array_equal(fid[ds_name][...], radiance)
+            patched = fid['/METADATA/SRON_METADATA/patched_datasets'][...]
+            assert patched.astype(str).tolist() \
+                == [ds_name, ds_name + '_error', ds_name + '_noise']
+
+
+def test_materialize_dims():
+    """
+    Materialize an overlay with modified attributes, dimension scales
+    remain attached to the modified datasets
+    """
+    from ..s5p_synth import write_l1b_rad
+
+    msm_path = '/BAND7_RADIANCE/STANDARD_MODE'
+    ds_name = msm_path + '/OBSERVATIONS/radiance'
+    with TemporaryDirectory() as tmp_dir:
+        flname = write_l1b_rad(Path(tmp_dir) / 'l1b_rad.nc', nscans=8,
+                               nrows=4, ncols=6, seed=1)
+        with h5py.File(flname, 'r') as fid:
+            dims = [dim[0].name for dim in fid[ds_name].dims]
+            latitude = fid[msm_path + '/GEODATA/latitude'][...]
+
+        overlay = create_overlay(flname, Path(tmp_dir) / 'l1b.overlay.nc')
+        with h5py.File(overlay, 'r+') as fid:
+            dset = overlay_require(fid, ds_name)
+            dset[...] = 0.
+            dset.attrs['units'] = 'W m-2 sr-1 nm-1'
+            del dset.attrs['long_name']
+            grp = overlay_require(fid, msm_path + '/GEODATA')
+            grp['latitude'][...] = -latitude
+            grp.attrs['comment'] = 'patched'
+            fid.attrs['processing_status'] = 'patched'
+
+        product = materialize(overlay, Path(tmp_dir) / 'patched.nc')
+        with h5py.File(product, 'r') as fid:
+            dset = fid[ds_name]
+            assert np.all(dset[...] == 0)
+            assert [dim[0].name for dim in dset.dims] == dims
+            assert dset.attrs['units'] == 'W m-2 sr-1 nm-1'
+            assert 'long_name' not in dset.attrs
+            dset = fid[msm_path + '/GEODATA/latitude']
+            assert np.array_equal(dset[...], -latitude)
+            assert [dim[0].name for dim in dset.dims] == dims[:3]
+            assert fid[msm_path + '/GEODATA'].attrs['comment'] == 'patched'
+            assert fid.attrs['processing_status'] == 'patched'
+            assert 'overlay_of' not in fid.attrs
+
+
+if __name__ == '__main__':
+    test_overlay()
+    test_materialize_dims()
@@ -0,0 +1,70 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_pool
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import numpy as np
+
+from ..biweight import biweight
+from ..s5p_msm import S5Pmsm
+from ..s5p_pool import S5Ppool
+
+
+#-------------------------
+def test_s5p_pool():
+    """
+    Compare reductions performed by the pool with their numpy equivalents
+    """
+    rng = np.random.RandomState(42)
+    data = rng.normal(loc=100., scale=5., size=(25, 8, 12))
+    data[rng.random_sample(data.shape) < 0.1] = np.nan
+
+    with S5Ppool(cpu_count=2) as pool:
+        # read data directly in shared memory, select frames without copy
+        cube = pool.empty(data.shape, dtype=data.dtype)
+        cube[...] = data
+        frames = cube[1:, ...]
+
+        for axis in range(data.ndim):
+            (median, spread) = biweight(data[1:, ...], axis=axis, spread=True)
+            res = pool.biweight(frames, axis=axis, spread=True)
+            assert np.allclose(res[0], median)
+            assert np.allclose(res[1], spread)
+
+            res = pool.nanmedian(frames, axis=axis)
+            assert np.allclose(res, np.nanmedian(data[1:, ...], axis=axis))
+
+            res = pool.nanpercentile(frames, [10, 90], axis=axis)
+            assert np.allclose(res, np.nanpercentile(data[1:, ...], [10, 90],
+                                                     axis=axis))
+
+        # biweight returns float64, like pys5p.biweight.biweight
+        res = pool.biweight(data.astype('f4'), axis=0)
+        assert res.dtype == biweight(data.astype('f4'), axis=0).dtype
+        assert res.dtype == np.float64
+        assert pool.nanmedian(data.astype('f4'), axis=0).dtype == np.float32
+
+        # data not in shared memory is copied once
+        res = pool.nanstd(data, axis=0, ddof=1)
+        assert np.allclose(res, np.nanstd(data, axis=0, ddof=1))
+
+        # medians along more than one axis are not computed by the pool
+        msm = S5Pmsm(data).nanmedian(axis=(1, 2), pool=pool)
+        assert np.allclose(msm.value, np.nanmedian(data, axis=(1, 2)))
+
+
+if __name__ == '__main__':
+    test_s5p_pool()
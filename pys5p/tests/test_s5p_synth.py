@@ -0,0 +1,109 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_synth
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..ckd_io import CKDio
+from ..icm_io import ICMio
+from ..l1b_io import L1BioCAL, L1BioENG, L1BioIRR, L1BioRAD
+from ..lv2_io import LV2io
+from ..ocm_io import OCMio
+from ..s5p_synth import FILLVALUE, SIZES, write_products
+from .benchmark_readers import run_benchmarks
+
+
+#-------------------------
+def test_s5p_synth():
+    """
+    Read the synthetic products with the readers of pys5p
+    """
+    dims = SIZES['small']
+    (nscans, nrows, ncols) = (dims['nscans'], dims['nrows'], dims['ncols'])
+    with TemporaryDirectory() as tmp_dir:
+        products = write_products(tmp_dir, size='small')
+
+        with L1BioRAD(products['l1b_rad']) as l1b:
+            assert l1b.select() == '7'
+            data = l1b.get_msm_data('radiance')
+            assert data.shape == (nscans, nrows, ncols)
+            assert np.any(data == np.float32(FILLVALUE))
+            assert l1b.get_geo_data(icid=4)['latitude'].shape[1] == nrows
+            assert sorted(np.unique(l1b.msm_index.icid)) == [4, 6]
+        with h5py.File(products['l1b_rad'], 'r') as fid:
+            dset = fid['/BAND7_RADIANCE/STANDARD_MODE/OBSERVATIONS/radiance']
+            assert dset.chunks == (1, 1, nrows, ncols)
+            assert dset.compression == 'gzip'
+            assert [x[0].name.split('/')[-1] for x in dset.dims] \
+                == ['time', 'scanline', 'ground_pixel', 'spectral_channel']
+
+        with L1BioIRR(products['l1b_irr']) as l1b:
+            assert l1b.select() == '78'
+            assert l1b.get_msm_data('irradiance').shape[-1] == 2 * ncols
+
+        with L1BioCAL(products['l1b_cal']) as l1b:
+            assert l1b.select('BACKGROUND_RADIANCE_MODE_0005') == '78'
+            data = l1b.get_msm_data('signal')
+            assert data.shape == (dims['nframes'], dims['det_rows'],
+                                  2 * dims['det_cols'])
+            assert np.allclose(l1b.get_exposure_time(), 0.0844, atol=1e-4)
+
+        with L1BioENG(products['l1b_eng']) as l1b:
+            assert l1b.get_msmtset_db().size == 4
+            assert l1b.get_swir_hk_db().size == dims['npkts']
+
+        with ICMio(products['icm']) as icm:
+            assert icm.select('BACKGROUND_RADIANCE_MODE_0005') == '78'
+            assert icm.get_delta_time().size == dims['nframes']
+            assert icm.select('ANALOG_OFFSET_SWIR') == '78'
+
+        with OCMio(products['ocm']) as ocm:
+            assert ocm.select(31523) == 2
+            assert len(ocm.get_delta_time()) == 2
+
+        with LV2io(products['lv2']) as lv2:
+            assert not lv2.science_product
+            assert (lv2.scanline, lv2.ground_pixel) == (nscans, nrows)
+            res = lv2.get_geo_bounds()
+            assert res['latitude'].shape == (nscans + 1, nrows + 1)
+
+        with CKDio(products['ckd_dir'], use_bundle=False) as ckd:
+            for name in ('prnu', 'absrad', 'wavelength', 'offset',
+                         'darkflux', 'noise', 'saturation', 'pixel_quality'):
+                assert getattr(ckd, name)().value.shape \
+                    == (dims['det_rows'], 2 * dims['det_cols'])
+
+
+def test_benchmarks():
+    """
+    Run the benchmarks of the L1b readers and the CKD getters once
+    """
+    with TemporaryDirectory() as tmp_dir:
+        products = write_products(tmp_dir, size='small')
+        for pattern in ('l1b', 'ckd'):
+            res = run_benchmarks(products, pattern=pattern, repeat=1)
+            assert res
+            for value in res.values():
+                assert 'time' in value, value
+
+
+if __name__ == '__main__':
+    test_s5p_synth()
+    test_benchmarks()
@@ -0,0 +1,92 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.s5p_trace
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+import json
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..ckd_cache import ckd_cache
+from ..ckd_io import CKDio
+from ..l1b_io import L1BioCAL, L1BioRAD
+from ..s5p_synth import SIZES, write_products
+from ..s5p_trace import TracedFile, active_trace, io_trace
+
+
+#-------------------------
+def test_s5p_trace():
+    """
+    Trace the reads of the L1b readers and the CKD getters
+    """
+    dims = SIZES['small']
+    with TemporaryDirectory() as tmp_dir:
+        products = write_products(tmp_dir, size='small')
+
+        # products opened outside io_trace are not traced
+        with L1BioRAD(products['l1b_rad']) as l1b:
+            assert type(l1b.fid) is h5py.File
+            l1b.select()
+            ref = l1b.get_msm_data('radiance')
+
+        with io_trace() as trace:
+            assert active_trace() is trace
+            with L1BioRAD(products['l1b_rad']) as l1b:
+                assert isinstance(l1b.fid, TracedFile)
+                l1b.select()
+                data = l1b.get_msm_data('radiance')
+                l1b.get_geo_data(icid=4)
+            with L1BioCAL(products['l1b_cal']) as l1b:
+                l1b.select('BACKGROUND_RADIANCE_MODE_0005')
+                l1b.get_msm_data('signal', fill_as_nan=True)
+            ckd_cache().clear()
+            with CKDio(products['ckd_dir'], use_bundle=False) as ckd:
+                ckd.prnu()
+        assert active_trace() is None
+        assert np.array_equal(data, ref)
+
+        res = trace.summary()
+        call = res['L1BioRAD.get_msm_data']
+        assert call['calls'] == 1
+        assert call['h5py_calls'] >= 1
+        assert call['nbytes'] >= data.nbytes
+        assert call['time'] >= call['read_time']
+        assert res['L1BioCAL.get_msm_data']['h5py_calls'] >= 2
+        assert res['L1BioRAD.get_geo_data']['nbytes'] > 0
+        assert res['CKDio.prnu']['nbytes'] \
+            >= dims['det_rows'] * 2 * dims['det_cols'] * 4
+
+        # one row per dataset read
+        table = trace.table()
+        assert sum(x['h5py_calls'] for x in trace.records) \
+            <= len(table)
+        rows = [x for x in table
+                if x['method'] == 'L1BioRAD.get_msm_data']
+        assert any(x['dataset'].endswith('/radiance') for x in rows)
+        assert all(isinstance(x['selection'], tuple) for x in rows)
+
+        flname = Path(tmp_dir) / 'io_trace.json'
+        trace.to_json(flname)
+        with open(flname) as fp:
+            assert len(json.load(fp)) == len(trace.records)
+
+
+if __name__ == '__main__':
+    test_s5p_trace()
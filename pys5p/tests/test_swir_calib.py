@@ -0,0 +1,150 @@
+"""
+This file is part of pyS5p
+
+https://github.com/rmvanhees/pys5p.git
+
+Purpose
+-------
+Perform unittest on pys5p.swir_calib
+
+Note
+----
+Please use the code as tutorial
+
+Copyright (c) 2019 SRON - Netherlands Institute for Space Research
+   All Rights Reserved
+
+License:  BSD-3-Clause
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import h5py
+import numpy as np
+
+from ..swir_calib import CHAIN, CalibChain
+from .test_l1b_io import _write_l1b_rad
+
+
+#-------------------------
+def _calibrate(signal, texp, ckds):
+    """
+    Apply the calibration steps in the order of the L1b processor
+    """
+    res = signal - ckds['offset'] - ckds['darkflux'] * texp
+    res = res * ckds['prnu'] / texp
+    return res * ckds['relrad'] * ckds['absrad']
+
+
+def _ckds(rng, shape):
+    """
+    Returns random CKD's for all calibration steps
+    """
+    return {'offset': rng.normal(100., 5., shape),
+            'darkflux': rng.normal(20., 2., shape),
+            'prnu': rng.normal(1., 0.02, shape),
+            'relrad': rng.normal(1., 0.01, shape),
+            'absrad': rng.normal(2e-3, 1e-5, shape)}
+
+
+def test_calib_chain():
+    """
+    Compare the fused calibration chain with a re-calibration of the signal
+    """
+    rng = np.random.RandomState(42)
+    shape = (5, 7)
+    signal = rng.normal(1000., 50., (6,) + shape)
+    texp = np.array([0.5, 0.5, 0.5, 1.0, 1.0, 0.5])
+    ckd_orig = _ckds(rng, shape)
+    ckd_alt = _ckds(rng, shape)
+
+    radiance = _calibrate(signal, texp[:, None, None], ckd_orig)
+    for steps in (['offset'], ['darkflux', 'absrad'], ['prnu'],
+                  ['relrad'], list(CHAIN[:3])):
+        ckd_new = dict(ckd_orig)
+        ckd_new.update({x: ckd_alt[x] for x in steps})
+        ref = _calibrate(signal, texp[:, None, None], ckd_new)
+
+        data = radiance.astype('f4')
+        error = np.full(data.shape, 0.01, dtype='f4')
+        chain = CalibChain(steps, ckd_orig, {x: ckd_alt[x] for x in steps})
+        chain.apply(data, texp, error=[error])
+        assert np.allclose(data, ref, rtol=1e-5)
+        for ii, value in enumerate(texp):
+            assert np.allclose(error[ii],
+                               0.01 * np.abs(chain.coefficients(value)[0]))
+
+    # fill values are not modified
+    data = radiance.astype('f4')
+    data[0, 0, 0] = float.fromhex('0x1.ep+122')
+    CalibChain(['offset'], ckd_orig, ckd_alt).apply(
+        data, texp, fillvalue=float.fromhex('0x1.ep+122'))
+    assert data[0, 0, 0] == np.float32(float.fromhex('0x1.ep+122'))
+
+    # pixels with a filled CKD are NaN, or fill value
+    ckd_fill = dict(ckd_orig)
+    ckd_fill['prnu'] = ckd_orig['prnu'].copy()
+    ckd_fill['prnu'][2, 3] = float.fromhex('0x1.ep+122')
+    for fillvalue in (None, float.fromhex('0x1.ep+122')):
+        data = radiance.astype('f4')
+        error = np.full(data.shape, 0.01, dtype='f4')
+        CalibChain(['offset'], ckd_fill, ckd_alt).apply(
+            data, texp, error=[error], fillvalue=fillvalue)
+        if fillvalue is None:
+            assert np.all(np.isnan(data[:, 2, 3]))
+        else:
+            assert np.all(data[:, 2, 3] == np.float32(fillvalue))
+            assert np.all(error[:, 2, 3] == np.float32(fillvalue))
+        mask = np.ones(shape, dtype=bool)
+        mask[2, 3] = False
+        assert np.all(np.isfinite(data[:, mask]))
+        assert np.all(np.abs(data[:, mask]) < 1e3)
+
+    try:
+        CalibChain(['texp'], ckd_orig, ckd_alt)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('step texp can not be patched')
+
+
+def test_recalibrate():
+    """
+    Patch the offset correction of a small radiance product
+    """
+    from ..l1b_patch import L1Bpatch
+
+    rng = np.random.RandomState(42)
+    ds_name = '/BAND7_RADIANCE/STANDARD_MODE/OBSERVATIONS/{}'
+    with TemporaryDirectory() as tmp_dir:
+        flname = Path(tmp_dir) / 'S5P_OFFL_L1B_RA_BD7_20190101_01_000001.nc'
+        _write_l1b_rad(str(flname), np.repeat([4, 6], [8, 8]))
+        with h5py.File(flname, 'r') as fid:
+            radiance = fid[ds_name.format('radiance')][0, ...]
+            noise = fid[ds_name.format('radiance_noise')][0, ...]
+
+        ckd_orig = _ckds(rng, radiance.shape[1:])
+        ckd_alt = _ckds(rng, radiance.shape[1:])
+        for overlay in (False, True):
+            with L1Bpatch(str(flname), data_dir=tmp_dir,
+                          overlay=overlay) as patch:
+                patch.offset(ckd_alt['offset'], ckd_orig=ckd_orig)
+                product = patch.materialize()
+
+            ref = radiance.copy()
+            ref_noise = noise.copy()
+            CalibChain(['offset'], ckd_orig, ckd_alt).apply(
+                ref, np.full(ref.shape[0], 1.25e-6 * (65540 + 13000)),
+                error=[ref_noise], fillvalue=float.fromhex('0x1.ep+122'))
+            with h5py.File(product, 'r') as fid:
+                assert np.array_equal(fid[ds_name.format('radiance')][0, ...],
+                                      ref)
+                assert np.array_equal(
+                    fid[ds_name.format('radiance_noise')][0, ...], ref_noise)
+                patched = fid['/METADATA/SRON_METADATA/patched_datasets'][...]
+                assert len(patched) == 3
+
+
+if __name__ == '__main__':
+    test_calib_chain()
+    test_recalibrate()